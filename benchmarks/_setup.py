@@ -0,0 +1,181 @@
+"""
+Preparación común de los benchmarks en el ordenador.
+
+Carga los dobles de MicroPython de 'tests/fakes.py' con el reloj real y,
+para los que suben datos, un usocket sobre sockets reales, el módulo
+deflate sobre zlib y un servidor HTTP local que decodifica los lotes.
+
+Los tiempos son de la CPU del ordenador, no del RP2040: sirven para
+comparar alternativas entre sí, no como valor absoluto en la placa.
+"""
+
+import http.server
+import json
+import os
+import socket
+import sys
+import threading
+import types
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import fakes
+
+fakes.install()
+fakes.clock.real = True
+
+
+def strikes (count, start=700000000):
+    """
+    Rayos de prueba con distancias, energías y pisos de ruido variados.
+    """
+    return [(start + i * 7, (i % 41) or False, (i * 9973) % 2000000, i % 8, 1)
+            for i in range(count)]
+
+
+class Socket:
+    """
+    usocket sobre un socket real con la interfaz de MicroPython.
+    """
+
+    def __init__ (self, *args):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = None
+
+    def settimeout (self, timeout):
+        self.sock.settimeout(timeout)
+
+    def setsockopt (self, *args):
+        pass
+
+    def connect (self, address):
+        self.sock.connect(address)
+        self.file = self.sock.makefile('rwb')
+
+    def write (self, data):
+        self.file.write(bytes(data))
+        self.file.flush()
+        return len(data)
+
+    def readline (self):
+        return self.file.readline()
+
+    def read (self, size=-1):
+        return self.file.read(size) if size >= 0 else self.file.read()
+
+    def readinto (self, buffer):
+        return self.file.readinto(buffer)
+
+    def close (self):
+        try:
+            self.file.close()
+        except (OSError, AttributeError):
+            pass
+
+        self.sock.close()
+
+
+class DeflateIO:
+    """
+    deflate.DeflateIO de MicroPython sobre zlib (solo compresión).
+    """
+
+    def __init__ (self, stream, format=2, wbits=0):
+        bits = wbits or 15
+
+        if format == 1:
+            bits = -bits
+        elif format == 3:
+            bits += 16
+
+        self.stream = stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, bits)
+
+    def write (self, data):
+        self.stream.write(self.compressor.compress(bytes(data)))
+        return len(data)
+
+    def close (self):
+        self.stream.write(self.compressor.flush())
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+
+def install_network ():
+    usocket = types.ModuleType('usocket')
+    usocket.socket = Socket
+    usocket.getaddrinfo = socket.getaddrinfo
+    usocket.SOCK_STREAM = socket.SOCK_STREAM
+    sys.modules['usocket'] = usocket
+
+    deflate = types.ModuleType('deflate')
+    deflate.AUTO = 0
+    deflate.RAW = 1
+    deflate.ZLIB = 2
+    deflate.GZIP = 3
+    deflate.DeflateIO = DeflateIO
+    sys.modules['deflate'] = deflate
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Servidor de prueba: decodifica cada lote (JSON o binario, comprimido o
+    no). Guarda los lotes recibidos solo si 'keep' está activado, para no
+    contar su memoria en las medidas.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    keep = False
+    batches = []
+    received = 0
+
+    def setup (self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST (self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.headers.get('Content-Encoding'):
+            body = zlib.decompress(body, 47)
+
+        if self.headers['Content-Type'].startswith('application/vnd'):
+            from Models.Payload import BinaryPayload
+            batch = BinaryPayload.decode(body)
+        else:
+            batch = json.loads(body)
+
+        Handler.received += len(batch['lightnings'])
+
+        if Handler.keep:
+            Handler.batches.append(batch['lightnings'])
+
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message (self, *args):
+        pass
+
+
+def start_server ():
+    """
+    Arranca el servidor en un puerto libre.
+
+    :return: URL base.
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return 'http://127.0.0.1:' + str(server.server_address[1])
+
+
+install_network()
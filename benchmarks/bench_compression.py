@@ -0,0 +1,40 @@
+"""
+Bytes enviados frente a tiempo de CPU (user-012) al comprimir el cuerpo
+con deflate, para lotes de 1 a 500 rayos en ambos formatos. En el
+ordenador deflate se sustituye por zlib con la misma ventana de 2^9
+bytes, así que los bytes son representativos pero los tiempos no.
+
+Uso: python3 benchmarks/bench_compression.py
+"""
+
+import _setup
+
+from Models.Api import Api
+
+URL = _setup.start_server()
+
+
+def run (payload_format, count):
+    api = Api(None, URL, 'weatherstation/v1/lightning/batch/store', 'token',
+              1, max_records=500, max_bytes=1 << 16,
+              payload_format=payload_format, compression='deflate',
+              compress_min_bytes=256)
+    lightnings = _setup.strikes(count)
+    received = _setup.Handler.received
+
+    assert api.save_lightnings(lightnings), api.last_status
+    assert _setup.Handler.received - received == count
+
+    compressor = api.compressor
+    raw = compressor.raw_bytes or api.measure_chunk(lightnings, 0)[1]
+    sent = compressor.compressed_bytes or raw
+
+    print('%-7s %4d rayos %7d -> %6d bytes (%3d%%) %8d µs' % (
+        payload_format, count, raw, sent, sent * 100 // raw,
+        compressor.compress_us))
+
+
+if __name__ == '__main__':
+    for payload_format in ('json', 'binary'):
+        for count in (1, 10, 100, 500):
+            run(payload_format, count)
@@ -0,0 +1,79 @@
+"""
+Tiempo de pantalla encendida y volcados ahorrados por día (user-025) con
+la atenuación y el apagado por inactividad, en un día simulado con
+tormentas de distinta intensidad. Sin la gestión la pantalla estaría
+encendida las 24 horas y cada rotación de página sería un volcado.
+
+Uso: python3 benchmarks/bench_display_power.py
+"""
+
+import random
+
+import _setup
+import fakes
+
+from Models.DisplayPower import DisplayPower
+
+DAY_S = 86400
+PAGE_SECONDS = 10
+
+fakes.clock.real = False
+
+
+class Oled:
+    def display_on (self):
+        pass
+
+    def poweroff (self):
+        pass
+
+    def contrast (self, level):
+        pass
+
+
+def simulate (strikes_per_day, seed=1):
+    random.seed(seed)
+    fakes.clock.reset()
+
+    # Los rayos llegan agrupados en tormentas de una hora
+    storms = max(1, strikes_per_day // 50)
+    strike_seconds = set()
+
+    for _ in range(storms):
+        start = random.randrange(DAY_S - 3600)
+
+        for _ in range(strikes_per_day // storms):
+            strike_seconds.add(start + random.randrange(3600))
+
+    panel = DisplayPower(Oled(), dim_seconds=120, off_seconds=600)
+    next_poll = 0
+
+    for second in range(DAY_S):
+        if second in strike_seconds:
+            panel.wake()
+            panel.should_flush()
+            next_poll = second
+
+        # Rotación de página, en pausa con el panel apagado
+        if second % PAGE_SECONDS == 0 and not panel.is_off():
+            panel.should_flush()
+
+        if second >= next_poll:
+            next_poll = second + panel.poll() // 1000
+
+        fakes.clock.advance(1000)
+
+    return panel.get_stats(PAGE_SECONDS * 1000)
+
+
+if __name__ == '__main__':
+    always = DAY_S // PAGE_SECONDS
+
+    print('rayos/día  encendida  volcados  ahorrados (sin gestión: 24 h, '
+          '%d volcados)' % always)
+
+    for strikes in (0, 10, 100, 1000):
+        stats = simulate(strikes)
+        print('%9d %7.1f h %9d %10d' % (strikes, stats['on_ms'] / 3600000,
+                                         stats['flushes'],
+                                         stats['flushes_saved_per_day']))
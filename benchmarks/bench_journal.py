@@ -0,0 +1,60 @@
+"""
+Coste de la cola persistente (user-007): escritura agrupada de miles de
+rayos, lectura en lotes como la subida y recuperación tras reiniciar.
+
+Uso: python3 benchmarks/bench_journal.py
+"""
+
+import os
+import tempfile
+import time
+
+import _setup
+
+from Models.Journal import Journal, RECORD_SIZE
+
+BATCH = 100
+
+
+def run (total, flush_records):
+    path = os.path.join(tempfile.mkdtemp(), 'lightnings.dat')
+    lightnings = _setup.strikes(total)
+    journal = Journal(path, flush_records=flush_records, max_records=total * 2)
+
+    start = time.perf_counter()
+
+    for lightning in lightnings:
+        journal.append(*lightning)
+
+    journal.flush()
+    append_s = time.perf_counter() - start
+    writes = (total + flush_records - 1) // flush_records
+
+    # Arranque con toda la cola pendiente
+    start = time.perf_counter()
+    journal = Journal(path, flush_records=flush_records, max_records=total * 2)
+    load_s = time.perf_counter() - start
+    assert journal.pending() == total
+
+    # Reenvío en lotes confirmando cada uno
+    start = time.perf_counter()
+    replayed = []
+
+    while journal.pending():
+        batch = journal.read(BATCH)
+        replayed.extend(batch)
+        journal.ack(len(batch))
+
+    replay_s = time.perf_counter() - start
+    assert replayed == lightnings
+
+    print('%6d rayos, grupos de %3d: %5d escrituras, %7.2f µs/append, '
+          'carga %6.2f ms, reenvío %6.2f µs/rayo, %6d bytes' % (
+              total, flush_records, writes, append_s / total * 1e6,
+              load_s * 1e3, replay_s / total * 1e6, total * RECORD_SIZE))
+
+
+if __name__ == '__main__':
+    for total in (100, 1000, 5000):
+        for flush_records in (1, 16):
+            run(total, flush_records)
@@ -0,0 +1,40 @@
+"""
+Subidas por segundo y milisegundos por subida (user-010) con y sin
+reutilizar la conexión HTTP, contra un servidor local. En la placa la
+diferencia es mayor: cada conexión nueva añade DNS, TCP y, con https,
+el handshake TLS.
+
+Uso: python3 benchmarks/bench_keepalive.py
+"""
+
+import time
+
+import _setup
+
+from Models.Api import Api
+
+URL = _setup.start_server()
+UPLOADS = 200
+
+
+def run (keep_alive):
+    api = Api(None, URL, 'weatherstation/v1/lightning/batch/store', 'token',
+              1, keep_alive=keep_alive)
+    lightning = _setup.strikes(1)
+
+    start = time.perf_counter()
+
+    for _ in range(UPLOADS):
+        assert api.save_lightnings(lightning), api.last_status
+
+    elapsed = time.perf_counter() - start
+    api.close()
+
+    print('%-12s %6d subidas/s %7.3f ms/subida %4d conexiones' % (
+        'reutilizando' if keep_alive else 'sin reusar', UPLOADS / elapsed,
+        elapsed / UPLOADS * 1e3, api.client.connects))
+
+
+if __name__ == '__main__':
+    run(True)
+    run(False)
@@ -0,0 +1,59 @@
+"""
+Bytes por rayo y tiempo de codificación (user-011) del cuerpo JSON frente
+al binario, con la comprobación de que el servidor local decodifica los
+mismos rayos en ambos formatos.
+
+Uso: python3 benchmarks/bench_payload.py
+"""
+
+import time
+
+import _setup
+
+from Models.Api import Api
+
+URL = _setup.start_server()
+STRIKES = 500
+NOW = 700010000
+
+
+def run (payload_format, lightnings):
+    api = Api(None, URL, 'weatherstation/v1/lightning/batch/store', 'token',
+              1, max_records=STRIKES, max_bytes=1 << 20,
+              payload_format=payload_format)
+    payload = api.payload
+
+    start = time.perf_counter()
+    previous = lightnings[0][0]
+    payload.header(len(lightnings), NOW, previous)
+
+    for index, lightning in enumerate(lightnings):
+        payload.encode(lightning, index, previous, NOW)
+        previous = lightning[0]
+
+    payload.footer()
+    encode_s = time.perf_counter() - start
+
+    count, length = api.measure_chunk(lightnings, NOW)
+    assert count == len(lightnings)
+    assert api.save_lightnings(lightnings), api.last_status
+
+    print('%-7s %7.1f bytes/rayo %6.2f µs/rayo' % (
+        payload_format, length / count, encode_s / count * 1e6))
+
+
+if __name__ == '__main__':
+    lightnings = _setup.strikes(STRIKES)
+    _setup.Handler.keep = True
+
+    run('json', lightnings)
+    run('binary', lightnings)
+
+    json_batch, binary_batch = _setup.Handler.batches
+    fields = ('timestamp_read', 'distance', 'energy', 'noise_floor', 'type')
+
+    for left, right in zip(json_batch, binary_batch):
+        assert [left[field] for field in fields] == \
+               [right[field] for field in fields]
+
+    print('Decodificados', len(binary_batch), 'rayos iguales en ambos formatos')
@@ -0,0 +1,99 @@
+"""
+Píxeles redibujados y bytes en el bus por actualización (user-022) de la
+pantalla de estado en modo retenido, frente a borrar y redibujar la
+pantalla entera con cadenas nuevas en cada rayo.
+
+La memoria reservada no se mide aquí: en CPython los enteros y el
+framebuf simulado reservan memoria que en MicroPython no existe. En la
+placa la da Screen.last_alloc (diferencia de gc.mem_alloc()), que el
+Runtime muestra en modo debug tras cada actualización.
+
+Uso: python3 benchmarks/bench_screen.py
+"""
+
+import _setup
+import fakes
+
+from Models.SSD1306 import SSD1306_I2C
+from Models.Screen import Screen, ALIGN_LEFT
+
+UPDATES = [(3, 12, 123456, 2, 1, 'OK'), (4, 12, 98000, 2, 1, 'OK'),
+           (5, 8, 98000, 2, 1, 'OK'), (6, 8, 97000, 3, 1, 'WAIT'),
+           (6, 8, 97000, 3, 1, 'WAIT')]
+
+
+def previous (oled):
+    """
+    Como se actualizaba antes: borrar y dibujar todo con cadenas nuevas.
+    """
+    def update (values):
+        pending, distance, energy, noise, type, api = values
+        oled.fill(0)
+        oled.text('Hay ' + str(pending) + ' rayos', 0, 0)
+        oled.text('Distance: ' + str(distance) + 'km', 0, 10)
+        oled.text('Energy: ' + str(energy) + 'J', 0, 20)
+        oled.text('Noise: ' + str(noise), 0, 30)
+        oled.text('Type: ' + str(type), 0, 40)
+        oled.text('API: ' + api, 0, 50)
+
+        return oled.width * oled.height
+
+    return update
+
+
+def retained (oled):
+    """
+    Pantalla de estado declarada una vez, como la del Runtime.
+    """
+    screen = Screen(oled)
+    screen.label('Hay', 0, 0)
+    screen.label('rayos', 72, 0)
+    screen.label('Distance:', 0, 10)
+    screen.label('km', 104, 10)
+    screen.label('Energy:', 0, 20)
+    screen.label('J', 120, 20)
+    screen.label('Noise:', 0, 30)
+    screen.label('Type:', 0, 40)
+    screen.label('API:', 0, 50)
+    fields = (screen.field(32, 0, 4), screen.field(80, 10, 3),
+              screen.field(64, 20, 7), screen.field(56, 30, 2),
+              screen.field(48, 40, 2), screen.field(40, 50, 4, ALIGN_LEFT))
+    screen.show()
+
+    def update (values):
+        screen.start_update()
+
+        for field, value in zip(fields, values):
+            screen.set(field, value)
+
+        screen.finish_update()
+
+        return screen.last_pixels
+
+    return update
+
+
+def run (name, method):
+    bus = fakes.Ssd1306Bus()
+    oled = SSD1306_I2C(128, 64, bus)
+    update = method(oled)
+
+    # Primera pantalla completa en ambos casos
+    update(UPDATES[0])
+    oled.show()
+
+    print(name)
+
+    for values in UPDATES[1:]:
+        start = bus.bus_bytes
+        pixels = update(values)
+        oled.show()
+        assert bytes(bus.ram) == bytes(oled.pixels)
+
+        print('  %-28s %5d píxeles %5d bytes en el bus' % (
+            values, pixels, bus.bus_bytes - start))
+
+
+if __name__ == '__main__':
+    run('Redibujo completo (anterior)', previous)
+    run('Campos en modo retenido', retained)
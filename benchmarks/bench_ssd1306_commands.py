@@ -0,0 +1,63 @@
+"""
+Transacciones y tiempo en el bus (user-020) al agrupar los comandos del
+SSD1306 en una sola transacción, frente a enviarlos de uno en uno, para
+la inicialización, un volcado completo y cambiar contraste e inversión.
+
+En la placa cada transacción añade además la llamada a writeto() con su
+start/stop, que es de donde sale la mayor parte del ahorro de tiempo.
+
+Uso: python3 benchmarks/bench_ssd1306_commands.py
+"""
+
+import _setup
+import fakes
+
+from Models.SSD1306 import SSD1306, SSD1306_I2C
+
+BUS_HZ = 400000
+
+
+class SingleCommands(SSD1306_I2C):
+    """
+    Driver con un comando por transacción, como antes de agruparlos.
+    """
+
+    write_cmds = SSD1306.write_cmds
+
+
+def measure (driver):
+    """
+    :return: Lista de (transacciones, bytes) por operación.
+    """
+    bus = fakes.Ssd1306Bus()
+    oled = driver(128, 64, bus)
+    results = [(bus.writes, bus.bus_bytes)]
+
+    def full_frame ():
+        oled.fill(1)
+        oled.show()
+
+    def settings ():
+        oled.contrast(10)
+        oled.invert(1)
+
+    for action in (full_frame, settings):
+        writes = bus.writes
+        size = bus.bus_bytes
+        action()
+        assert bytes(bus.ram) == bytes(oled.pixels)
+        results.append((bus.writes - writes, bus.bus_bytes - size))
+
+    return results
+
+
+if __name__ == '__main__':
+    names = ('inicialización', 'volcado completo', 'contraste e inversión')
+    before = measure(SingleCommands)
+    after = measure(SSD1306_I2C)
+
+    for name, old, new in zip(names, before, after):
+        print('%-22s %3d -> %d transacciones, %5d -> %5d bytes, '
+              '%5.2f -> %5.2f ms en el bus' % (
+                  name, old[0], new[0], old[1], new[1],
+                  old[1] * 9000 / BUS_HZ, new[1] * 9000 / BUS_HZ))
@@ -0,0 +1,71 @@
+"""
+Bytes en el bus por actualización de la pantalla (user-019) con el
+refresco parcial de páginas y columnas, frente al volcado completo. Una
+copia de la RAM del controlador comprueba tras cada volcado que la
+pantalla muestra exactamente el framebuffer.
+
+Uso: python3 benchmarks/bench_ssd1306_refresh.py
+"""
+
+import _setup
+import fakes
+
+from Models.SSD1306 import SSD1306_I2C
+
+BUS_HZ = 400000
+
+
+def bus_ms (size):
+    # 9 bits por byte (8 de datos y el ACK)
+    return size * 9 * 1000 / BUS_HZ
+
+
+def measure (oled, bus, name):
+    start = bus.bus_bytes
+    oled.show()
+    size = bus.bus_bytes - start
+    assert bytes(bus.ram) == bytes(oled.pixels), name
+
+    print('%-28s %5d bytes %6.2f ms a 400 kHz' % (name, size, bus_ms(size)))
+
+
+def strike_screen (oled, distance):
+    oled.fill(0)
+    oled.text('Hay 3 rayos', 0, 0)
+    oled.text('Distance: ' + str(distance) + 'km', 0, 10)
+    oled.text('Energy: 1234J', 0, 20)
+    oled.text('Noise: 2', 0, 30)
+    oled.text('Type: 1', 0, 40)
+    oled.text('API: OK', 0, 50)
+
+
+if __name__ == '__main__':
+    bus = fakes.Ssd1306Bus()
+    oled = SSD1306_I2C(128, 64, bus)
+
+    strike_screen(oled, 12)
+    measure(oled, bus, 'pantalla completa')
+
+    oled.fill_rect(80, 10, 48, 8, 0)
+    oled.text('14km', 80, 10)
+    measure(oled, bus, 'solo el valor de distancia')
+
+    oled.pixel(3, 3, 1)
+    oled.pixel(120, 60, 1)
+    measure(oled, bus, 'dos píxeles separados')
+
+    measure(oled, bus, 'sin cambios')
+
+    # show() anterior: seis comandos de direccionamiento, uno por
+    # transacción, y el framebuffer entero en cada actualización
+    start = bus.bus_bytes
+
+    for command in (0x21, 0, 127, 0x22, 0, 7):
+        oled.write_cmd(command)
+
+    oled.write_framebuf()
+    size = bus.bus_bytes - start
+    assert bytes(bus.ram) == bytes(oled.pixels)
+
+    print('%-28s %5d bytes %6.2f ms a 400 kHz' % ('show() anterior, siempre',
+                                                 size, bus_ms(size)))
@@ -0,0 +1,78 @@
+"""
+Memoria de pico al subir la cola (user-009) frente a su longitud.
+
+Compara el cuerpo anterior (un dict con todos los rayos serializado de una
+vez) con la subida por lotes acotados que escribe en el socket rayo a
+rayo. En el ordenador se mide con tracemalloc, el equivalente al pico de
+gc.mem_alloc() en la placa.
+
+Uso: python3 benchmarks/bench_upload_memory.py
+"""
+
+import json
+import tracemalloc
+
+import _setup
+
+from Models.Api import Api
+from Models.StrikeBuffer import StrikeBuffer
+
+URL = _setup.start_server()
+
+
+def previous_body (lightnings):
+    """
+    Cuerpo como se construía antes de los lotes acotados.
+    """
+    data = []
+
+    for timestamp, distance, energy, noise_floor, type in lightnings:
+        data.append({
+            'timestamp_read': timestamp,
+            'distance': distance,
+            'energy': energy,
+            'noise_floor': noise_floor,
+            'type': type,
+            'read_seconds_ago': 10,
+        })
+
+    return json.dumps({'hardware_device_id': 1, 'lightnings': data}).encode()
+
+
+def peak (function):
+    tracemalloc.start()
+    function()
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def upload_all (api, buffer):
+    while len(buffer):
+        assert api.save_lightnings(buffer), api.last_status
+        buffer.discard(api.last_sent)
+
+
+if __name__ == '__main__':
+    api = Api(None, URL, 'weatherstation/v1/lightning/batch/store', 'token',
+              1, max_records=100, max_bytes=4096)
+
+    # Conexión abierta antes de medir para no contar el arranque
+    api.save_lightnings(_setup.strikes(1))
+
+    print('  cola   antes (bytes)   lotes (bytes)   peticiones')
+
+    for backlog in (10, 100, 500, 1000, 2000):
+        lightnings = _setup.strikes(backlog)
+        before = peak(lambda: previous_body(lightnings))
+
+        buffer = StrikeBuffer(backlog)
+
+        for lightning in lightnings:
+            buffer.push(*lightning)
+
+        requests = api.client.requests
+        after = peak(lambda: upload_all(api, buffer))
+
+        print('%6d %15d %15d %12d' % (backlog, before, after,
+                                      api.client.requests - requests))
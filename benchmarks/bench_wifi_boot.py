@@ -0,0 +1,54 @@
+"""
+Tiempo desde el arranque hasta tener wi-fi (user-016) sin caché, con el
+punto de acceso guardado (conexión directa al BSSID) y con el punto de
+acceso guardado desaparecido (vuelta al escaneo). Usa el WLAN simulado
+de las pruebas sobre el reloj simulado: escaneo de 2 s y unión de 0,5 s,
+más 1,5 s si no se indica el BSSID y el chip tiene que buscarlo.
+
+Uso: python3 benchmarks/bench_wifi_boot.py
+"""
+
+import os
+import tempfile
+
+import _setup
+import fakes
+
+from Models.RpiPico import RpiPico, WIFI_STATE_CONNECTED
+
+STEP_MS = 10
+
+fakes.clock.real = False
+
+
+def boot (cache_path):
+    """
+    :return: Tupla (ms hasta conectar, escaneos).
+    """
+    start = fakes.clock.ticks_ms()
+    pico = RpiPico(ssid='main', password='main-pass',
+                   alternatives_ap=[{'ssid': 'alternative',
+                                     'password': 'alt-pass'}],
+                   cache_path=cache_path)
+
+    while pico.wifi_poll() != WIFI_STATE_CONNECTED:
+        fakes.clock.advance(STEP_MS)
+
+    return fakes.ticks_diff(fakes.clock.ticks_ms(), start), pico.wifi.scans
+
+
+if __name__ == '__main__':
+    fakes.WLAN.aps = {
+        'main': {'password': 'main-pass', 'bssid': b'\x01' * 6,
+                 'channel': 6, 'rssi': -60},
+        'alternative': {'password': 'alt-pass', 'bssid': b'\x02' * 6,
+                        'channel': 11, 'rssi': -70},
+    }
+    path = os.path.join(tempfile.mkdtemp(), 'wifi.json')
+
+    print('sin caché:             %5d ms, %d escaneos' % boot(path))
+    print('conexión directa:      %5d ms, %d escaneos' % boot(path))
+
+    # El punto de acceso guardado cambia de BSSID (otro router)
+    fakes.WLAN.aps['main']['bssid'] = b'\x03' * 6
+    print('AP guardado no existe: %5d ms, %d escaneos' % boot(path))
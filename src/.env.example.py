@@ -12,14 +12,84 @@ API_URL = "http://localhost:8000/api"
 API_PATH = "weatherstation/v1/lightning/batch/store"
 API_TOKEN = "apitoken"
 
+# Formato del cuerpo de las subidas: "json" o "binary" (compacto, requiere
+# soporte en la API para "application/vnd.lightning.v1")
+API_FORMAT = "json"
+
+# Compresión de las subidas: None, "deflate" o "gzip". Requiere un firmware
+# con el módulo deflate y soporte en la API
+API_COMPRESSION = None
+
+# Transporte de las subidas: "http" (API) o "mqtt" (broker)
+UPLOAD_TRANSPORT = "http"
+
+# Datos del broker MQTT. MQTT_BATCH es el número de rayos por mensaje (1 para
+# publicar cada rayo por separado). Sin paquetes durante MQTT_KEEPALIVE
+# segundos el broker da la estación por caída y publica "offline"
+MQTT_HOST = "localhost"
+MQTT_PORT = 1883
+MQTT_USER = None
+MQTT_PASSWORD = None
+MQTT_PREFIX = "lightning"
+MQTT_BATCH = 10
+MQTT_KEEPALIVE = 60
+
+# Vía prioritaria: los rayos a PRIORITY_DISTANCE km o menos, o los que
+# superan PRIORITY_RATE rayos por minuto, se suben al momento sin esperar a
+# formar lote. None para desactivar cada criterio
+PRIORITY_DISTANCE = 5
+PRIORITY_RATE = 10
+
+# Ciclo de trabajo de la radio: con DUTY_CYCLE la radio se apaga entre
+# ventanas de subida. La ventana se abre cuando el rayo pendiente más antiguo
+# lleva UPLOAD_WINDOW_SECONDS esperando, cuando hay UPLOAD_WINDOW_THRESHOLD
+# rayos en cola o con un rayo prioritario. WIFI_POWER_SAVE activa el ahorro
+# de energía del chip mientras está encendida
+DUTY_CYCLE = False
+UPLOAD_WINDOW_SECONDS = 300
+UPLOAD_WINDOW_THRESHOLD = 50
+WIFI_POWER_SAVE = False
+
+# Bajo consumo: la placa duerme (lightsleep) cuando no hay trabajo y la
+# radio está apagada, como mucho SLEEP_MAX_MS seguidos. Despierta con la IRQ
+# del sensor. Con subidas a la API requiere DUTY_CYCLE
+LOW_POWER = False
+SLEEP_MAX_MS = 10000
+
+# Guarda en la flash los rayos pendientes de subir para no perderlos al
+# reiniciar
+JOURNAL_ENABLED = True
+JOURNAL_PATH = "/lightnings.dat"
+PRIORITY_JOURNAL_PATH = "/priority.dat"
+
 # Identificador del dispositivo para distinguirlo en la API.
 DEVICE_ID = 1
 
+# Número máximo de rayos guardados en memoria a la espera de subirlos. Al
+# llenarse se descartan los más antiguos.
+LIGHTNINGS_CAPACITY = 500
+
 # ¿Está en interior?
 INDOOR=True
 
+# Frecuencia máxima del bus I2C. Se usa la menor entre esta y la que admiten
+# todos los dispositivos (el AS3935 llega a 400 kHz)
+I2C_FREQ = 400000
+
 # Indica si muestra datos por un display
 DISPLAY_ENABLED=True
 
+# Segundos que se muestra cada página de la pantalla (último rayo, gráficas
+# de la última hora, Wi-Fi, cola de subida y salud de la placa) antes de
+# pasar a la siguiente. 0 para mostrar solo el último rayo
+DISPLAY_PAGE_SECONDS = 10
+
+# Sin rayos ni alertas la pantalla baja el contraste a DISPLAY_DIM_CONTRAST
+# tras DISPLAY_DIM_SECONDS y se apaga tras DISPLAY_OFF_SECONDS. None para
+# desactivar cada paso
+DISPLAY_DIM_SECONDS = 120
+DISPLAY_OFF_SECONDS = 600
+DISPLAY_DIM_CONTRAST = 8
+
 # Indica si está en modo debug la aplicación
 DEBUG = False
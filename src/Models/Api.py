@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 #
-import urequests
-#import ujson
+import gc
 import utime
+from Models.Compressor import Compressor
+from Models.HttpClient import HttpClient
+from Models.Payload import JsonPayload, BinaryPayload
 
 class Api:
     """
@@ -14,57 +16,201 @@ class Api:
     :param path: The specific path for the API endpoint.
     :param token: The authentication token for accessing the API.
     :param device_id: The unique identifier of the device.
+    :param max_records: Maximum number of lightnings sent in one request.
+    :param max_bytes: Maximum size in bytes of one request body.
+    :param keep_alive: Reuse the HTTP connection between uploads.
+    :param payload_format: Body format, 'json' or 'binary'.
+    :param compression: Content-Encoding for the body: None, 'deflate' or
+                        'gzip'.
+    :param compress_min_bytes: Bodies smaller than this are sent uncompressed.
     :param debug: Optional boolean flag for debugging mode.
     """
 
-    def __init__ (self, controller, url, path, token, device_id, debug=False):
+    def __init__ (self, controller, url, path, token, device_id,
+                  max_records=100, max_bytes=8192, keep_alive=True,
+                  payload_format='json', compression=None,
+                  compress_min_bytes=512, debug=False):
         self.URL = url
         self.TOKEN = token
         self.DEVICE_ID = device_id
         self.URL_PATH = path
         self.CONTROLLER = controller
+        self.MAX_RECORDS = max_records
+        self.MAX_BYTES = max_bytes
         self.DEBUG = debug
 
+        self.client = HttpClient(url, keep_alive=keep_alive, debug=debug)
+
+        # Formato del cuerpo de las subidas
+        if payload_format == 'binary':
+            self.payload = BinaryPayload(device_id)
+        else:
+            self.payload = JsonPayload(device_id)
+
+        # Compresión opcional del cuerpo
+        self.compressor = None
+
+        if compression:
+            self.compressor = Compressor(compression, max_bytes=max_bytes,
+                                         min_bytes=compress_min_bytes)
+
+            if not self.compressor.is_available():
+                if self.DEBUG:
+                    print('El firmware no permite comprimir, se envía sin comprimir')
+
+                self.compressor = None
+
+        # Código HTTP de la última subida, 0 si no hubo respuesta
+        self.last_status = 0
+
+        # Rayos confirmados por la API en la última petición (solo con
+        # respuesta 2xx) y rayos incluidos en ella
+        self.last_sent = 0
+        self.last_count = 0
+
+        # Pico de memoria ocupada durante la última subida (solo en debug)
+        self.mem_peak = 0
+
+    def close (self) -> None:
+        """
+        Cierra la conexión con la API, por ejemplo antes de apagar la radio.
+        :return:
+        """
+        self.client.close()
+
+    def poll (self) -> None:
+        """
+        Mantenimiento de la conexión entre subidas. La API no lo necesita,
+        las conexiones persistentes se reabren al subir si el servidor las
+        ha cerrado.
+        :return:
+        """
+        pass
+
+    def measure_chunk (self, lightnings, now):
+        """
+        Calcula cuántos rayos caben en una petición sin superar MAX_RECORDS
+        ni MAX_BYTES y el tamaño exacto del cuerpo resultante.
+
+        :return: Tupla (rayos, bytes).
+        """
+        payload = self.payload
+        count = 0
+        length = len(payload.header(0, now, 0)) + len(payload.footer())
+        previous = None
+
+        for lightning in lightnings:
+            if previous is None:
+                previous = lightning[0]
+
+            size = len(payload.encode(lightning, count, previous, now))
+
+            if count and (count >= self.MAX_RECORDS or
+                          length + size > self.MAX_BYTES):
+                break
+
+            count += 1
+            length += size
+            previous = lightning[0]
+
+        return count, length
+
     def save_lightnings (self, lightnings) -> bool:
         """
         Guarda los datos en la API.
+
+        Solo se envía el primer bloque de rayos que cabe en los límites de
+        tamaño, serializado directamente sobre el socket. Los rayos incluidos
+        quedan en 'last_count' y, solo si la API responde 2xx, también en
+        'last_sent' para que se confirmen solo esos. La memoria usada no
+        depende del número de rayos pendientes.
+
+        :param lightnings: Rayos a subir (StrikeBuffer o lista de tuplas).
         :return:
         """
         headers = {
             "Authorization": "Bearer " + self.TOKEN,
-            "Content-Type": "application/json"
+            "Content-Type": self.payload.content_type
         }
 
-        url = self.URL + '/' + self.URL_PATH
+        self.last_status = 0
+        self.last_sent = 0
+        self.last_count = 0
 
         try:
-            # Preparo cuanto hace de la lectura del rayo
-            for lightning in lightnings:
-                lightning["read_seconds_ago"] = (utime.time() - lightning["timestamp_read"]) + 1
+            now = utime.time()
+            count, length = self.measure_chunk(lightnings, now)
 
-            payload = {
-                "lightnings": lightnings,
-                "hardware_device_id": self.DEVICE_ID
-            }
+            if not count:
+                # Nada que enviar, se considera correcto
+                self.last_status = 204
+                return True
+
+            self.last_count = count
 
             if self.DEBUG:
-                print('Enviando datos a la API:', payload)
+                gc.collect()
+                self.mem_peak = gc.mem_alloc()
+                print('Enviando', count, 'rayos a la API en', length, 'bytes')
 
-            response = urequests.post(url, headers=headers, json=payload)
+            payload = self.payload
 
-            if self.DEBUG:
-                print('Respuesta de la API:', response.text)
+            def body (client):
+                sent = 0
+                previous = None
+
+                for lightning in lightnings:
+                    if sent == count:
+                        break
+
+                    if previous is None:
+                        previous = lightning[0]
+                        client.write(payload.header(count, now, previous))
+
+                    client.write(payload.encode(lightning, sent, previous, now))
+                    previous = lightning[0]
+                    sent += 1
 
-            if response.status_code == 201:
+                    if self.DEBUG:
+                        self.mem_peak = max(self.mem_peak, gc.mem_alloc())
+
+                client.write(payload.footer())
+
+            if self.compressor is not None:
+                compressed = self.compressor.compress(length, body)
+
+                if compressed is not None:
+                    headers["Content-Encoding"] = self.compressor.encoding
+                    length = len(compressed)
+
+                    if self.DEBUG:
+                        print('Comprimido a', length, 'bytes en',
+                              self.compressor.last_us, 'µs')
+
+                    def body (client):
+                        client.write(compressed)
+
+            self.last_status = self.client.post(self.URL_PATH, headers,
+                                                length, body)
+
+            if 200 <= self.last_status < 300:
+                self.last_sent = count
                 return True
-            else:
-                return False
+
+            # Petición demasiado grande: el reintento lleva la mitad de rayos
+            if self.last_status == 413 and count > 1:
+                self.MAX_RECORDS = max(1, count // 2)
+
+                if self.DEBUG:
+                    print('Lote demasiado grande, se reduce a',
+                          self.MAX_RECORDS, 'rayos')
+
+            return False
 
         except Exception as e:
             if self.DEBUG:
                 print('')
                 print("Error al obtener los datos de la api: ", e)
-                print("lightnings: ", lightnings)
                 print('')
 
             return False
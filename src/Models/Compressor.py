@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Compresión opcional de los cuerpos de las subidas con el módulo deflate de
+# MicroPython. La salida se escribe en un buffer preasignado y la ventana del
+# compresor es pequeña, por lo que la memoria usada está acotada. Si el
+# firmware no incluye deflate con compresión, no se comprime.
+import io
+from time import ticks_us, ticks_diff
+
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+
+class BufferStream(io.IOBase):
+    """
+    Stream de escritura sobre un bytearray de tamaño fijo.
+    """
+
+    def __init__ (self, buffer):
+        self.buffer = buffer
+        self.size = 0
+
+    def write (self, data):
+        size = len(data)
+
+        if self.size + size > len(self.buffer):
+            raise OSError('Buffer de compresión lleno')
+
+        self.buffer[self.size:self.size + size] = data
+        self.size += size
+
+        return size
+
+
+class Compressor:
+    """
+    Comprime cuerpos de petición para enviarlos con Content-Encoding.
+
+    :param encoding: 'deflate' (zlib) o 'gzip'.
+    :param max_bytes: Tamaño del buffer de salida.
+    :param wbits: Tamaño de la ventana del compresor (2^wbits bytes).
+    :param min_bytes: Tamaño mínimo del cuerpo para intentar comprimir.
+    """
+
+    def __init__ (self, encoding='deflate', max_bytes=8192, wbits=9,
+                  min_bytes=512):
+        self.encoding = encoding
+        self.wbits = wbits
+        self.min_bytes = min_bytes
+        self.buffer = bytearray(max_bytes) if deflate else None
+
+        # Estadísticas acumuladas de los cuerpos comprimidos
+        self.compressions = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.compress_us = 0
+        self.last_us = 0
+
+    def is_available (self) -> bool:
+        """
+        Indica si el firmware permite comprimir.
+        """
+        return deflate is not None
+
+    def compress (self, length, body):
+        """
+        Comprime un cuerpo generado por partes.
+
+        :param length: Tamaño del cuerpo sin comprimir.
+        :param body: Función que recibe un stream y escribe el cuerpo
+                     llamando a write().
+        :return: memoryview con el cuerpo comprimido o None si no se comprime
+                 (cuerpo pequeño, sin soporte, no cabe o no reduce tamaño).
+        """
+        if deflate is None or length < self.min_bytes:
+            return None
+
+        start = ticks_us()
+        stream = BufferStream(self.buffer)
+        format = deflate.GZIP if self.encoding == 'gzip' else deflate.ZLIB
+
+        try:
+            with deflate.DeflateIO(stream, format, self.wbits) as compressor:
+                body(compressor)
+        except OSError:
+            return None
+
+        self.last_us = ticks_diff(ticks_us(), start)
+
+        if stream.size >= length:
+            return None
+
+        self.compressions += 1
+        self.raw_bytes += length
+        self.compressed_bytes += stream.size
+        self.compress_us += self.last_us
+
+        return memoryview(self.buffer)[:stream.size]
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Gestión del encendido de la pantalla OLED. Sin actividad la pantalla baja
+# el contraste tras un tiempo y después se apaga (poweroff, el panel
+# conserva su RAM). Un rayo o una alerta la encienden al momento. Mientras
+# está apagada no se envía nada por el bus: los cambios se quedan en el
+# framebuffer y se envían al encenderla.
+
+from time import ticks_ms, ticks_diff
+
+# Estados del panel
+PANEL_ON = const(0)
+PANEL_DIM = const(1)
+PANEL_OFF = const(2)
+
+PANEL_STATE_NAMES = ('ON', 'DIM', 'OFF')
+
+# Milisegundos en un día para las estadísticas
+DAY_MS = const(86400000)
+
+# Intervalo máximo entre acumulaciones de tiempo. ticks_diff() solo es
+# válido hasta unos 6 días, así que nunca se mide un tramo más largo que este
+TALLY_MS = const(3600000)
+
+
+class DisplayPower:
+    """
+    Atenúa y apaga la pantalla sin actividad.
+
+    :param oled: Pantalla SSD1306.
+    :param dim_seconds: Segundos sin actividad hasta bajar el contraste. None
+                        para no atenuarla.
+    :param off_seconds: Segundos sin actividad hasta apagarla. None para no
+                        apagarla.
+    :param contrast: Contraste con la pantalla activa.
+    :param dim_contrast: Contraste con la pantalla atenuada.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, oled, dim_seconds=120, off_seconds=600,
+                  contrast=0xFF, dim_contrast=0x08, debug=False):
+        self.oled = oled
+        self.dim_ms = dim_seconds * 1000 if dim_seconds else None
+        self.off_ms = off_seconds * 1000 if off_seconds else None
+        self.contrast = contrast
+        self.dim_contrast = dim_contrast
+        self.DEBUG = debug
+
+        now = ticks_ms()
+        self.state = PANEL_ON
+        self.active_ticks = now
+
+        # Estadísticas. Los tiempos se acumulan por tramos desde la última
+        # acumulación en lugar de medirse desde el arranque
+        self.tally_ticks = now
+        self.uptime_ms = 0
+        self.on_ms = 0
+        self.wakes = 0
+        self.flushes = 0
+        self.flushes_skipped = 0
+
+    def is_off (self) -> bool:
+        """
+        Indica si el panel está apagado.
+        """
+        return self.state == PANEL_OFF
+
+    def get_state_name (self) -> str:
+        """
+        Devuelve el nombre corto del estado del panel.
+        """
+        return PANEL_STATE_NAMES[self.state]
+
+    def tally (self, now) -> None:
+        """
+        Acumula el tiempo transcurrido desde la última llamada, y el tiempo
+        encendida si el panel no está apagado. Debe llamarse antes de cada
+        cambio de estado.
+        """
+        elapsed = ticks_diff(now, self.tally_ticks)
+        self.tally_ticks = now
+        self.uptime_ms += elapsed
+
+        if self.state != PANEL_OFF:
+            self.on_ms += elapsed
+
+    def wake (self) -> None:
+        """
+        Registra actividad y enciende la pantalla con el contraste normal.
+        """
+        now = ticks_ms()
+        self.tally(now)
+        self.active_ticks = now
+
+        if self.state == PANEL_ON:
+            return
+
+        if self.state == PANEL_OFF:
+            self.oled.display_on()
+            self.wakes += 1
+
+        self.oled.contrast(self.contrast)
+        self.state = PANEL_ON
+
+        if self.DEBUG:
+            print('Pantalla encendida')
+
+    def poll (self):
+        """
+        Aplica la atenuación o el apagado si ha pasado su tiempo y acumula
+        las estadísticas.
+
+        :return: Milisegundos hasta el siguiente cambio o hasta la siguiente
+                 acumulación de tiempo, como mucho TALLY_MS.
+        """
+        now = ticks_ms()
+        self.tally(now)
+        idle = ticks_diff(now, self.active_ticks)
+
+        if self.state == PANEL_ON and self.dim_ms is not None and \
+                idle >= self.dim_ms:
+            self.oled.contrast(self.dim_contrast)
+            self.state = PANEL_DIM
+
+            if self.DEBUG:
+                print('Pantalla atenuada')
+
+        if self.state != PANEL_OFF and self.off_ms is not None and \
+                idle >= self.off_ms:
+            self.oled.poweroff()
+            self.state = PANEL_OFF
+
+            if self.DEBUG:
+                print('Pantalla apagada')
+
+        if self.state == PANEL_ON and self.dim_ms is not None:
+            return min(TALLY_MS, self.dim_ms - idle)
+
+        if self.state != PANEL_OFF and self.off_ms is not None:
+            return min(TALLY_MS, self.off_ms - idle)
+
+        return TALLY_MS
+
+    def should_flush (self) -> bool:
+        """
+        Indica si hay que enviar el framebuffer y cuenta los envíos hechos y
+        los ahorrados con la pantalla apagada.
+        """
+        if self.state == PANEL_OFF:
+            self.flushes_skipped += 1
+            return False
+
+        self.flushes += 1
+
+        return True
+
+    def get_stats (self, rotation_ms=0) -> dict:
+        """
+        Devuelve el tiempo con el panel encendido y los envíos ahorrados,
+        en total y extrapolados a un día.
+
+        :param rotation_ms: Intervalo de rotación de páginas. Las rotaciones
+                            no hechas con el panel apagado también cuentan
+                            como envíos ahorrados.
+        """
+        self.tally(ticks_ms())
+        uptime_ms = max(1, self.uptime_ms)
+        on_ms = self.on_ms
+
+        saved = self.flushes_skipped
+
+        if rotation_ms:
+            saved += (uptime_ms - on_ms) // rotation_ms
+
+        return {
+            'state': self.get_state_name(),
+            'on_ms': on_ms,
+            'on_ms_per_day': on_ms * DAY_MS // uptime_ms,
+            'on_percent': on_ms * 100 // uptime_ms,
+            'wakes': self.wakes,
+            'flushes': self.flushes,
+            'flushes_saved': saved,
+            'flushes_saved_per_day': saved * DAY_MS // uptime_ms,
+        }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+import errno
+import usocket
+from time import ticks_ms, ticks_diff
+
+
+class HttpClient:
+    """
+    Cliente HTTP/1.1 mínimo para enviar peticiones POST cuyo cuerpo se
+    escribe por partes directamente en el socket, sin construirlo entero en
+    memoria.
+
+    Mantiene la conexión abierta entre peticiones (keep-alive) y guarda la
+    dirección resuelta por DNS. Si el servidor cierra la conexión mientras
+    está inactiva, reconecta y repite la petición de forma transparente.
+    Solo se repite si el servidor no llegó a aceptar la petición (error al
+    escribirla o conexión cerrada sin respuesta), nunca tras un timeout,
+    para no duplicar un POST ya procesado.
+
+    :param url: URL base (http:// o https://) a la que se añaden las rutas.
+    :param connect_timeout: Tiempo máximo en segundos para conectar.
+    :param read_timeout: Tiempo máximo en segundos para enviar y leer.
+    :param keep_alive: Si es False se abre una conexión por petición.
+    :param buffer_size: Tamaño del buffer de escritura en bytes.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, url, connect_timeout=5, read_timeout=10,
+                  keep_alive=True, buffer_size=512, debug=False):
+        self.DEBUG = debug
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+
+        scheme, _, host, base_path = (url.rstrip('/') + '/').split('/', 3)
+        self.ssl = scheme == 'https:'
+        self.port = 443 if self.ssl else 80
+
+        if ':' in host:
+            host, port = host.split(':', 1)
+            self.port = int(port)
+
+        self.host = host
+        self.base_path = '/' + base_path
+
+        # Dirección resuelta por DNS, se reutiliza hasta que falle
+        self.address = None
+
+        self.sock = None
+        self.buffer = bytearray(buffer_size)
+        self.buffered = 0
+
+        # Indica si la última petición falló porque la conexión reutilizada
+        # ya estaba cerrada, por lo que el servidor no la procesó
+        self.stale = False
+
+        # Estadísticas
+        self.requests = 0
+        self.connects = 0
+        self.request_ms = 0
+        self.total_ms = 0
+
+    def connect (self) -> None:
+        """
+        Abre la conexión con el servidor.
+        :return:
+        """
+        if self.address is None:
+            self.address = usocket.getaddrinfo(self.host, self.port, 0,
+                                               usocket.SOCK_STREAM)[0][-1]
+
+        sock = usocket.socket()
+        sock.settimeout(self.connect_timeout)
+
+        try:
+            sock.connect(self.address)
+
+            if self.ssl:
+                import ussl
+                sock = ussl.wrap_socket(sock, server_hostname=self.host)
+
+            sock.settimeout(self.read_timeout)
+        except Exception:
+            sock.close()
+
+            # La dirección puede haber cambiado, se resuelve de nuevo
+            self.address = None
+            raise
+
+        self.sock = sock
+        self.connects += 1
+
+    def close (self) -> None:
+        """
+        Cierra la conexión si está abierta.
+        :return:
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+        self.buffered = 0
+
+    def write (self, data) -> None:
+        """
+        Escribe datos del cuerpo de la petición a través del buffer.
+
+        :param data: bytes a enviar.
+        :return:
+        """
+        size = len(data)
+
+        if self.buffered + size > len(self.buffer):
+            self.flush()
+
+            if size > len(self.buffer):
+                self.sock.write(data)
+                return
+
+        self.buffer[self.buffered:self.buffered + size] = data
+        self.buffered += size
+
+    def flush (self) -> None:
+        """
+        Envía lo que quede en el buffer de escritura.
+        :return:
+        """
+        if self.buffered:
+            self.sock.write(memoryview(self.buffer)[:self.buffered])
+            self.buffered = 0
+
+    def post (self, path, headers, length, body) -> int:
+        """
+        Envía una petición POST.
+
+        :param path: Ruta relativa a la URL base.
+        :param headers: Diccionario con las cabeceras adicionales.
+        :param length: Tamaño exacto del cuerpo en bytes.
+        :param body: Función que recibe este cliente y escribe el cuerpo
+                     llamando a write(). Puede llamarse dos veces si hay que
+                     reconectar.
+        :return: Código HTTP de la respuesta.
+        """
+        start = ticks_ms()
+
+        try:
+            reused = self.sock is not None
+
+            if not reused:
+                self.connect()
+
+            try:
+                status = self.request(path, headers, length, body)
+            except OSError:
+                if not reused or not self.stale:
+                    raise
+
+                # El servidor cerró la conexión inactiva, reintento una vez
+                self.close()
+                self.connect()
+                status = self.request(path, headers, length, body)
+        except Exception:
+            self.close()
+            raise
+        finally:
+            self.request_ms = ticks_diff(ticks_ms(), start)
+            self.total_ms += self.request_ms
+            self.requests += 1
+
+        if self.DEBUG:
+            print('Respuesta de la API:', status, 'en', self.request_ms, 'ms')
+
+        return status
+
+    def request (self, path, headers, length, body) -> int:
+        """
+        Envía la petición por la conexión abierta y lee la respuesta
+        completa para dejar la conexión lista para la siguiente.
+
+        :return: Código HTTP de la respuesta.
+        """
+        self.buffered = 0
+        self.stale = False
+
+        try:
+            self.write(b'POST ' + (self.base_path + path).encode() +
+                       b' HTTP/1.1\r\nHost: ' + self.host.encode() +
+                       b'\r\nContent-Length: ' + str(length).encode() +
+                       (b'\r\n' if self.keep_alive else
+                        b'\r\nConnection: close\r\n'))
+
+            for name in headers:
+                self.write(name.encode() + b': ' + headers[name].encode() +
+                           b'\r\n')
+
+            self.write(b'\r\n')
+            body(self)
+            self.flush()
+        except OSError as e:
+            # Conexión cerrada por el servidor antes de aceptar la petición
+            self.stale = e.args[0] in (errno.EPIPE, errno.ECONNRESET)
+            raise
+
+        # Línea de estado: "HTTP/1.1 201 Created". Vacía si el servidor
+        # había cerrado la conexión sin leer la petición. Un timeout aquí no
+        # se repite: el servidor puede haberla procesado.
+        line = self.sock.readline()
+
+        if not line:
+            self.stale = True
+            raise OSError('Conexión cerrada por el servidor')
+
+        status = int(line.split(None, 2)[1])
+
+        content_length = 0
+        chunked = False
+        keep = self.keep_alive
+
+        while True:
+            line = self.sock.readline()
+
+            if not line or line == b'\r\n':
+                break
+
+            name, value = (line.split(b':', 1) + [b''])[:2]
+            name = name.strip().lower()
+            value = value.strip().lower()
+
+            if name == b'content-length':
+                content_length = int(value)
+            elif name == b'transfer-encoding':
+                chunked = value == b'chunked'
+            elif name == b'connection' and value == b'close':
+                keep = False
+
+        # Descarto el cuerpo de la respuesta
+        if chunked:
+            while True:
+                size = int(self.sock.readline().split(b';')[0], 16)
+                self.discard(size + 2)
+
+                if not size:
+                    break
+        else:
+            self.discard(content_length)
+
+        if not keep:
+            self.close()
+
+        return status
+
+    def discard (self, size) -> None:
+        """
+        Lee y descarta 'size' bytes de la respuesta.
+        :return:
+        """
+        view = memoryview(self.buffer)
+
+        while size > 0:
+            read = self.sock.readinto(view[:min(size, len(self.buffer))])
+
+            if not read:
+                break
+
+            size -= read
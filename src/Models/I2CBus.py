@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Gestor del bus I2C compartido por el sensor AS3935 y la pantalla SSD1306.
+# Cada dispositivo usa su propio cliente, que tiene la misma interfaz que
+# machine.I2C. Las tareas de uasyncio reservan el bus con acquire(), que lo
+# concede antes al cliente de mayor prioridad y, con la misma prioridad, por
+# orden de llegada. Los volcados largos de la pantalla se hacen por pasos y
+# ceden el bus entre uno y otro si lo necesita un cliente de más prioridad,
+# para que la lectura del sensor tras una IRQ no espere a un volcado
+# completo.
+
+from array import array
+import uasyncio as asyncio
+from machine import I2C
+from time import ticks_us, ticks_diff
+
+# Límites (µs) de los intervalos del histograma de esperas por el bus. El
+# último intervalo recoge las esperas mayores
+WAIT_BUCKETS_US = (100, 500, 1000, 2000, 5000, 10000, 25000)
+
+# Intervalo (ms) para volver a comprobar el bus mientras lo retiene un
+# cliente de más prioridad que aún no lo ha pedido (IRQ pendiente de leer)
+PREEMPT_CHECK_MS = const(1)
+
+
+class I2CClient:
+    """
+    Acceso de un dispositivo al bus compartido.
+
+    :param bus: Instancia de I2CBus.
+    :param name: Nombre del cliente en las estadísticas.
+    :param max_freq: Frecuencia máxima que admite el dispositivo.
+    :param priority: Los clientes con más prioridad reciben antes el bus.
+    """
+
+    def __init__ (self, bus, name, max_freq, priority):
+        self.bus = bus
+        self.name = name
+        self.max_freq = max_freq
+        self.priority = priority
+
+        # Función que indica si el cliente necesita el bus aunque todavía no
+        # lo haya pedido (por ejemplo, una IRQ pendiente de leer)
+        self.pending = None
+
+        # Reservas del bus e histograma de las que tuvieron que esperar
+        self.acquired = 0
+        self.waits = array('L', [0] * (len(WAIT_BUCKETS_US) + 1))
+        self.wait_max_us = 0
+
+    def record_wait (self, wait) -> None:
+        """
+        Registra una espera por el bus en el histograma.
+
+        :param wait: Espera en µs.
+        :return:
+        """
+        bucket = 0
+
+        while bucket < len(WAIT_BUCKETS_US) and wait >= WAIT_BUCKETS_US[bucket]:
+            bucket += 1
+
+        self.waits[bucket] += 1
+
+        if wait > self.wait_max_us:
+            self.wait_max_us = wait
+
+    def readfrom_mem_into (self, addr, memaddr, buf):
+        return self.bus.i2c.readfrom_mem_into(addr, memaddr, buf)
+
+    def readfrom_mem (self, addr, memaddr, nbytes):
+        return self.bus.i2c.readfrom_mem(addr, memaddr, nbytes)
+
+    def writeto_mem (self, addr, memaddr, buf):
+        return self.bus.i2c.writeto_mem(addr, memaddr, buf)
+
+    def writeto (self, addr, buf):
+        return self.bus.i2c.writeto(addr, buf)
+
+    def writevto (self, addr, vector):
+        return self.bus.i2c.writevto(addr, vector)
+
+    def scan (self):
+        return self.bus.i2c.scan()
+
+
+class I2CBus:
+    """
+    Bus I2C compartido con reserva por prioridad.
+
+    :param id: Identificador del periférico I2C.
+    :param scl: Pin SCL.
+    :param sda: Pin SDA.
+    :param freq: Frecuencia deseada. Se usa la menor entre esta y las que
+                 admiten todos los clientes (ver negotiate()).
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, id, scl, sda, freq=400000, debug=False):
+        self.id = id
+        self.scl = scl
+        self.sda = sda
+        self.max_freq = freq
+        self.DEBUG = debug
+
+        # Arranca a velocidad estándar hasta conocer a todos los clientes
+        self.freq = min(freq, 400000)
+        self.i2c = I2C(id, scl=scl, sda=sda, freq=self.freq)
+
+        self.clients = {}
+
+        # Cliente que tiene reservado el bus y clientes a la espera como
+        # [prioridad, cliente, evento], el primero es el siguiente en
+        # recibirlo
+        self.owner = None
+        self.waiters = []
+
+    def client (self, name, max_freq=400000, priority=0) -> I2CClient:
+        """
+        Registra un dispositivo del bus.
+
+        :return: Instancia de I2CClient para pasar al driver.
+        """
+        client = I2CClient(self, name, max_freq, priority)
+        self.clients[name] = client
+
+        return client
+
+    def get (self, name):
+        """
+        Devuelve el cliente registrado con ese nombre o None.
+        """
+        return self.clients.get(name)
+
+    def negotiate (self) -> int:
+        """
+        Ajusta el bus a la mayor frecuencia que admiten todos los clientes,
+        por ejemplo 1 MHz si todos lo permiten.
+
+        :return: Frecuencia del bus.
+        """
+        freq = self.max_freq
+
+        for client in self.clients.values():
+            freq = min(freq, client.max_freq)
+
+        if freq != self.freq:
+            self.freq = freq
+            self.i2c = I2C(self.id, scl=self.scl, sda=self.sda, freq=freq)
+
+        if self.DEBUG:
+            print('Frecuencia del bus I2C:', freq)
+
+        return freq
+
+    def preempted (self, client) -> bool:
+        """
+        Indica si otro cliente de mayor prioridad necesita el bus.
+        """
+        for other in self.clients.values():
+            if other.priority > client.priority and other.pending is not None \
+                    and other.pending():
+                return True
+
+        return False
+
+    def contended (self, client) -> bool:
+        """
+        Indica si un cliente de mayor prioridad espera el bus o lo necesita.
+        """
+        return (self.waiters and self.waiters[0][0] > client.priority) or \
+            self.preempted(client)
+
+    def grant (self) -> None:
+        """
+        Entrega el bus libre al primero de la cola si no lo necesita antes
+        un cliente de mayor prioridad.
+
+        :return:
+        """
+        if self.owner is not None or not self.waiters:
+            return
+
+        client = self.waiters[0][1]
+
+        if self.preempted(client):
+            return
+
+        self.owner = client
+        self.waiters.pop(0)[2].set()
+
+    async def acquire (self, client, since=None) -> None:
+        """
+        Reserva el bus para el cliente. Si lo tiene otro o lo necesita un
+        cliente de mayor prioridad espera su turno en la cola hasta que se lo
+        entrega release(). Solo mientras haya una IRQ pendiente de un
+        cliente que aún no lo ha pedido se vuelve a comprobar cada
+        PREEMPT_CHECK_MS.
+
+        En el histograma solo se registran las reservas que han esperado.
+
+        :param client: Instancia de I2CClient.
+        :param since: Instante (ticks_us) desde el que el cliente necesita
+                      el bus para medir la espera, por defecto ahora.
+        :return:
+        """
+        start = ticks_us() if since is None else since
+        client.acquired += 1
+
+        if self.owner is None and not self.waiters and \
+                not self.preempted(client):
+            self.owner = client
+            return
+
+        # Detrás de los de su prioridad o mayor, por orden de llegada
+        entry = [client.priority, client, asyncio.Event()]
+        position = 0
+
+        while position < len(self.waiters) and \
+                self.waiters[position][0] >= client.priority:
+            position += 1
+
+        self.waiters.insert(position, entry)
+        self.grant()
+
+        granted = entry[2]
+
+        if granted.is_set():
+            return
+
+        try:
+            while not granted.is_set():
+                if self.preempted(client):
+                    # Nadie avisará cuando deje de estar pendiente
+                    try:
+                        await asyncio.wait_for_ms(granted.wait(),
+                                                  PREEMPT_CHECK_MS)
+                    except asyncio.TimeoutError:
+                        self.grant()
+                else:
+                    await granted.wait()
+        except BaseException:
+            # Cancelada: deja la cola y no retiene el bus ya concedido
+            if entry in self.waiters:
+                self.waiters.remove(entry)
+
+            self.release(client)
+            raise
+
+        client.record_wait(max(0, ticks_diff(ticks_us(), start)))
+
+    def release (self, client) -> None:
+        """
+        Libera el bus si lo tiene el cliente y se lo entrega al siguiente.
+        """
+        if self.owner is client:
+            self.owner = None
+            self.grant()
+
+    async def run (self, client, steps) -> None:
+        """
+        Ejecuta por pasos una operación larga. Entre un paso y otro cede el
+        bus solo si lo necesita un cliente de mayor prioridad.
+
+        :param client: Instancia de I2CClient.
+        :param steps: Generador que hace una parte de la operación en cada
+                      iteración (por ejemplo, SSD1306.flush()).
+        :return:
+        """
+        await self.acquire(client)
+
+        try:
+            for _ in steps:
+                if self.contended(client):
+                    self.release(client)
+                    await self.acquire(client)
+        finally:
+            self.release(client)
+
+    def get_stats (self) -> dict:
+        """
+        Devuelve la frecuencia y, por cliente, las reservas y el histograma
+        de las que tuvieron que esperar.
+        """
+        stats = {'freq': self.freq}
+
+        for name in self.clients:
+            client = self.clients[name]
+            stats[name] = {
+                'acquired': client.acquired,
+                'waits': list(client.waits),
+                'wait_max_us': client.wait_max_us,
+            }
+
+        return stats
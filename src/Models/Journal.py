@@ -0,0 +1,339 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Cola persistente de rayos pendientes de subir a la API sobre el sistema de
+# ficheros LittleFS de la Rpi Pico. Los rayos se guardan en un fichero binario
+# de solo añadir con registros de tamaño fijo y un segundo fichero guarda el
+# cursor de confirmación (registros ya subidos). Así sobreviven a reinicios,
+# resets del watchdog o caídas de tensión.
+#
+# El cursor guarda también una copia del primer registro sin confirmar. Al
+# arrancar se comprueba que coincide con el del fichero: si no (corte entre
+# guardar el cursor y sustituir el fichero al compactar) se busca ese
+# registro, de modo que como mucho se reenvían rayos pero nunca se pierden.
+#
+# Las escrituras se agrupan en memoria para reducir el desgaste de la flash:
+# si la subida se confirma antes de volcarlas, nunca llegan a escribirse.
+
+import os
+import struct
+from time import ticks_us, ticks_diff
+from Models.StrikeBuffer import DISTANCE_OUT_OF_RANGE
+
+# Registro: timestamp, energía, distancia, piso de ruido y tipo
+RECORD_FORMAT = '<IIBBB'
+RECORD_SIZE = const(11)
+
+
+class Journal:
+    """
+    Cola persistente de rayos con cursor de confirmación.
+
+    :param path: Ruta del fichero de registros.
+    :param flush_records: Registros agrupados en memoria antes de escribir.
+    :param max_records: Tamaño a partir del cual se compacta el fichero
+                        eliminando los registros ya confirmados.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, path='/lightnings.dat', flush_records=16,
+                  max_records=5000, debug=False):
+        self.path = path
+        self.ack_path = path + '.ack'
+        self.flush_records = flush_records
+        self.max_records = max_records
+        self.DEBUG = debug
+
+        # Registros agrupados pendientes de escribir
+        self.buffer = bytearray(RECORD_SIZE * flush_records)
+        self.buffered = 0
+
+        # Registros escritos en el fichero y confirmados de ellos
+        self.committed = 0
+        self.acked = 0
+
+        # Tiempos (µs) de la última escritura y la última lectura
+        self.flush_us = 0
+        self.read_us = 0
+
+        self.load()
+
+    def load (self) -> None:
+        """
+        Recupera el estado desde la flash. Si el último registro quedó a
+        medias (corte de tensión durante la escritura) se descarta.
+        :return:
+        """
+        try:
+            size = os.stat(self.path)[6]
+        except OSError:
+            size = 0
+
+        self.committed = size // RECORD_SIZE
+
+        try:
+            with open(self.ack_path, 'rb') as f:
+                data = f.read()
+
+            self.acked = min(struct.unpack_from('<I', data, 0)[0],
+                             self.committed)
+            first = data[4:4 + RECORD_SIZE]
+
+            # El cursor no corresponde al fichero, se busca su registro
+            if len(first) == RECORD_SIZE and self.read_record(self.acked) != first:
+                self.acked = self.find_record(first)
+        except (OSError, ValueError, struct.error):
+            self.acked = 0
+
+        if size % RECORD_SIZE:
+            self.compact()
+
+        if self.DEBUG and self.pending():
+            print('Rayos pendientes en la cola persistente:', self.pending())
+
+    def pending (self) -> int:
+        """
+        Devuelve el número de rayos sin confirmar.
+        :return:
+        """
+        return self.committed - self.acked + self.buffered
+
+    def append (self, timestamp, distance, energy, noise_floor, type) -> None:
+        """
+        Añade un rayo a la cola. Se escribe en la flash al juntar
+        'flush_records' registros o al llamar a flush().
+        :return:
+        """
+        struct.pack_into(RECORD_FORMAT, self.buffer,
+                         self.buffered * RECORD_SIZE, timestamp, energy,
+                         DISTANCE_OUT_OF_RANGE if distance is False else distance,
+                         noise_floor, type)
+        self.buffered += 1
+
+        if self.buffered == self.flush_records:
+            self.flush()
+
+    def flush (self) -> None:
+        """
+        Escribe en la flash los registros agrupados en memoria.
+        :return:
+        """
+        if not self.buffered:
+            return
+
+        start = ticks_us()
+
+        with open(self.path, 'ab') as f:
+            f.write(memoryview(self.buffer)[:self.buffered * RECORD_SIZE])
+
+        self.committed += self.buffered
+        self.buffered = 0
+        self.flush_us = ticks_diff(ticks_us(), start)
+
+    def read (self, count) -> list:
+        """
+        Devuelve los 'count' rayos sin confirmar más antiguos, primero los de
+        la flash y después los agrupados en memoria.
+
+        :param count: Número máximo de rayos a devolver.
+        :return: Lista de tuplas (timestamp, distancia, energía, piso de
+                 ruido, tipo).
+        """
+        start = ticks_us()
+        lightnings = []
+
+        in_file = min(count, self.committed - self.acked)
+
+        if in_file > 0:
+            data = bytearray(in_file * RECORD_SIZE)
+
+            with open(self.path, 'rb') as f:
+                f.seek(self.acked * RECORD_SIZE)
+                f.readinto(data)
+
+            self.unpack(data, in_file, lightnings)
+
+        in_buffer = min(count - len(lightnings), self.buffered)
+
+        if in_buffer > 0:
+            self.unpack(self.buffer, in_buffer, lightnings)
+
+        self.read_us = ticks_diff(ticks_us(), start)
+
+        return lightnings
+
+    def read_record (self, index) -> bytes:
+        """
+        Lee un registro del fichero sin decodificar.
+
+        :return: Bytes del registro o vacío si no existe.
+        """
+        if index >= self.committed:
+            return b''
+
+        with open(self.path, 'rb') as f:
+            f.seek(index * RECORD_SIZE)
+
+            return f.read(RECORD_SIZE)
+
+    def find_record (self, record) -> int:
+        """
+        Busca la primera aparición de un registro en el fichero.
+
+        :return: Posición del registro o 0 si no está.
+        """
+        chunk = bytearray(RECORD_SIZE * self.flush_records)
+        index = 0
+
+        with open(self.path, 'rb') as f:
+            while index < self.committed:
+                count = min(self.flush_records, self.committed - index)
+                f.readinto(memoryview(chunk)[:count * RECORD_SIZE])
+
+                for i in range(count):
+                    if chunk[i * RECORD_SIZE:(i + 1) * RECORD_SIZE] == record:
+                        return index + i
+
+                index += count
+
+        return 0
+
+    def unpack (self, data, count, lightnings) -> None:
+        """
+        Decodifica 'count' registros de 'data' y los añade a 'lightnings'.
+        :return:
+        """
+        for i in range(count):
+            timestamp, energy, distance, noise_floor, type = struct.unpack_from(
+                RECORD_FORMAT, data, i * RECORD_SIZE)
+
+            lightnings.append((timestamp,
+                               False if distance == DISTANCE_OUT_OF_RANGE else distance,
+                               energy, noise_floor, type))
+
+    def ack (self, count) -> None:
+        """
+        Confirma los 'count' rayos más antiguos como subidos.
+
+        :param count: Número de rayos confirmados.
+        :return:
+        """
+        in_file = min(count, self.committed - self.acked)
+        self.acked += in_file
+
+        # Los agrupados en memoria confirmados ya no se escriben
+        in_buffer = min(count - in_file, self.buffered)
+
+        if in_buffer > 0:
+            size = RECORD_SIZE * in_buffer
+            remaining = RECORD_SIZE * (self.buffered - in_buffer)
+            self.buffer[:remaining] = self.buffer[size:size + remaining]
+            self.buffered -= in_buffer
+
+        if self.acked == self.committed:
+            self.reset()
+        elif in_file > 0:
+            if self.committed >= self.max_records:
+                self.compact()
+            else:
+                self.save_cursor()
+
+    def save_cursor (self) -> None:
+        """
+        Guarda en la flash el cursor de confirmación.
+        :return:
+        """
+        self.write_cursor(self.acked, self.read_record(self.acked))
+
+    def write_cursor (self, acked, first) -> None:
+        """
+        Escribe el cursor con la copia del primer registro sin confirmar.
+
+        :param acked: Registros confirmados.
+        :param first: Bytes del registro en la posición 'acked'.
+        :return:
+        """
+        with open(self.ack_path, 'wb') as f:
+            f.write(struct.pack('<I', acked))
+            f.write(first)
+
+    def reset (self) -> None:
+        """
+        Elimina los ficheros cuando todos los registros están confirmados.
+        :return:
+        """
+        for path in (self.path, self.ack_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        self.committed = 0
+        self.acked = 0
+
+    def compact (self) -> None:
+        """
+        Reescribe el fichero solo con los registros sin confirmar.
+        :return:
+        """
+        tmp_path = self.path + '.tmp'
+        pending = self.committed - self.acked
+        chunk = bytearray(RECORD_SIZE * self.flush_records)
+
+        first = b''
+
+        with open(self.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            src.seek(self.acked * RECORD_SIZE)
+            copied = 0
+
+            while copied < pending:
+                count = min(self.flush_records, pending - copied)
+                size = count * RECORD_SIZE
+                src.readinto(memoryview(chunk)[:size])
+                dst.write(memoryview(chunk)[:size])
+
+                if not copied:
+                    first = bytes(chunk[:RECORD_SIZE])
+
+                copied += count
+
+        # El cursor del fichero compactado se guarda antes de sustituirlo. Si
+        # se corta entre ambos pasos, load() encuentra el primer registro sin
+        # confirmar en el fichero antiguo
+        self.write_cursor(0, first)
+        os.rename(tmp_path, self.path)
+
+        self.committed = pending
+        self.acked = 0
@@ -37,72 +37,126 @@
 # usando el chip AS3935 por i2c en raspberry pi pico w con micropython.
 
 
-from machine import Pin, I2C, SPI
+from machine import Pin
+import micropython
 import utime
-from time import sleep_ms
+from time import sleep_us, ticks_us, ticks_diff
 from Models.SensorCJMCUAS3935_4 import SensorCJMCUAS3935
+from Models.StrikeBuffer import StrikeBuffer
+
+# Tiempo mínimo (µs) entre el flanco de IRQ y la lectura del registro de
+# interrupción según la hoja de datos del AS3935.
+IRQ_READ_DELAY_US = const(2000)
 
 
 class Lightning:
     sensor = None
-    lightnings = []
+    lightnings = None
 
     def __init__(self, i2c=None, address=None, pin_irq=26,
-                 debug=False, indoor=True):
+                 debug=False, indoor=True, capacity=500):
         # Marco el modo debug para el modelo.
         self.DEBUG = debug
 
+        # Estado de la interrupción pendiente de procesar. Se crean aquí, en
+        # la instancia, para que la IRQ (hard=True) solo modifique atributos
+        # existentes y no reserve memoria.
+        self.pending = False
+        self.irq_ticks = 0
+        self.irq_merged = 0
+
+        # Flag (asyncio.ThreadSafeFlag) a señalar desde la IRQ en lugar de
+        # programar el procesado con micropython.schedule()
+        self.event_flag = None
+
+        # Instante del flanco del último rayo registrado
+        self.strike_ticks = 0
+
+        # Buffer de tamaño fijo con los rayos pendientes de procesar.
+        self.lightnings = StrikeBuffer(capacity)
+
         # Instancio el sensor como atributo de este modelo.
         self.sensor = (SensorCJMCUAS3935(i2c=i2c, address=address, debug=True,indoor=indoor))
 
+        # Referencia al método de procesado creada una sola vez, para que
+        # programarlo desde la IRQ no reserve memoria.
+        self.process_ref = self.process_interrupt
+
         # Configuro el pin de interrupción cuando se detecta eventos
-        pin = Pin(pin_irq, Pin.IN, Pin.PULL_UP)
+        self.pin = Pin(pin_irq, Pin.IN, Pin.PULL_UP)
 
         # Inicio Callback para en cada detección registrar rayo
-        pin.irq(trigger=Pin.IRQ_FALLING, handler=self.handle_interrupt)
-
-        """
-        self.lightnings.append({
-            "noise_floor": 2,
-            "distance": 3,
-            "type": 1,
-            "energy": 123123,
-            "timestamp_read": utime.time(),
-        })
-
-        sleep_ms(1000)
-        """
+        self.pin.irq(trigger=Pin.IRQ_FALLING, handler=self.handle_interrupt,
+                     hard=True)
 
         if self.DEBUG:
             print('Inicializado sensor de rayos y esperando detectar campos electromagnéticos para procesarlos.')
 
     def handle_interrupt(self, channel):
         """
-        Función que se ejecuta cuando detecta un rayo para registrarlo
-        en el array de objetos con los datos registrados.
+        Callback de la IRQ del sensor. Solo guarda el instante del flanco y
+        marca el evento como pendiente, sin reservar memoria, para que sea
+        seguro con hard=True. La lectura del sensor se programa con
+        micropython.schedule() y se hace fuera de la interrupción.
         :return:
         """
-        sleep_ms(30)
+        if self.pending:
+            # El evento anterior aún no se ha leído.
+            self.irq_merged += 1
+            return
+
+        self.irq_ticks = ticks_us()
+        self.pending = True
+
+        if self.event_flag is not None:
+            self.event_flag.set()
+            return
+
+        try:
+            micropython.schedule(self.process_ref, 0)
+        except RuntimeError:
+            # Cola llena, lo procesará el bucle principal.
+            pass
+
+    def process_interrupt(self, arg=None):
+        """
+        Lee y registra el evento pendiente de la IRQ, si lo hay. Se ejecuta
+        programado desde handle_interrupt() y también puede llamarse desde el
+        bucle principal.
+        :return: Origen del evento procesado, 0 si no había ninguno.
+        """
+        if not self.pending:
+            return 0
+
         sensor = self.sensor
 
-        # Momento actual en formato timestamp respecto a inicio del microcontrolador.
-        now = utime.time()
+        # Espero solo lo que falte hasta que el sensor tenga el dato listo.
+        elapsed = ticks_diff(ticks_us(), self.irq_ticks)
+
+        if elapsed < IRQ_READ_DELAY_US:
+            sleep_us(IRQ_READ_DELAY_US - elapsed)
+            elapsed = IRQ_READ_DELAY_US
+
+        # Reinicio el contador de transacciones I2C para medir este evento.
+        sensor.get_i2c_transactions(reset=True)
 
-        reason = sensor.get_interrupt_src()
+        # Momento del flanco en formato timestamp respecto a inicio del microcontrolador.
+        now = utime.time() - elapsed // 1000000
+
+        # Lectura de todos los datos del evento en una sola transacción. Si
+        # falla la lectura el evento se pierde, pero la IRQ debe volver a
+        # atender los siguientes.
+        try:
+            reason, distance, energy, noise_floor = sensor.read_event()
+        finally:
+            self.pending = False
 
         if reason == 1:
             # En este punto, parece una detección correcta y la guardo.
-            self.lightnings.append({
-                "noise_floor": self.get_noise_floor(),
-                "distance": self.get_distance(),
-                "type": self.get_type(),
-                "energy": self.get_energy(),
-                "timestamp_read": utime.time(),
-            })
+            self.lightnings.push(now, distance, energy, noise_floor, reason)
+            self.strike_ticks = self.irq_ticks
 
             if self.DEBUG:
-                distance = sensor.get_distance()
-
                 print('--------------------------')
                 print('¡Se ha detectado un posible RAYO!')
                 print('Timestamp: ' + str(now))
@@ -111,14 +165,15 @@ class Lightning:
                 print("All Data:")
                 print('Distance:' + str(distance))
                 print('Interrupt: 3')
-                print('Energy:' + str(self.sensor.get_energy()))
-                print('Ruido:' + str(self.sensor.get_noise_floor()))
+                print('Energy:' + str(energy))
+                print('Ruido:' + str(noise_floor))
                 # print('In Indoor:' + str(self.sensor.get_indoors()))
                 # print('Mask Disturber:' + str(self.sensor.get_mask_disturber()))
                 print('--------------------------')
 
         elif reason == 2:
             # Perturbador detectado
+            sensor.set_mask_disturber(True)
 
             #sensor.set_noise_floor(self.get_noise_floor() + 1)
             #sensor.set_watchdog_threshold(sensor.get_watchdog_threshold() + 1)
@@ -131,6 +186,7 @@ class Lightning:
                 print('--------------------------')
         elif reason == 3:
             # Ruido demasiado alto
+            sensor.raise_noise_floor()
 
             #sensor.set_noise_floor(self.get_noise_floor() + 1)
             # sensor.set_watchdog_threshold(sensor.get_watchdog_threshold() + 1)
@@ -148,58 +204,21 @@ class Lightning:
                 print(
                     'Se ha detectado algo no controlado aún, ¿Has provocado el irq?')
 
-        """
-        if reason == 0x01:
-            # TODO: Implementar? Ver más exactamente que ha ocurrido?
-            sensor.raise_noise_floor()
-
-            if self.DEBUG:
-                print('El nivel de ruido es demasiado alto → Ajustando')
-
-                print('--------------------------')
-                print('El nivel de ruido es demasiado alto → Calibrando')
-                print('Timestamp: ' + str(now))
-                print('--------------------------')
-
-        elif reason == 0x04:
-            sensor.set_mask_disturber(True)
-
-            if self.DEBUG:
-                print('--------------------------')
-                print('Se ha detectado una perturbación → Enmascarándola')
-                print('Timestamp: ' + str(now))
-                print('--------------------------')
+        if self.DEBUG:
+            print('Transacciones I2C en el evento: ' + str(sensor.get_i2c_transactions()))
 
-        elif reason == 0x08:
-            # En este punto, parece una detección correcta y la guardo.
-            self.lightnings.append({
-                "noise_floor": self.get_noise_floor(),
-                "distance": self.get_distance(),
-                "type": self.get_type(),
-                "energy": self.get_energy(),
-                "timestamp_read": utime.time(),
-            })
+        return reason
 
-            if self.DEBUG:
-                distance = sensor.get_distance()
+    def set_event_flag(self, flag):
+        """
+        Establece un flag (asyncio.ThreadSafeFlag) que la IRQ señalará en
+        cada evento, para que lo procese una tarea en lugar de
+        micropython.schedule().
 
-                print('--------------------------')
-                print('¡Se ha detectado un posible RAYO!')
-                print('Timestamp: ' + str(now))
-                print("Está a " + str(distance) + "km de distancia.")
-                print("------------------------")
-                print("All Data:")
-                print('Distance:' + str(self.sensor.get_distance()))
-                print('Interrupt:' + str(self.sensor.get_interrupt()))
-                print('Energy:' + str(self.sensor.get_energy()))
-                print('Ruido:' + str(self.sensor.get_noise_floor()))
-                print('In Indoor:' + str(self.sensor.get_indoors()))
-                print('Mask Disturber:' + str(self.sensor.get_mask_disturber()))
-                print('--------------------------')
-        else:
-            if self.DEBUG:
-                print('Se ha detectado algo no controlado aún, ¿Has provocado el irq?')
-    """
+        :param flag: Flag a señalar o None para volver a usar schedule().
+        :return:
+        """
+        self.event_flag = flag
 
     def check_exist_strike(self) -> bool:
         """
@@ -221,12 +240,14 @@ class Lightning:
         return self.sensor.get_energy()
 
 
-    def clear_datas(self):
+    def clear_datas(self, count=None):
         """
+        Elimina los rayos más antiguos del buffer.
 
+        :param count: Cantidad a eliminar, None para vaciarlo.
         :return:
         """
-        self.lightnings = []
+        self.lightnings.discard(count)
 
     def get_all_datas(self):
         """
@@ -234,8 +255,8 @@ class Lightning:
         :return:
         """
 
-        if self.lightnings and len(self.lightnings):
-            reads = self.lightnings
+        if len(self.lightnings):
+            reads = list(self.lightnings)
 
             self.clear_datas()
 
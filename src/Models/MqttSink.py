@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+import usocket
+import utime
+from time import ticks_ms, ticks_diff
+from Models.Compressor import BufferStream
+from Models.Payload import JsonPayload, BinaryPayload
+
+
+class MqttSink:
+    """
+    Publica los rayos en un broker MQTT con la misma interfaz que Api.
+
+    Mantiene una única conexión abierta, publica con QoS 1 limitando los
+    mensajes pendientes de confirmación (ventana) y usa un topic de estado
+    retenido con mensaje de última voluntad para saber si la estación está
+    conectada.
+
+    Topics usados:
+    - <prefix>/<device_id>/strikes: rayos, por rayo o en micro-lotes.
+    - <prefix>/<device_id>/status: "online"/"offline" (retenido).
+
+    :param controller: The controller object for raspberry pi pico.
+    :param host: Host del broker.
+    :param port: Puerto del broker.
+    :param device_id: The unique identifier of the device.
+    :param user: Usuario del broker, opcional.
+    :param password: Contraseña del broker, opcional.
+    :param prefix: Prefijo de los topics.
+    :param batch_size: Rayos por mensaje, 1 para publicar por rayo.
+    :param window: Mensajes QoS 1 sin confirmar como máximo.
+    :param payload_format: Formato de cada mensaje, 'json' o 'binary'.
+    :param max_bytes: Tamaño máximo de cada mensaje.
+    :param timeout: Tiempo máximo en segundos para conectar y esperar
+                    confirmaciones.
+    :param keepalive: Segundos sin paquetes tras los que el broker da la
+                      conexión por perdida y publica la última voluntad.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, controller, host, device_id, port=1883, user=None,
+                  password=None, prefix='lightning', batch_size=10, window=4,
+                  payload_format='json', max_bytes=2048, timeout=10,
+                  keepalive=60, debug=False):
+        self.CONTROLLER = controller
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.client_id = 'lightning-' + str(device_id)
+        self.batch_size = batch_size
+        self.window = window
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.DEBUG = debug
+
+        base = prefix + '/' + str(device_id) + '/'
+        self.topic_strikes = (base + 'strikes').encode()
+        self.topic_status = (base + 'status').encode()
+
+        if payload_format == 'binary':
+            self.payload = BinaryPayload(device_id)
+        else:
+            self.payload = JsonPayload(device_id)
+
+        self.message = bytearray(max_bytes)
+        self.sock = None
+        self.next_pid = 1
+
+        # Instante del último paquete enviado, para el PINGREQ
+        self.sent_ms = 0
+
+        # Mensajes sin confirmar: id de paquete → (instante, rayos)
+        self.inflight = {}
+
+        # Misma interfaz que Api. Se usan códigos HTTP equivalentes para que
+        # el planificador de reintentos los trate igual: 201 si se confirman
+        # todos los mensajes y 0 si falla la conexión.
+        self.last_status = 0
+        self.last_sent = 0
+        self.last_count = 0
+
+        # Estadísticas
+        self.published = 0
+        self.strikes = 0
+        self.ack_ms = 0
+        self.ack_max_ms = 0
+        self.strikes_per_second = 0
+
+    @staticmethod
+    def encode_length (length) -> bytes:
+        """
+        Codifica la longitud restante de un paquete MQTT.
+        """
+        data = bytearray()
+
+        while True:
+            byte = length & 0x7F
+            length >>= 7
+            data.append(byte | 0x80 if length else byte)
+
+            if not length:
+                return bytes(data)
+
+    @staticmethod
+    def encode_string (value) -> bytes:
+        if isinstance(value, str):
+            value = value.encode()
+
+        return bytes((len(value) >> 8, len(value) & 0xFF)) + value
+
+    def connect (self) -> None:
+        """
+        Abre la sesión con el broker, registra la última voluntad y publica
+        el estado retenido "online".
+        :return:
+        """
+        address = usocket.getaddrinfo(self.host, self.port, 0,
+                                      usocket.SOCK_STREAM)[0][-1]
+        sock = usocket.socket()
+        sock.settimeout(self.timeout)
+
+        try:
+            sock.connect(address)
+        except Exception:
+            sock.close()
+            raise
+
+        self.sock = sock
+        self.inflight = {}
+
+        # Sesión limpia, última voluntad retenida con QoS 1
+        flags = 0x02 | 0x04 | 0x08 | 0x20
+        payload = (self.encode_string(self.client_id) +
+                   self.encode_string(self.topic_status) +
+                   self.encode_string(b'offline'))
+
+        if self.user:
+            flags |= 0x80
+            payload += self.encode_string(self.user)
+
+        if self.password:
+            flags |= 0x40
+            payload += self.encode_string(self.password)
+
+        header = b'\x00\x04MQTT\x04' + bytes((flags, self.keepalive >> 8,
+                                               self.keepalive & 0xFF))
+
+        try:
+            sock.write(b'\x10' + self.encode_length(len(header) + len(payload)))
+            sock.write(header)
+            sock.write(payload)
+            self.sent_ms = ticks_ms()
+
+            packet_type, body = self.read_packet()
+
+            if packet_type != 0x20 or body[1] != 0:
+                raise OSError('Conexión rechazada por el broker')
+
+            self.publish(self.topic_status, b'online', retain=True)
+        except Exception:
+            self.close()
+            raise
+
+        if self.DEBUG:
+            print('Conectado al broker MQTT', self.host)
+
+    def close (self) -> None:
+        """
+        Cierra la conexión sin desconexión limpia, por lo que el broker
+        publicará la última voluntad.
+        :return:
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+        self.inflight = {}
+
+    def read_packet (self):
+        """
+        Lee un paquete completo del broker.
+
+        :return: Tupla (tipo, cuerpo).
+        """
+        header = self.sock.read(1)
+
+        if not header:
+            raise OSError('Conexión cerrada por el broker')
+
+        length = 0
+        shift = 0
+
+        while True:
+            byte = self.sock.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+
+            if not byte & 0x80:
+                break
+
+        return header[0] & 0xF0, self.sock.read(length) if length else b''
+
+    def publish (self, topic, data, retain=False, count=0) -> int:
+        """
+        Publica un mensaje con QoS 1 sin esperar la confirmación.
+
+        :param count: Rayos incluidos en el mensaje.
+
+        :return: Identificador de paquete.
+        """
+        pid = self.next_pid
+        self.next_pid = pid % 0xFFFF + 1
+
+        self.sock.write(bytes((0x32 | (0x01 if retain else 0),)) +
+                        self.encode_length(2 + len(topic) + 2 + len(data)))
+        self.sock.write(self.encode_string(topic) + bytes((pid >> 8, pid & 0xFF)))
+        self.sock.write(data)
+        self.sent_ms = ticks_ms()
+
+        self.inflight[pid] = (ticks_ms(), count)
+        self.published += 1
+
+        return pid
+
+    def ping (self) -> None:
+        """
+        Envía un PINGREQ y espera el PINGRESP.
+        :return:
+        """
+        self.sock.write(b'\xc0\x00')
+        self.sent_ms = ticks_ms()
+
+        while True:
+            packet_type, body = self.read_packet()
+
+            if packet_type == 0xD0:
+                return
+
+    def poll (self) -> None:
+        """
+        Mantiene viva la sesión entre subidas: pasada la mitad del
+        keep-alive sin enviar nada manda un PINGREQ. Si el broker no
+        responde se reconecta.
+        :return:
+        """
+        if self.sock is None or not self.keepalive:
+            return
+
+        if ticks_diff(ticks_ms(), self.sent_ms) < self.keepalive * 500:
+            return
+
+        try:
+            self.ping()
+        except Exception as e:
+            if self.DEBUG:
+                print('Sin respuesta al ping MQTT, reconectando:', e)
+
+            self.close()
+            self.connect()
+
+    def wait_ack (self) -> int:
+        """
+        Espera la siguiente confirmación (PUBACK) y actualiza las
+        estadísticas de latencia.
+
+        :return: Identificador de paquete confirmado.
+        """
+        while True:
+            packet_type, body = self.read_packet()
+
+            if packet_type != 0x40:
+                continue
+
+            pid = (body[0] << 8) | body[1]
+            sent = self.inflight.pop(pid, None)
+
+            if sent is not None:
+                self.ack_ms = ticks_diff(ticks_ms(), sent[0])
+
+                if self.ack_ms > self.ack_max_ms:
+                    self.ack_max_ms = self.ack_ms
+
+            return pid
+
+    def build_message (self, lightnings, start, now):
+        """
+        Codifica en el buffer del mensaje hasta 'batch_size' rayos a partir
+        de la posición 'start', sin superar 'max_bytes'. Los que no caben
+        van en el siguiente mensaje.
+
+        :return: Tupla (bytes del mensaje, rayos incluidos).
+        """
+        payload = self.payload
+        stream = BufferStream(self.message)
+        limit = min(self.batch_size, len(lightnings) - start)
+        first = lightnings[start][0]
+        previous = first
+        footer = len(payload.footer())
+        count = 0
+
+        # La cabecera tiene tamaño fijo, se reescribe con el número final
+        header = payload.header(limit, now, first)
+        header_size = len(header)
+        stream.write(header)
+
+        while count < limit:
+            lightning = lightnings[start + count]
+            data = payload.encode(lightning, count, previous, now)
+
+            if stream.size + len(data) + footer > len(self.message):
+                if not count:
+                    raise OSError('Rayo mayor que el tamaño máximo del mensaje')
+
+                break
+
+            stream.write(data)
+            previous = lightning[0]
+            count += 1
+
+        stream.write(payload.footer())
+
+        if count < limit:
+            self.message[:header_size] = payload.header(count, now, first)
+
+        return stream.size, count
+
+    def save_lightnings (self, lightnings) -> bool:
+        """
+        Publica los rayos en micro-lotes de 'batch_size' con QoS 1.
+
+        Solo se cuentan como enviados ('last_sent') los rayos de los mensajes
+        confirmados de forma consecutiva desde el primero. Si se corta la
+        conexión tras confirmar alguno, la subida es correcta para esos y el
+        resto se envía en la siguiente, sin repetir los confirmados.
+
+        :param lightnings: Lista de tuplas de rayos o StrikeBuffer.
+        :return:
+        """
+        self.last_status = 0
+        self.last_sent = 0
+        self.last_count = 0
+
+        if not isinstance(lightnings, list):
+            lightnings = list(lightnings)
+
+        if not lightnings:
+            self.last_status = 204
+            return True
+
+        start_ms = ticks_ms()
+        now = utime.time()
+
+        # Rayos de cada mensaje en orden de publicación
+        pending = []
+        acked = 0
+        position = 0
+
+        try:
+            if self.sock is None:
+                self.connect()
+
+            while position < len(lightnings) or self.inflight:
+                if position < len(lightnings) and len(self.inflight) < self.window:
+                    size, count = self.build_message(lightnings, position, now)
+                    pid = self.publish(self.topic_strikes,
+                                       memoryview(self.message)[:size],
+                                       count=count)
+                    pending.append([pid, count, False])
+                    position += count
+                    continue
+
+                pid = self.wait_ack()
+
+                for message in pending:
+                    if message[0] == pid:
+                        message[2] = True
+
+                # Avanzo los confirmados de forma consecutiva
+                while pending and pending[0][2]:
+                    acked += pending.pop(0)[1]
+
+            self.last_status = 201
+        except Exception as e:
+            if self.DEBUG:
+                print('Error al publicar en MQTT:', e)
+
+            self.close()
+
+            # Los confirmados no deben reintentarse
+            if acked:
+                self.last_status = 201
+
+        self.last_sent = acked
+        self.last_count = position
+        self.strikes += acked
+
+        elapsed = ticks_diff(ticks_ms(), start_ms)
+
+        if acked and elapsed > 0:
+            self.strikes_per_second = acked * 1000 // elapsed
+
+        if self.DEBUG:
+            print('MQTT:', acked, 'rayos confirmados en', elapsed,
+                  'ms, última confirmación en', self.ack_ms, 'ms')
+
+        return self.last_status == 201
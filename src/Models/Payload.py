@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Formatos del cuerpo de las subidas de rayos a la API. Cada formato genera
+# el cuerpo por partes (cabecera, un fragmento por rayo y cierre) para poder
+# escribirlo directamente en el socket y calcular su tamaño de antemano.
+import struct
+import ujson
+
+# Valor de distancia que indica fuera de rango
+DISTANCE_OUT_OF_RANGE = const(0x3F)
+
+# Cabecera binaria: firma, versión, dispositivo, momento del envío, timestamp
+# del primer rayo y número de rayos
+BINARY_MAGIC = b'LTN'
+BINARY_VERSION = const(1)
+BINARY_HEADER_FORMAT = '<3sBIIIH'
+BINARY_HEADER_SIZE = const(18)
+
+
+class JsonPayload:
+    """
+    Cuerpo JSON con un objeto por rayo, compatible con el endpoint original.
+
+    :param device_id: The unique identifier of the device.
+    """
+
+    content_type = 'application/json'
+
+    def __init__ (self, device_id):
+        self.start = ('{"hardware_device_id":' + ujson.dumps(device_id) +
+                      ',"lightnings":[').encode()
+
+    def header (self, count, now, first_timestamp) -> bytes:
+        return self.start
+
+    def footer (self) -> bytes:
+        return b']}'
+
+    def encode (self, lightning, index, previous, now) -> bytes:
+        """
+        Codifica un rayo como objeto JSON, precedido de una coma salvo el
+        primero.
+
+        :param lightning: Tupla (timestamp, distancia, energía, piso de
+                          ruido, tipo).
+        :param index: Posición del rayo en el cuerpo.
+        :param previous: Timestamp del rayo anterior (no se usa).
+        :param now: Momento actual para calcular cuanto hace de la lectura.
+        :return:
+        """
+        timestamp, distance, energy, noise_floor, type = lightning
+
+        return ((',' if index else '') +
+                '{"noise_floor":' + str(noise_floor) +
+                ',"distance":' + ('false' if distance is False else str(distance)) +
+                ',"type":' + str(type) +
+                ',"energy":' + str(energy) +
+                ',"timestamp_read":' + str(timestamp) +
+                ',"read_seconds_ago":' + str((now - timestamp) + 1) +
+                '}').encode()
+
+
+class BinaryPayload:
+    """
+    Cuerpo binario compacto. Tras una cabecera fija de 18 bytes cada rayo
+    ocupa entre 6 y 10 bytes:
+
+    - Diferencia de timestamp con el rayo anterior (con el primero, respecto
+      al de la cabecera) como varint sin signo en zigzag.
+    - Distancia (1 byte, 0x3F si está fuera de rango).
+    - Energía (3 bytes little endian).
+    - Piso de ruido (bits 0-2) y tipo (bits 3-4) en 1 byte.
+
+    El servidor calcula read_seconds_ago con el momento del envío de la
+    cabecera. La función decode() es la implementación de referencia.
+
+    :param device_id: The unique identifier of the device (entero).
+    """
+
+    content_type = 'application/vnd.lightning.v1'
+
+    def __init__ (self, device_id):
+        self.device_id = device_id
+        self.head = bytearray(BINARY_HEADER_SIZE)
+        self.scratch = bytearray(10)
+
+    def header (self, count, now, first_timestamp) -> bytes:
+        struct.pack_into(BINARY_HEADER_FORMAT, self.head, 0, BINARY_MAGIC,
+                         BINARY_VERSION, self.device_id, now, first_timestamp,
+                         count)
+        return self.head
+
+    def footer (self) -> bytes:
+        return b''
+
+    def encode (self, lightning, index, previous, now):
+        """
+        Codifica un rayo en el buffer reutilizable.
+
+        :param lightning: Tupla (timestamp, distancia, energía, piso de
+                          ruido, tipo).
+        :param index: Posición del rayo en el cuerpo (no se usa).
+        :param previous: Timestamp del rayo anterior o de la cabecera.
+        :param now: Momento actual (no se usa, va en la cabecera).
+        :return: memoryview con los bytes del rayo.
+        """
+        timestamp, distance, energy, noise_floor, type = lightning
+        scratch = self.scratch
+
+        delta = timestamp - previous
+        value = (delta << 1) if delta >= 0 else ((-delta << 1) - 1)
+        size = 0
+
+        while value > 0x7F:
+            scratch[size] = (value & 0x7F) | 0x80
+            value >>= 7
+            size += 1
+
+        scratch[size] = value
+        scratch[size + 1] = DISTANCE_OUT_OF_RANGE if distance is False else distance
+        scratch[size + 2] = energy & 0xFF
+        scratch[size + 3] = (energy >> 8) & 0xFF
+        scratch[size + 4] = (energy >> 16) & 0xFF
+        scratch[size + 5] = (noise_floor & 0x07) | ((type & 0x03) << 3)
+
+        return memoryview(scratch)[:size + 6]
+
+    @staticmethod
+    def decode (data) -> dict:
+        """
+        Decodificador de referencia para el servidor o pruebas locales.
+
+        :param data: Cuerpo completo recibido.
+        :return: Diccionario con el mismo contenido que el cuerpo JSON.
+        """
+        magic, version, device_id, now, timestamp, count = struct.unpack_from(
+            BINARY_HEADER_FORMAT, data, 0)
+
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError('Formato binario no soportado')
+
+        offset = BINARY_HEADER_SIZE
+        lightnings = []
+
+        for _ in range(count):
+            value = 0
+            shift = 0
+
+            while True:
+                byte = data[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+
+                if not byte & 0x80:
+                    break
+
+            timestamp += (value >> 1) if not value & 1 else -((value + 1) >> 1)
+            distance = data[offset]
+            energy = data[offset + 1] | (data[offset + 2] << 8) | (data[offset + 3] << 16)
+            flags = data[offset + 4]
+            offset += 5
+
+            lightnings.append({
+                "noise_floor": flags & 0x07,
+                "distance": False if distance == DISTANCE_OUT_OF_RANGE else distance,
+                "type": (flags >> 3) & 0x03,
+                "energy": energy,
+                "timestamp_read": timestamp,
+                "read_seconds_ago": (now - timestamp) + 1,
+            })
+
+        return {
+            "hardware_device_id": device_id,
+            "lightnings": lightnings,
+        }
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Modo de bajo consumo entre interrupciones. Cuando no queda trabajo
+# pendiente la Rpi Pico entra en lightsleep hasta la siguiente fecha límite
+# conocida. La IRQ del AS3935 (GPIO 22) está registrada como interrupción,
+# por lo que también la despierta, y su manejador guarda el instante del
+# flanco al despertar: las marcas de tiempo de los rayos se calculan desde
+# ese instante y no dependen del tiempo dormido.
+
+import machine
+from time import ticks_ms, ticks_us, ticks_diff
+
+
+class PowerManager:
+    """
+    Duerme la Rpi Pico con lightsleep y mide el tiempo dormido y la latencia
+    de despertar.
+
+    :param sensor: Instancia de Lightning cuya IRQ despierta a la placa.
+    :param min_sleep_ms: Esperas más cortas no compensan dormir.
+    :param max_sleep_ms: Máximo de cada periodo dormido, acota el retraso de
+                         las tareas con esperas que no se conocen.
+    :param sleep: Función que duerme los ms indicados. Por defecto
+                  machine.lightsleep, se puede sustituir para simularlo.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, sensor, min_sleep_ms=20, max_sleep_ms=10000,
+                  sleep=None, debug=False):
+        self.sensor = sensor
+        self.min_sleep_ms = min_sleep_ms
+        self.max_sleep_ms = max_sleep_ms
+        self.lightsleep = sleep or machine.lightsleep
+        self.DEBUG = debug
+
+        # Estadísticas
+        self.boot_ticks = ticks_ms()
+        self.asleep_us = 0
+        self.sleeps = 0
+        self.wakes_irq = 0
+        self.wakes_deadline = 0
+        self.wake_latency_us = 0
+        self.wake_latency_max_us = 0
+
+    def sleep (self, ms) -> int:
+        """
+        Duerme hasta la fecha límite o hasta la IRQ del sensor.
+
+        Si la IRQ llega justo entre la comprobación y el lightsleep, el rayo
+        espera como mucho 'max_sleep_ms' a procesarse.
+
+        :param ms: Milisegundos hasta la siguiente fecha límite.
+        :return: Milisegundos dormidos, 0 si no se ha dormido.
+        """
+        sensor = self.sensor
+
+        if ms < self.min_sleep_ms or sensor.pending:
+            return 0
+
+        start = ticks_us()
+        self.lightsleep(min(ms, self.max_sleep_ms))
+        end = ticks_us()
+
+        slept = ticks_diff(end, start)
+        self.asleep_us += slept
+        self.sleeps += 1
+
+        if sensor.pending:
+            # Desde el flanco registrado por la IRQ hasta volver a ejecutar
+            latency = ticks_diff(end, sensor.irq_ticks)
+            self.wake_latency_us = latency
+            self.wakes_irq += 1
+
+            if latency > self.wake_latency_max_us:
+                self.wake_latency_max_us = latency
+
+            if self.DEBUG:
+                print('Despierta por IRQ tras', slept // 1000, 'ms, latencia',
+                      latency, 'µs')
+        else:
+            self.wakes_deadline += 1
+
+        return slept // 1000
+
+    def get_stats (self) -> dict:
+        """
+        Devuelve el tiempo dormido frente al despierto y la latencia de
+        despertar.
+        """
+        uptime_ms = max(1, ticks_diff(ticks_ms(), self.boot_ticks))
+        asleep_ms = self.asleep_us // 1000
+
+        return {
+            'asleep_ms': asleep_ms,
+            'awake_ms': uptime_ms - asleep_ms,
+            'asleep_percent': asleep_ms * 100 // uptime_ms,
+            'sleeps': self.sleeps,
+            'wakes_irq': self.wakes_irq,
+            'wakes_deadline': self.wakes_deadline,
+            'wake_latency_us': self.wake_latency_us,
+            'wake_latency_max_us': self.wake_latency_max_us,
+        }
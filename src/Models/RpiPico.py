@@ -1,12 +1,28 @@
 from machine import ADC, Pin
 import network
-from time import sleep
+import ubinascii
+import ujson
+from time import sleep, sleep_ms, ticks_ms, ticks_diff, ticks_add
 
 # Constants
 WIFI_DISCONNECTED = 0
 WIFI_CONNECTING = 1
 WIFI_CONNECTED = 3
 
+# Estados del gestor de conexión Wi-Fi
+WIFI_STATE_IDLE = 0
+WIFI_STATE_CONNECTING = 1
+WIFI_STATE_CONNECTED = 2
+WIFI_STATE_BACKOFF = 3
+WIFI_STATE_OFF = 4
+
+WIFI_STATE_NAMES = ('IDLE', 'CONN', 'OK', 'WAIT', 'OFF')
+
+# Modos de ahorro de energía del chip cyw43: sin ahorro y ahorro con la
+# radio dormida entre balizas del punto de acceso
+WIFI_PM_NONE = 0xa11140
+WIFI_PM_POWERSAVE = 0xa11142
+
 
 class RpiPico:
     INTEGRATED_TEMP_CORRECTION = 27  # Corrección de temperatura interna para ajustar lecturas
@@ -23,12 +39,20 @@ class RpiPico:
 
     # Inalámbrico
     wifi = None
+    wifi_state = WIFI_STATE_IDLE
+    wifi_wanted = True
+
+    # Consumo medio estimado (mA) de la radio encendida para calcular la
+    # energía por rayo subido
+    radio_current_ma = 45
 
     hostname = 'Rpi-Pico-W'
 
     def __init__ (self, ssid=None, password=None, debug=False, country="ES",
                   alternatives_ap=None,
-                  hostname="Rpi-Pico-W"):
+                  hostname="Rpi-Pico-W", connect_timeout=15,
+                  backoff_base=2, backoff_max=120, cache_path='/wifi.json',
+                  power_save=False):
         """
         Constructor de la clase para Raspberry Pi Pico W.
 
@@ -38,13 +62,57 @@ class RpiPico:
             debug (bool): Indica si se muestran los mensajes de debug. Por defecto False.
             alternatives_ap (tuple): Puedes pasar una tupla con redes adicionales.
             country (str): Código del país. Por defecto 'ES'.
+            connect_timeout (int): Segundos máximos de cada intento de conexión.
+            backoff_base (int): Segundos de espera tras la primera ronda fallida.
+            backoff_max (int): Segundos máximos de espera entre rondas.
+            cache_path (str): Fichero donde se guarda el último punto de acceso
+                y la clasificación por RSSI de las redes. None para no usarlo.
+            power_save (bool): Activa el ahorro de energía del chip wi-fi.
         """
         self.DEBUG = debug
         self.SSID = ssid
         self.PASSWORD = password
         self.COUNTRY = country
         self.hostname = hostname
-        self.alternatives_ap = alternatives_ap
+        self.alternatives_ap = alternatives_ap or []
+        self.connect_timeout_ms = connect_timeout * 1000
+        self.backoff_base_ms = backoff_base * 1000
+        self.backoff_max_ms = backoff_max * 1000
+        self.power_save = power_save
+
+        # Gestor de conexión: redes a probar en la ronda actual (ssid,
+        # contraseña, bssid), la candidata actual, si ya se ha escaneado,
+        # rondas fallidas seguidas e instantes del intento y de la pérdida
+        # de conexión
+        self.wifi_queue = []
+        self.wifi_candidate = 0
+        self.wifi_scanned = False
+        self.wifi_failures = 0
+        self.wifi_attempt_ticks = 0
+        self.wifi_down_ticks = 0
+        self.wifi_next_attempt = 0
+        self.wifi_callbacks = []
+
+        # Estadísticas de conexión
+        self.wifi_connects = 0
+        self.wifi_drops = 0
+        self.wifi_reconnect_ms = 0
+        self.wifi_scans = 0
+        self.wifi_directed = 0
+
+        # Tiempo de radio encendida, acumulado y desde el último encendido
+        self.boot_ticks = ticks_ms()
+        self.radio_on_ticks = None
+        self.radio_on_ms = 0
+        self.radio_wakes = 0
+
+        # Último punto de acceso con el que se conectó y clasificación por
+        # RSSI de las redes conocidas, persistidos en la flash
+        self.cache_path = cache_path
+        self.wifi_cache = self.wifi_load_cache()
+
+        # Clasificación del último escaneo, pendiente de guardar al conectar
+        self.wifi_ranking = None
 
         self.TEMP_SENSOR = ADC(4)  # Sensor interno de Raspberry Pi Pico.
 
@@ -53,12 +121,13 @@ class RpiPico:
 
         self.adc_conversion_factor = self.voltage_working / 65535  # Factor de conversión de 16 bits
 
-        # Si se proporcionan credenciales del AP intenta la conexión
+        # Si se proporcionan credenciales del AP inicia la conexión sin
+        # esperar a que termine
         if ssid and password:
             if self.DEBUG:
                 print('Iniciando la conexión inalámbrica')
 
-            self.wifi_connect(ssid, password)
+            self.wifi_start()
 
         sleep(0.100)
 
@@ -230,52 +299,421 @@ class RpiPico:
         print('Canal de Wi-fi: ', self.get_wireless_channel())
         print('RSSI: ', self.get_wireless_rssi())
 
-    def wifi_connect (self, ssid=None, password=None) -> bool:
+    def wifi_on_change (self, callback) -> None:
         """
-        Intenta conectar a Wi-Fi con las credenciales dadas.
+        Registra una función a la que se llama con el nuevo estado en cada
+        cambio de estado de la conexión. Se ejecuta desde quien llame a
+        wifi_poll(), por lo que debe ser breve.
 
         Args:
-            ssid (str): ID de red para la conexión Wi-Fi.
-            password (str): Contraseña para la conexión Wi-Fi.
+            callback (function): Función que recibe el estado (int).
+        """
+        self.wifi_callbacks.append(callback)
 
-        Retorno:
-            bool: True si se logra conectarse, False en caso contrario.
+    def wifi_set_state (self, state) -> None:
+        """
+        Cambia el estado del gestor de conexión y avisa a los callbacks.
+
+        Args:
+            state (int): Nuevo estado.
+        """
+        if state == self.wifi_state:
+            return
+
+        self.wifi_state = state
+
+        if self.DEBUG:
+            print('Estado del wi-fi:', self.get_wifi_state_name())
+
+        for callback in self.wifi_callbacks:
+            try:
+                callback(state)
+            except Exception as e:
+                if self.DEBUG:
+                    print('Error en callback de wi-fi:', e)
+
+    def get_wifi_state_name (self) -> str:
+        """
+        Devuelve el nombre corto del estado de la conexión para la pantalla.
         """
-        if ssid is None and password is None:
-            ssid, password = self.SSID, self.PASSWORD
+        return WIFI_STATE_NAMES[self.wifi_state]
+
+    def wifi_known (self) -> dict:
+        """
+        Devuelve las redes configuradas: la principal y las alternativas.
+
+        Returns:
+            dict: Contraseña de cada ssid.
+        """
+        known = {}
+
+        for ap in self.alternatives_ap:
+            known[ap['ssid']] = ap['password']
+
+        if self.SSID:
+            known[self.SSID] = self.PASSWORD
+
+        return known
+
+    def wifi_load_cache (self) -> dict:
+        """
+        Lee de la flash el último punto de acceso usado.
+
+        Returns:
+            dict: Con 'ssid', 'bssid' (hex), 'channel' y 'ranking' (lista de
+                  [ssid, rssi]) o vacío si no existe.
+        """
+        if not self.cache_path:
+            return {}
+
+        try:
+            with open(self.cache_path) as file:
+                return ujson.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def wifi_save_cache (self, ssid, bssid) -> None:
+        """
+        Guarda en la flash el punto de acceso con el que se ha conectado.
+        Solo se escribe si ha cambiado para no desgastar la flash.
+
+        Args:
+            ssid (str): Red conectada.
+            bssid (bytes): BSSID del punto de acceso o None si no se conoce.
+        """
+        cache = {
+            'ssid': ssid,
+            'bssid': ubinascii.hexlify(bssid).decode() if bssid else None,
+            'channel': self.get_wireless_channel(),
+            'ranking': self.wifi_ranking if self.wifi_ranking is not None
+                       else self.wifi_cache.get('ranking', []),
+        }
+
+        if cache == self.wifi_cache or not self.cache_path:
+            return
+
+        self.wifi_cache = cache
+
+        try:
+            with open(self.cache_path, 'w') as file:
+                ujson.dump(cache, file)
+        except OSError as e:
+            if self.DEBUG:
+                print('No se pudo guardar la caché del wi-fi:', e)
+
+    def wifi_scan (self) -> list:
+        """
+        Escanea todos los canales y ordena por RSSI las redes conocidas
+        visibles, con el BSSID del punto de acceso con mejor señal de cada
+        una. La red principal va siempre la primera si está visible. La
+        clasificación se guarda en la caché al conectar. Si el escaneo falla
+        se usa la clasificación guardada.
+
+        Returns:
+            list: Tuplas (ssid, contraseña, bssid).
+        """
+        known = self.wifi_known()
+        best = {}
+
+        self.wifi_scans += 1
+
+        try:
+            for ap in self.wifi.scan():
+                ssid = ap[0].decode('utf-8')
+
+                if ssid in known and (ssid not in best or ap[3] > best[ssid][1]):
+                    best[ssid] = (ap[1], ap[3])
+        except OSError as e:
+            if self.DEBUG:
+                print('Error al escanear redes:', e)
+
+            return [(ssid, known[ssid], None)
+                    for ssid, rssi in self.wifi_cache.get('ranking', [])
+                    if ssid in known]
+
+        ranking = sorted(best, key=lambda ssid: best[ssid][1], reverse=True)
+
+        if self.SSID in best:
+            ranking.remove(self.SSID)
+            ranking.insert(0, self.SSID)
+
+        self.wifi_ranking = [[ssid, best[ssid][1]] for ssid in ranking]
+
+        if self.DEBUG:
+            print('Redes conocidas por RSSI:', self.wifi_ranking)
+
+        return [(ssid, known[ssid], best[ssid][0]) for ssid in ranking]
+
+    def wifi_round (self) -> None:
+        """
+        Inicia una ronda de conexión. Primero se une directamente al último
+        punto de acceso (sin escanear) y solo si falla se escanea.
+        """
+        known = self.wifi_known()
+        ssid = self.wifi_cache.get('ssid')
+        bssid = self.wifi_cache.get('bssid')
+
+        self.wifi_candidate = 0
+        self.wifi_scanned = False
+
+        if ssid in known:
+            self.wifi_queue = [(ssid, known[ssid],
+                                ubinascii.unhexlify(bssid) if bssid else None)]
+        else:
+            self.wifi_queue = self.wifi_scan()
+            self.wifi_scanned = True
+
+        self.wifi_attempt()
+
+    def wifi_start (self, ssid=None, password=None) -> None:
+        """
+        Activa la interfaz e inicia la conexión sin bloquear. El avance de la
+        conexión y las reconexiones se hacen llamando a wifi_poll().
+
+        Args:
+            ssid (str): ID de red, sustituye a la red principal.
+            password (str): Contraseña de la red.
+        """
+        if ssid is not None:
+            self.SSID, self.PASSWORD = ssid, password
+
+        if self.wifi is None:
+            self.wifi = network.WLAN(network.STA_IF)
+            self.wifi_radio_on()
+
+        # La primera ronda (que puede escanear) se lanza en el primer
+        # wifi_poll() para no bloquear a quien inicia la conexión
+        self.wifi_down_ticks = ticks_ms()
+        self.wifi_failures = 0
+        self.wifi_next_attempt = self.wifi_down_ticks
+        self.wifi_set_state(WIFI_STATE_BACKOFF)
+
+    def wifi_attempt (self) -> None:
+        """
+        Lanza la conexión a la red candidata actual o, si no quedan, pasa a
+        escanear o a esperar a la siguiente ronda.
+        """
+        if self.wifi_candidate >= len(self.wifi_queue):
+            if not self.wifi_scanned:
+                self.wifi_queue = self.wifi_scan()
+                self.wifi_candidate = 0
+                self.wifi_scanned = True
+
+                return self.wifi_attempt()
+
+            if not self.wifi_known():
+                self.wifi_set_state(WIFI_STATE_IDLE)
+                return
 
-        self.wifi = network.WLAN(network.STA_IF)
+            self.wifi_failures += 1
+            delay = min(self.backoff_max_ms,
+                        self.backoff_base_ms << (self.wifi_failures - 1))
+            self.wifi_next_attempt = ticks_add(ticks_ms(), delay)
+            self.wifi_set_state(WIFI_STATE_BACKOFF)
+
+            if self.DEBUG:
+                print('Sin wi-fi, reintento en', delay, 'ms')
+
+            return
+
+        ssid, password, bssid = self.wifi_queue[self.wifi_candidate]
+
+        if self.DEBUG:
+            print('Conectando a', ssid,
+                  '(escaneo)' if self.wifi_scanned else '(directo)')
+
+        try:
+            if bssid:
+                self.wifi.connect(ssid, password, bssid=bssid)
+            else:
+                self.wifi.connect(ssid, password)
+        except OSError as e:
+            if self.DEBUG:
+                print('Error al conectar al wi-fi:', e)
+
+        self.wifi_attempt_ticks = ticks_ms()
+        self.wifi_set_state(WIFI_STATE_CONNECTING)
+
+    def wifi_radio_on (self) -> None:
+        """
+        Enciende la radio y configura el ahorro de energía.
+        """
         self.wifi.active(True)
 
         # Establezco el nombre del host
         network.hostname(self.hostname)
 
-        # Desactivo el ahorro de energía
-        self.wifi.config(pm=0xa11140)
+        # Ahorro de energía según la configuración, desactivado por defecto
+        self.wifi.config(pm=WIFI_PM_POWERSAVE if self.power_save else WIFI_PM_NONE)
 
-        while not self.wifi_is_connected():
-            # Escaneo las redes disponibles
-            available_ssids = self.wifi.scan()
-            available_ssids = [ap[0].decode('utf-8') for ap in available_ssids]
+        self.radio_on_ticks = ticks_ms()
+        self.radio_wakes += 1
 
-            # Si la red principal se encuentra disponible, intenta conectar a ella
-            if self.SSID in available_ssids:
-                self.wifi.connect(self.SSID, self.PASSWORD)
-            else:
-                # Si no esta la red principal, intenta conectar a las redes secundarias disponibles
-                for ap in self.alternatives_ap:
-                    if ap['ssid'] in available_ssids:
-                        self.wifi.connect(ap['ssid'], ap['password'])
+    def wifi_radio_off (self) -> None:
+        """
+        Desconecta y apaga la radio, acumulando el tiempo encendida.
+        """
+        try:
+            self.wifi.disconnect()
+            self.wifi.active(False)
+        except OSError as e:
+            if self.DEBUG:
+                print('Error al apagar el wi-fi:', e)
+
+        if self.radio_on_ticks is not None:
+            self.radio_on_ms += ticks_diff(ticks_ms(), self.radio_on_ticks)
+            self.radio_on_ticks = None
+
+        self.wifi_set_state(WIFI_STATE_OFF)
+
+    def wifi_sleep (self) -> None:
+        """
+        Pide apagar la radio hasta llamar a wifi_wake(). Se aplica en el
+        siguiente wifi_poll(), desde el hilo que gestiona la red.
+        """
+        self.wifi_wanted = False
+
+    def wifi_wake (self) -> None:
+        """
+        Pide encender la radio y conectar. Se aplica en el siguiente
+        wifi_poll().
+        """
+        self.wifi_wanted = True
+
+    def wifi_is_off (self) -> bool:
+        """
+        Indica si la radio está apagada o sin usar, por lo que la placa puede
+        dormir sin cortar la conexión.
+        """
+        return self.wifi_state in (WIFI_STATE_OFF, WIFI_STATE_IDLE)
+
+    def get_radio_stats (self, strikes=0) -> dict:
+        """
+        Devuelve el uso de la radio para ajustar el ciclo de trabajo.
 
-            sleep(1)
+        Args:
+            strikes (int): Rayos subidos en el mismo periodo, para calcular
+                la energía por rayo.
+
+        Returns:
+            dict: Tiempo encendida (total y por hora), encendidos y energía
+                  estimada en mJ (total y por rayo).
+        """
+        now = ticks_ms()
+        on_ms = self.radio_on_ms
+
+        if self.radio_on_ticks is not None:
+            on_ms += ticks_diff(now, self.radio_on_ticks)
+
+        uptime_ms = max(1, ticks_diff(now, self.boot_ticks))
+        energy_mj = on_ms * self.radio_current_ma * self.voltage_working / 1000
+
+        return {
+            'on_ms': on_ms,
+            'on_ms_per_hour': on_ms * 3600000 // uptime_ms,
+            'wakes': self.radio_wakes,
+            'energy_mj': round(energy_mj, 1),
+            'energy_mj_per_strike': round(energy_mj / strikes, 2) if strikes else None,
+        }
 
+    def wifi_poll (self) -> int:
+        """
+        Avanza el gestor de conexión sin bloquear. Debe llamarse
+        periódicamente: comprueba el intento en curso, pasa a la siguiente
+        red si falla o expira, espera entre rondas con backoff exponencial y
+        reconecta si se pierde la conexión.
+
+        El escaneo de redes sí bloquea (un par de segundos), pero solo se
+        hace si falla la conexión directa al último punto de acceso.
+
+        Returns:
+            int: Estado actual del gestor.
+        """
+        state = self.wifi_state
+
+        if state == WIFI_STATE_IDLE:
+            return state
+
+        # Encendido o apagado pedido por el ciclo de trabajo
+        if not self.wifi_wanted:
+            if state != WIFI_STATE_OFF:
+                self.wifi_radio_off()
+
+            return self.wifi_state
+
+        now = ticks_ms()
+
+        if state == WIFI_STATE_OFF:
+            self.wifi_radio_on()
+            self.wifi_down_ticks = now
+            self.wifi_failures = 0
+            self.wifi_round()
+
+        if state == WIFI_STATE_CONNECTED:
+            if not self.wifi_is_connected():
+                self.wifi_drops += 1
+                self.wifi_down_ticks = now
+                self.wifi_failures = 0
+                self.wifi_round()
+        elif state == WIFI_STATE_CONNECTING:
             if self.wifi_is_connected():
+                ssid, password, bssid = self.wifi_queue[self.wifi_candidate]
+
+                self.wifi_connects += 1
+                self.wifi_failures = 0
+                self.wifi_reconnect_ms = ticks_diff(now, self.wifi_down_ticks)
+
+                if not self.wifi_scanned:
+                    self.wifi_directed += 1
+
+                self.wifi_save_cache(ssid, bssid)
+                self.wifi_set_state(WIFI_STATE_CONNECTED)
+
                 if self.DEBUG:
+                    print('Wi-fi conectado en', self.wifi_reconnect_ms, 'ms',
+                          '(escaneando)' if self.wifi_scanned else '(directo)')
                     self.wifi_debug()
+            elif self.wifi_status() < 0 or \
+                    ticks_diff(now, self.wifi_attempt_ticks) >= self.connect_timeout_ms:
+                # Fallo (contraseña, red no encontrada...) o tiempo agotado
+                self.wifi.disconnect()
+                self.wifi_candidate += 1
+                self.wifi_attempt()
+        elif state == WIFI_STATE_BACKOFF:
+            if ticks_diff(now, self.wifi_next_attempt) >= 0:
+                self.wifi_round()
 
-                return True
+        return self.wifi_state
 
-        return False
+    def wifi_connect (self, ssid=None, password=None, timeout=None) -> bool:
+        """
+        Conecta a Wi-Fi esperando a que termine. Mantiene la interfaz
+        anterior para quien necesite la red antes de seguir.
+
+        Args:
+            ssid (str): ID de red para la conexión Wi-Fi.
+            password (str): Contraseña para la conexión Wi-Fi.
+            timeout (int): Segundos máximos de espera, None sin límite.
+
+        Retorno:
+            bool: True si se logra conectarse, False en caso contrario.
+        """
+        if self.wifi_state == WIFI_STATE_IDLE or ssid is not None:
+            self.wifi_start(ssid, password)
+
+        start = ticks_ms()
+
+        while self.wifi_poll() != WIFI_STATE_CONNECTED:
+            if self.wifi_state == WIFI_STATE_IDLE:
+                return False
+
+            if timeout is not None and \
+                    ticks_diff(ticks_ms(), start) >= timeout * 1000:
+                return False
+
+            sleep_ms(100)
+
+        return True
 
     def wireless_info (self):
         info_client = [
@@ -318,12 +756,35 @@ class RpiPico:
 
         return info_client, info_ap
 
+    def get_wifi_snapshot (self) -> dict:
+        """
+        Devuelve el estado de la conexión para la pantalla. Debe llamarlo el
+        hilo que gestiona la red, que lo publica para el resto.
+
+        Returns:
+            dict: Conexión, estado, desconexiones y, si hay conexión, ssid,
+                  ip, rssi y canal.
+        """
+        connected = self.wifi_is_connected()
+
+        return {
+            'connected': connected,
+            'state': self.get_wifi_state_name(),
+            'drops': self.wifi_drops,
+            'ssid': self.get_wireless_ssid() if connected else None,
+            'ip': self.get_wireless_ip() if connected else None,
+            'rssi': self.get_wireless_rssi() if connected else None,
+            'channel': self.get_wireless_channel() if connected else None,
+        }
+
     def wifi_disconnect (self) -> None:
         """
-        Desconecta el wi-fi.
+        Desconecta el wi-fi y detiene las reconexiones.
 
         :return: None
         """
+        self.wifi_set_state(WIFI_STATE_IDLE)
+        self.wifi_wanted = True
         self.wifi.disconnect()
 
     def read_analog_input (self, pin) -> float:
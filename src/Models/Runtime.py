@@ -0,0 +1,1421 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Flujo principal de la aplicación basado en eventos con uasyncio. La IRQ del
+# sensor señala un ThreadSafeFlag y cada etapa (sensor, pantalla, LEDs y
+# subida a la API) se ejecuta en su propia tarea, sin sondeos periódicos.
+#
+# No depende directamente del hardware: el sensor, la pantalla, los LEDs, el
+# controlador y la API se reciben ya instanciados, por lo que puede
+# ejecutarse en el port Unix de MicroPython con objetos simulados.
+#
+# Los rayos cercanos o los que llegan en ráfaga van por una vía prioritaria:
+# no esperan a formar lote ni a los reintentos programados y se suben antes
+# que la cola pendiente.
+#
+# Con el ciclo de trabajo activo la radio solo se enciende en ventanas de
+# subida, que se abren al cumplirse el plazo del rayo pendiente más antiguo,
+# al llegar la cola a un tamaño o con un rayo prioritario, y se cierran al
+# vaciar la cola.
+#
+# Con un PowerManager la placa duerme en lightsleep cuando ninguna tarea
+# tiene trabajo y la radio está apagada, hasta la siguiente fecha límite o
+# la IRQ del sensor.
+#
+# La pantalla rota, si se indica un intervalo, entre varias páginas: último
+# rayo, tormenta de la última hora, Wi-Fi, cola de subida y salud de la
+# placa. Cada página tiene su caché y solo se redibuja lo que cambia. Con un
+# DisplayPower la pantalla se atenúa y se apaga sin actividad y se enciende
+# con cada rayo o alerta.
+
+import gc
+import random
+import utime
+import uasyncio as asyncio
+from time import ticks_us, ticks_ms, ticks_diff, ticks_add
+from Models.UploadScheduler import UploadScheduler, RESULT_SUCCESS, RESULT_RETRY, \
+    RESULT_REJECTED, STATE_OPEN
+from Models.Screen import Screen, ALIGN_LEFT
+from Models.StormGraph import StormGraph
+
+# Tiempo mínimo (ms) entre el flanco de IRQ y la lectura del sensor
+IRQ_READ_DELAY_MS = const(2)
+
+# Intervalo (ms) de comprobación de confirmaciones del hilo de subida
+ACK_POLL_MS = const(50)
+
+# Espera máxima (ms) a la confirmación de un lote entregado al hilo de subida
+ACK_TIMEOUT_MS = const(60000)
+
+# Intervalo (ms) de comprobación de la conexión Wi-Fi sin hilo de subida
+WIFI_POLL_MS = const(500)
+
+# Máximo de rayos en la vía prioritaria, el resto pasa a la cola normal
+PRIORITY_MAX = const(20)
+
+# Ventana (ms) para medir la frecuencia de rayos de una ráfaga
+RATE_WINDOW_MS = const(60000)
+
+# Espera máxima (ms) a que conecte el wi-fi al abrir una ventana de subida
+WINDOW_CONNECT_MS = const(30000)
+
+# Espera (ms) antes de reintentar una orden a la pantalla que ha fallado
+PANEL_RETRY_MS = const(20)
+
+# Motivos de apertura de las ventanas de subida
+WAKE_DEADLINE = const(0)
+WAKE_QUEUE = const(1)
+WAKE_PRIORITY = const(2)
+
+WAKE_NAMES = ('deadline', 'queue', 'priority')
+
+
+class Runtime:
+    """
+    Orquesta las tareas de la aplicación.
+
+    :param sensor: Instancia de Lightning.
+    :param controller: Instancia de RpiPico (LED integrado).
+    :param oled: Pantalla SSD1306 o None si no hay pantalla.
+    :param leds: Lista de pines de los LEDs que simulan flashes.
+    :param api: Instancia de Api o None si no se suben datos.
+    :param worker: Instancia de UploadWorker. Si se indica, las subidas se
+                   hacen en el segundo núcleo en lugar de usar 'api'.
+    :param journal: Instancia de Journal. Si se indica, los rayos se
+                    guardan en la flash y se suben desde ella.
+    :param priority_journal: Instancia de Journal para los rayos de la vía
+                             prioritaria, que se guardan antes de subirlos y
+                             se confirman después. Sus pendientes se
+                             recuperan al arrancar.
+    :param batch_size: Máximo de rayos que se entregan en cada subida.
+    :param flush_seconds: Espera máxima antes de volcar a la flash los rayos
+                          agrupados en memoria.
+    :param scheduler: Instancia de UploadScheduler para los reintentos. Si
+                      no se indica se crea uno con valores por defecto.
+    :param priority_distance: Distancia en km hasta la que un rayo se sube
+                              de inmediato. None para desactivarlo.
+    :param priority_rate: Rayos por minuto a partir de los que se considera
+                          ráfaga y se suben de inmediato. None para
+                          desactivarlo.
+    :param duty_cycle: Si es True la radio se apaga entre ventanas de subida.
+    :param window_seconds: Espera máxima de un rayo hasta abrir la ventana.
+    :param window_threshold: Rayos en cola que abren la ventana. Por defecto
+                             'batch_size'.
+    :param power: Instancia de PowerManager para dormir entre interrupciones
+                  o None para no dormir.
+    :param bus: Instancia de I2CBus con los clientes 'sensor' y 'display'.
+                Si se indica, la lectura del sensor tiene prioridad sobre el
+                volcado de la pantalla, que se hace página a página.
+    :param page_seconds: Segundos que se muestra cada página de la pantalla
+                         antes de pasar a la siguiente. 0 para mostrar solo
+                         el estado.
+    :param panel: Instancia de DisplayPower para atenuar y apagar la
+                  pantalla sin actividad o None para dejarla encendida.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, sensor, controller, oled=None, leds=None, api=None,
+                  worker=None, journal=None, priority_journal=None,
+                  batch_size=100, flush_seconds=60,
+                  scheduler=None, priority_distance=None, priority_rate=None,
+                  duty_cycle=False, window_seconds=300, window_threshold=None,
+                  power=None, bus=None, page_seconds=0, panel=None,
+                  debug=False):
+        self.sensor = sensor
+        self.controller = controller
+        self.oled = oled
+        self.leds = leds or []
+        self.api = api
+        self.worker = worker
+        self.journal = journal
+        self.priority_journal = priority_journal
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.scheduler = scheduler or UploadScheduler(debug=debug)
+        self.priority_distance = priority_distance
+        self.priority_rate = priority_rate
+        self.duty_cycle = duty_cycle
+        self.window_ms = window_seconds * 1000
+        self.window_threshold = window_threshold or batch_size
+        self.power = power
+        self.bus = bus
+        self.page_seconds = page_seconds
+        self.panel = panel
+        self.DEBUG = debug
+
+        # Flag que señala la IRQ del sensor
+        self.irq_flag = asyncio.ThreadSafeFlag()
+        sensor.set_event_flag(self.irq_flag)
+
+        # Flag que despierta a idle_task cuando una tarea termina su trabajo
+        # o cambia el estado de la radio, que se gestiona desde otro núcleo
+        self.idle_flag = asyncio.ThreadSafeFlag()
+
+        # Con una IRQ pendiente la pantalla cede el bus al sensor
+        if bus is not None:
+            bus.get('sensor').pending = lambda: sensor.pending
+
+        # Un evento por etapa consumidora de rayos
+        self.display_event = asyncio.Event()
+        self.led_event = asyncio.Event()
+        self.upload_event = asyncio.Event()
+        self.journal_event = asyncio.Event()
+
+        # Datos del último rayo registrado para la pantalla
+        self.last_strike = None
+        self.strikes_pending = 0
+
+        # Histórico de la última hora y páginas de la pantalla en modo
+        # retenido: (pantalla, función que actualiza sus campos)
+        self.graph = None
+        self.pages = []
+        self.page = 0
+        self.page_shown = None
+        self.page_at = None
+
+        # Página de tendencia: índice, evento al mostrarla y siguiente cambio
+        # de minuto en el que hay que avanzar sus gráficas
+        self.trend_page = None
+        self.trend_event = asyncio.Event()
+        self.trend_at = None
+        self.strike_shown = True
+
+        # Encendido de la pantalla: si hay que encenderla en la siguiente
+        # actualización, evento para reanudar los cambios de estado al
+        # encenderla y siguiente cambio previsto
+        self.panel_wake = False
+        self.panel_event = asyncio.Event()
+        self.panel_at = None
+
+        # Salud de la placa
+        self.started = utime.time()
+        self.errors = 0
+
+        if oled is not None:
+            self.graph = StormGraph()
+            self.pages.append((self.build_status_screen(),
+                               self.update_status_screen))
+            self.trend_page = len(self.pages)
+            self.pages.append((self.build_trend_screen(),
+                               self.update_trend_screen))
+            self.pages.append((self.build_wifi_screen(),
+                               self.update_wifi_screen))
+
+            if api is not None or worker is not None:
+                self.pages.append((self.build_queue_screen(),
+                                   self.update_queue_screen))
+
+            self.pages.append((self.build_health_screen(),
+                               self.update_health_screen))
+
+            # Textos fijos en la caché de cada página
+            for screen, update in self.pages:
+                screen.redraw()
+
+        # Estadísticas de latencia desde el flanco de IRQ hasta la pantalla
+        self.display_latency_us = 0
+        self.display_latency_max_us = 0
+        self.wakeups = 0
+
+        # Vía prioritaria: (rayo, ticks de la IRQ) pendientes de subir y
+        # rayos de la subida prioritaria en curso
+        self.priority = []
+        self.priority_inflight = 0
+
+        # Rayos prioritarios sin confirmar de antes del reinicio
+        if priority_journal is not None and priority_journal.pending():
+            now = ticks_us()
+
+            for lightning in priority_journal.read(priority_journal.pending()):
+                self.priority.append((lightning, now))
+        self.rate_start = ticks_ms()
+        self.rate_count = 0
+
+        # Latencia desde el rayo hasta la confirmación de la subida. La
+        # prioritaria se mide desde el flanco de IRQ, la normal desde el
+        # timestamp del rayo (resolución de segundos)
+        self.priority_latency_ms = 0
+        self.priority_latency_max_ms = 0
+        self.priority_sent = 0
+        self.bulk_latency_ms = 0
+        self.bulk_latency_max_ms = 0
+        self.bulk_sent = 0
+
+        # Ventanas de subida con la radio encendida: si está abierta, desde
+        # cuándo hay rayos pendientes y aperturas por cada motivo
+        self.window_open = False
+        self.pending_since = None
+        self.wake_reason = WAKE_DEADLINE
+        self.wakes = [0, 0, 0]
+
+        # Trabajo en curso que impide dormir: flashes de los LEDs y volcado
+        # programado de la cola persistente
+        self.leds_active = False
+        self.flush_at = None
+
+    async def sensor_task (self):
+        """
+        Espera a la IRQ del sensor, lee el evento y avisa al resto de etapas
+        si se ha registrado un rayo.
+        """
+        sensor = self.sensor
+
+        while True:
+            self.work_done()
+            await self.irq_flag.wait()
+            self.wakeups += 1
+
+            # Dejo al sensor el tiempo que necesita sin bloquear el resto
+            await asyncio.sleep_ms(IRQ_READ_DELAY_MS)
+
+            if self.bus is not None:
+                await self.bus.acquire(self.bus.get('sensor'),
+                                       ticks_add(sensor.irq_ticks, IRQ_READ_DELAY_MS * 1000))
+
+            strike = False
+
+            try:
+                self.controller.led_on()
+                strike = sensor.process_interrupt() == 1
+            except Exception as e:
+                self.handle_error(e)
+            finally:
+                self.controller.led_off()
+
+                if self.bus is not None:
+                    self.bus.release(self.bus.get('sensor'))
+
+            # Las escrituras en la flash se hacen con el bus ya liberado
+            if strike:
+                try:
+                    self.store_strike(sensor.lightnings.last())
+                except Exception as e:
+                    self.handle_error(e)
+
+    def store_strike (self, lightning) -> None:
+        """
+        Pasa el rayo recién leído a su vía de subida y avisa al resto de
+        etapas.
+
+        Con cola persistente el rayo sale del buffer en memoria, la cola
+        normal es entonces solo la de la flash.
+
+        :param lightning: Tupla del rayo, el último del buffer del sensor.
+        :return:
+        """
+        sensor = self.sensor
+        self.last_strike = lightning
+
+        if self.is_priority(lightning):
+            # Sale del buffer para no subirlo dos veces
+            sensor.lightnings.pop()
+            self.priority.append((lightning, sensor.strike_ticks))
+
+            if self.priority_journal is not None:
+                self.priority_journal.append(*lightning)
+
+            self.trim_priority()
+        elif self.journal is not None:
+            sensor.lightnings.pop()
+            self.journal.append(*lightning)
+            self.journal_event.set()
+
+        self.strikes_pending = self.pending_count() + len(self.priority)
+
+        if self.graph is not None:
+            self.graph.add(lightning[0], lightning[1])
+
+        self.strike_shown = False
+        self.panel_wake = True
+        self.display_event.set()
+        self.led_event.set()
+        self.upload_event.set()
+
+    def is_priority (self, lightning) -> bool:
+        """
+        Indica si un rayo debe ir por la vía prioritaria: está dentro de la
+        distancia configurada o forma parte de una ráfaga.
+
+        :param lightning: Tupla del rayo recién leído.
+        :return:
+        """
+        if self.api is None and self.worker is None:
+            return False
+
+        burst = False
+
+        if self.priority_rate is not None:
+            now = ticks_ms()
+
+            if ticks_diff(now, self.rate_start) >= RATE_WINDOW_MS:
+                self.rate_start = now
+                self.rate_count = 0
+
+            self.rate_count += 1
+            burst = self.rate_count >= self.priority_rate
+
+        distance = lightning[1]
+
+        return burst or (self.priority_distance is not None and
+                         distance is not False and
+                         distance <= self.priority_distance)
+
+    def demote (self, lightning) -> None:
+        """
+        Pasa un rayo de la vía prioritaria a la cola normal.
+
+        :param lightning: Tupla del rayo.
+        :return:
+        """
+        if self.journal is not None:
+            self.journal.append(*lightning)
+            self.journal_event.set()
+        else:
+            self.sensor.lightnings.push(*lightning)
+
+    def trim_priority (self) -> None:
+        """
+        Pasa a la cola normal los rayos prioritarios más antiguos por encima
+        de PRIORITY_MAX.
+
+        Con una subida prioritaria en curso se espera a su resultado: la
+        cola persistente solo se confirma por el principio, donde están los
+        rayos que se están subiendo.
+        :return:
+        """
+        if self.priority_inflight:
+            return
+
+        while len(self.priority) > PRIORITY_MAX:
+            self.demote(self.priority.pop(0)[0])
+            self.ack_priority(1, demoted=True)
+
+    def ack_priority (self, count, demoted=False) -> None:
+        """
+        Confirma en su cola persistente los 'count' rayos más antiguos de la
+        vía prioritaria, ya subidos, descartados o pasados a la cola normal.
+
+        :param demoted: Si han pasado a la cola normal, que se vuelca antes
+                        a la flash para no perderlos entre ambas colas.
+        :return:
+        """
+        if self.priority_journal is None or not count:
+            return
+
+        if demoted and self.journal is not None:
+            self.journal.flush()
+
+        self.priority_journal.ack(count)
+
+    def build_status_screen (self) -> Screen:
+        """
+        Declara la pantalla de estado: textos fijos y campos de cada valor.
+        """
+        screen = Screen(self.oled)
+
+        screen.label('Hay', 0, 0)
+        self.field_pending = screen.field(32, 0, 4)
+        screen.label('rayos', 72, 0)
+
+        screen.label('Distance:', 0, 10)
+        self.field_distance = screen.field(80, 10, 3)
+        screen.label('km', 104, 10)
+
+        screen.label('Energy:', 0, 20)
+        self.field_energy = screen.field(64, 20, 7)
+        screen.label('J', 120, 20)
+
+        screen.label('Noise:', 0, 30)
+        self.field_noise = screen.field(56, 30, 2)
+
+        screen.label('Type:', 0, 40)
+        self.field_type = screen.field(48, 40, 2)
+
+        if self.api is not None or self.worker is not None:
+            screen.label('API:', 0, 50)
+            self.field_api = screen.field(40, 50, 4, ALIGN_LEFT)
+        else:
+            self.field_api = None
+
+        return screen
+
+    def build_trend_screen (self) -> Screen:
+        """
+        Declara la página de la tormenta: rayos en la última hora y en el
+        minuto actual, distancia más cercana y las gráficas de ambas.
+        """
+        screen = Screen(self.oled)
+        graph = self.graph
+
+        screen.label('R/h', 0, 0)
+        self.field_total = screen.field(24, 0, 4)
+        screen.label('R/min', 64, 0)
+        self.field_rate = screen.field(104, 0, 3)
+        self.image_rate = screen.image(graph.rate, 4, 10, graph.width,
+                                       graph.rate_height)
+
+        screen.label('Dist', 0, 36)
+        self.field_nearest = screen.field(32, 36, 3)
+        screen.label('km', 56, 36)
+        self.image_distance = screen.image(graph.distance, 4, 46, graph.width,
+                                           graph.distance_height)
+
+        return screen
+
+    def update_status_screen (self, screen) -> None:
+        """
+        Actualiza los campos de la página de estado.
+        """
+        if self.last_strike is None:
+            return
+
+        timestamp, distance, energy, noise_floor, type = self.last_strike
+
+        screen.set(self.field_pending, self.strikes_pending)
+        screen.set(self.field_distance, distance)
+        screen.set(self.field_energy, energy)
+        screen.set(self.field_noise, noise_floor)
+        screen.set(self.field_type, type)
+
+        if self.field_api is not None:
+            screen.set(self.field_api, self.scheduler.get_state_name())
+
+    def update_trend_screen (self, screen) -> None:
+        """
+        Actualiza la página de la tormenta. Un rayo solo envía la columna
+        del minuto actual y el paso de un minuto las gráficas completas.
+        """
+        graph = self.graph
+        graph.advance(utime.time() // 60)
+
+        screen.set(self.field_total, graph.total)
+        screen.set(self.field_rate, graph.get_rate())
+        screen.set(self.field_nearest, graph.get_nearest())
+
+        if graph.changed_x is not None:
+            screen.update_image(self.image_rate, graph.changed_x)
+            screen.update_image(self.image_distance, graph.changed_x)
+            graph.changed_x = None
+
+    def build_wifi_screen (self) -> Screen:
+        """
+        Declara la página del Wi-Fi: estado, red, IP, señal, canal y caídas.
+        """
+        screen = Screen(self.oled)
+
+        screen.label('Wi-Fi', 0, 0)
+        self.field_wifi_state = screen.field(56, 0, 4, ALIGN_LEFT)
+
+        screen.label('SSID', 0, 10)
+        self.field_wifi_ssid = screen.field(40, 10, 11, ALIGN_LEFT)
+
+        self.field_wifi_ip = screen.field(0, 20, 16, ALIGN_LEFT)
+
+        screen.label('RSSI', 0, 30)
+        self.field_wifi_rssi = screen.field(40, 30, 4)
+        screen.label('dBm', 80, 30)
+
+        screen.label('Channel', 0, 40)
+        self.field_wifi_channel = screen.field(64, 40, 3)
+
+        screen.label('Drops', 0, 50)
+        self.field_wifi_drops = screen.field(48, 50, 5)
+
+        return screen
+
+    def build_queue_screen (self) -> Screen:
+        """
+        Declara la página de la cola de subida: rayos pendientes, estado de
+        los reintentos y rayos enviados.
+        """
+        screen = Screen(self.oled)
+
+        screen.label('Queue', 0, 0)
+        self.field_queue_pending = screen.field(56, 0, 5)
+
+        screen.label('Priority', 0, 10)
+        self.field_queue_priority = screen.field(72, 10, 3)
+
+        screen.label('API', 0, 20)
+        self.field_queue_state = screen.field(32, 20, 4, ALIGN_LEFT)
+        screen.label('Err', 72, 20)
+        self.field_queue_failures = screen.field(104, 20, 3)
+
+        screen.label('Retry', 0, 30)
+        self.field_queue_retry = screen.field(48, 30, 5)
+        screen.label('s', 88, 30)
+
+        screen.label('Sent', 0, 40)
+        self.field_queue_sent = screen.field(40, 40, 7)
+
+        screen.label('Delay', 0, 50)
+        self.field_queue_delay = screen.field(48, 50, 5)
+        screen.label('s', 88, 50)
+
+        return screen
+
+    def build_health_screen (self) -> Screen:
+        """
+        Declara la página de salud: temperatura, memoria, tiempo encendida,
+        latencia de la pantalla, errores y despertares.
+        """
+        screen = Screen(self.oled)
+
+        screen.label('CPU', 0, 0)
+        self.field_health_temp = screen.field(32, 0, 3)
+        screen.label('C max', 56, 0)
+        self.field_health_temp_max = screen.field(104, 0, 3)
+
+        screen.label('Free', 0, 10)
+        self.field_health_free = screen.field(40, 10, 7)
+
+        screen.label('Uptime', 0, 20)
+        self.field_health_uptime = screen.field(56, 20, 6)
+        screen.label('min', 104, 20)
+
+        screen.label('Latency', 0, 30)
+        self.field_health_latency = screen.field(64, 30, 5)
+        screen.label('us', 104, 30)
+
+        screen.label('Errors', 0, 40)
+        self.field_health_errors = screen.field(56, 40, 5)
+
+        screen.label('Wakes', 0, 50)
+        self.field_health_wakes = screen.field(48, 50, 7)
+
+        return screen
+
+    def get_wifi (self):
+        """
+        Devuelve el estado del wi-fi. Con hilo de subida la radio es suya y
+        se lee lo que publica, sin consultarla desde este núcleo.
+
+        :return: Diccionario de get_wifi_snapshot() o None si aún no se
+                 conoce.
+        """
+        if self.worker is not None:
+            return self.worker.get_wifi()
+
+        return self.controller.get_wifi_snapshot()
+
+    def wifi_connected (self) -> bool:
+        """
+        Indica si hay conexión wi-fi según get_wifi().
+        """
+        wifi = self.get_wifi()
+
+        return wifi is not None and wifi['connected']
+
+    def update_wifi_screen (self, screen) -> None:
+        """
+        Actualiza la página del Wi-Fi con el estado de get_wifi().
+        """
+        wifi = self.get_wifi()
+
+        if wifi is None:
+            wifi = {'state': None, 'drops': None, 'ssid': None, 'ip': None,
+                    'rssi': None, 'channel': None}
+
+        screen.set(self.field_wifi_state, wifi['state'])
+        screen.set(self.field_wifi_ssid, wifi['ssid'])
+        screen.set(self.field_wifi_ip, wifi['ip'])
+        screen.set(self.field_wifi_rssi, wifi['rssi'])
+        screen.set(self.field_wifi_channel, wifi['channel'])
+        screen.set(self.field_wifi_drops, wifi['drops'])
+
+    def update_queue_screen (self, screen) -> None:
+        """
+        Actualiza la página de la cola de subida.
+        """
+        scheduler = self.scheduler
+
+        screen.set(self.field_queue_pending,
+                   self.pending_count() + len(self.priority))
+        screen.set(self.field_queue_priority, len(self.priority))
+        screen.set(self.field_queue_state, scheduler.get_state_name())
+        screen.set(self.field_queue_failures, scheduler.failures)
+        screen.set(self.field_queue_retry,
+                   max(0, ticks_diff(scheduler.next_attempt, ticks_ms())) // 1000)
+        screen.set(self.field_queue_sent, self.priority_sent + self.bulk_sent)
+        screen.set(self.field_queue_delay, self.bulk_latency_ms // 1000)
+
+    def update_health_screen (self, screen) -> None:
+        """
+        Actualiza la página de salud de la placa.
+        """
+        self.controller.get_temp()
+        temp = self.controller.get_temp_stats()
+
+        screen.set(self.field_health_temp, int(temp['current']))
+        screen.set(self.field_health_temp_max, int(temp['max']))
+        screen.set(self.field_health_free, gc.mem_free())
+        screen.set(self.field_health_uptime,
+                   max(0, utime.time() - self.started) // 60)
+        screen.set(self.field_health_latency, self.display_latency_us)
+        screen.set(self.field_health_errors, self.errors)
+        screen.set(self.field_health_wakes, self.wakeups)
+
+    async def display_task (self):
+        """
+        Actualiza la página visible. Los cambios se dibujan en la caché de
+        la página y solo se envían las áreas que cambian; al cambiar de
+        página se copia su caché entera sobre la pantalla.
+        """
+        oled = self.oled
+
+        while True:
+            self.work_done()
+            await self.display_event.wait()
+            self.display_event.clear()
+
+            try:
+                if self.panel is not None and self.panel_wake:
+                    self.panel_wake = False
+                    await self.panel_command(self.panel.wake)
+                    self.panel_event.set()
+
+                page = self.page
+                screen, update = self.pages[page]
+
+                screen.start_update()
+                update(screen)
+
+                if page != self.page_shown:
+                    if self.page_shown is not None:
+                        self.pages[self.page_shown][0].hide()
+
+                    screen.show()
+                    self.page_shown = page
+
+                screen.finish_update()
+
+                if page == self.trend_page:
+                    self.trend_event.set()
+
+                # Con el panel apagado los cambios se quedan en el framebuffer
+                if self.panel is not None and not self.panel.should_flush():
+                    continue
+
+                if self.bus is not None:
+                    await self.bus.run(self.bus.get('display'), oled.flush(1))
+                else:
+                    oled.show()
+
+                if self.strike_shown:
+                    continue
+
+                self.strike_shown = True
+                latency = ticks_diff(ticks_us(), self.sensor.strike_ticks)
+                self.display_latency_us = latency
+
+                if latency > self.display_latency_max_us:
+                    self.display_latency_max_us = latency
+
+                if self.DEBUG:
+                    print('Latencia IRQ → pantalla:', latency, 'µs,',
+                          screen.last_pixels, 'píxeles redibujados,',
+                          screen.last_alloc, 'bytes reservados')
+            except Exception as e:
+                self.handle_error(e)
+
+    async def page_task (self):
+        """
+        Pasa a la siguiente página de la pantalla cada 'page_seconds'.
+        """
+        while True:
+            # Con el panel apagado no se rota hasta que se encienda
+            if self.panel is not None and self.panel.is_off():
+                self.page_at = None
+                await self.panel_event.wait()
+
+            self.page_at = ticks_add(ticks_ms(), self.page_seconds * 1000)
+            await asyncio.sleep(self.page_seconds)
+
+            self.page = (self.page + 1) % len(self.pages)
+            self.display_event.set()
+
+    async def trend_task (self):
+        """
+        Mientras la página de tendencia está visible la actualiza en cada
+        cambio de minuto para que las gráficas avancen aunque no haya rayos.
+        """
+        while True:
+            if self.page_shown != self.trend_page or \
+                    (self.panel is not None and self.panel.is_off()):
+                self.trend_at = None
+                await self.trend_event.wait()
+                self.trend_event.clear()
+                continue
+
+            wait = (60 - utime.time() % 60) * 1000
+            self.trend_at = ticks_add(ticks_ms(), wait)
+            await asyncio.sleep_ms(wait)
+
+            if self.page_shown == self.trend_page:
+                self.display_event.set()
+
+    async def panel_command (self, command):
+        """
+        Ejecuta una función que envía comandos a la pantalla con el bus
+        reservado para ella.
+
+        :return: Lo que devuelva la función.
+        """
+        if self.bus is None:
+            return command()
+
+        client = self.bus.get('display')
+        await self.bus.acquire(client)
+
+        try:
+            return command()
+        finally:
+            self.bus.release(client)
+
+    async def panel_task (self):
+        """
+        Atenúa y apaga la pantalla cuando se cumple su tiempo sin actividad.
+        Apagada, espera a que un rayo o una alerta la enciendan o a la
+        siguiente acumulación de estadísticas.
+        """
+        while True:
+            was_off = self.panel.is_off()
+
+            try:
+                wait = await self.panel_command(self.panel.poll)
+            except Exception as e:
+                self.handle_error(e)
+                wait = PANEL_RETRY_MS
+
+            self.panel_at = ticks_add(ticks_ms(), wait)
+
+            if self.DEBUG and self.panel.is_off() and not was_off:
+                print('Pantalla:', self.get_display_stats())
+
+            if self.panel.is_off():
+                try:
+                    await asyncio.wait_for_ms(self.panel_event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+                self.panel_event.clear()
+            else:
+                await asyncio.sleep_ms(wait)
+
+    def alert (self) -> None:
+        """
+        Enciende la pantalla por una alerta para que se vea el estado.
+        """
+        self.panel_wake = True
+        self.display_event.set()
+
+    def get_display_stats (self) -> dict:
+        """
+        Devuelve el tiempo con el panel encendido y los envíos a la pantalla
+        ahorrados, incluidas las rotaciones de página no hechas.
+        """
+        if self.panel is None:
+            return {}
+
+        return self.panel.get_stats(self.page_seconds * 1000)
+
+    async def led_task (self):
+        """
+        Simula flashes de relámpagos con los LEDs en cada rayo.
+        """
+        while True:
+            self.work_done()
+            await self.led_event.wait()
+            self.led_event.clear()
+
+            await self.simulate_random_lightning()
+
+    async def simulate_random_lightning (self):
+        """
+        Simula flashes de relámpagos de forma aleatoria con los LEDs sin
+        bloquear al resto de tareas.
+        """
+        leds = self.leds
+
+        if not leds:
+            return
+
+        self.leds_active = True
+
+        try:
+            for _ in range(random.randint(10, 25)):
+                led = random.choice(leds)
+
+                # Duración del flash (entre 150 y 350 ms)
+                led.on()
+                await asyncio.sleep_ms(random.randint(150, 350))
+                led.off()
+
+                # Pausa antes del siguiente flash (entre 50 y 100 ms)
+                await asyncio.sleep_ms(random.randint(50, 100))
+        finally:
+            self.leds_active = False
+
+    async def upload_task (self):
+        """
+        Sube los rayos pendientes a la API. Los reintentos tras un fallo los
+        marca el planificador (espera exponencial con jitter y circuit
+        breaker), aunque lleguen rayos nuevos mientras tanto.
+
+        Los rayos prioritarios se suben antes que la cola y sin esperar al
+        reintento, salvo con el circuit breaker abierto.
+        """
+        sensor = self.sensor
+        scheduler = self.scheduler
+
+        while True:
+            self.work_done()
+            await self.upload_event.wait()
+            self.upload_event.clear()
+
+            if self.api is None and self.worker is None:
+                sensor.clear_datas()
+                continue
+
+            # Con la radio apagada espero al motivo para abrir la ventana
+            if self.duty_cycle and not self.window_open:
+                wait = self.window_wait_ms()
+
+                if wait is None:
+                    continue
+
+                if wait > 0:
+                    self.work_done()
+
+                    try:
+                        await asyncio.wait_for_ms(self.upload_event.wait(), wait)
+                    except asyncio.TimeoutError:
+                        self.upload_event.set()
+
+                    continue
+
+            wait = scheduler.wait_ms()
+
+            if wait > 0 and (not self.priority or scheduler.is_open()):
+                # Un rayo nuevo interrumpe la espera por si es prioritario
+                self.work_done()
+
+                try:
+                    await asyncio.wait_for_ms(self.upload_event.wait(), wait)
+                except asyncio.TimeoutError:
+                    self.upload_event.set()
+
+                continue
+
+            was_open = scheduler.state == STATE_OPEN
+
+            try:
+                if self.duty_cycle and not self.window_open and \
+                        not await self.open_window():
+                    raise OSError('Wi-fi sin conexión en la ventana de subida')
+
+                if self.priority:
+                    await self.upload_priority()
+                else:
+                    await self.upload_bulk()
+            except Exception as e:
+                scheduler.record(0)
+                self.handle_error(e)
+
+            # Alerta al dejar de poder subir rayos
+            if scheduler.state == STATE_OPEN and not was_open:
+                self.alert()
+
+            pending = self.priority or self.has_pending()
+
+            # La radio se apaga al vaciar la cola o durante la espera de un
+            # reintento
+            if self.window_open and (scheduler.failures or not pending):
+                self.close_window()
+
+            # Continúo con el resto de la cola, el planificador marca cuándo
+            if pending:
+                self.upload_event.set()
+
+            if self.DEBUG:
+                self.report_stats()
+
+    def report_stats (self) -> None:
+        """
+        Muestra por consola el estado de las subidas, el uso de la radio,
+        el de la pantalla y las esperas por el bus I2C.
+        """
+        print('Planificador de subidas:', self.scheduler.get_stats())
+        print('Latencia de subida:', self.get_latency_stats())
+        print('Radio:', self.get_radio_stats())
+
+        if self.panel is not None:
+            print('Pantalla:', self.get_display_stats())
+
+        if self.bus is not None:
+            print('Bus I2C:', self.bus.get_stats())
+
+    def window_wait_ms (self):
+        """
+        Calcula cuánto falta para abrir la ventana de subida y su motivo.
+
+        :return: 0 si hay que abrirla ya, los ms hasta el plazo del rayo
+                 pendiente más antiguo o None si no hay nada pendiente.
+        """
+        if self.priority:
+            self.wake_reason = WAKE_PRIORITY
+            return 0
+
+        pending = self.pending_count()
+
+        if not pending:
+            self.pending_since = None
+            return None
+
+        if self.pending_since is None:
+            self.pending_since = ticks_ms()
+
+        if pending >= self.window_threshold:
+            self.wake_reason = WAKE_QUEUE
+            return 0
+
+        self.wake_reason = WAKE_DEADLINE
+
+        return max(0, self.window_ms - ticks_diff(ticks_ms(), self.pending_since))
+
+    async def open_window (self) -> bool:
+        """
+        Enciende la radio y espera a que conecte el wi-fi.
+
+        :return: True si hay conexión.
+        """
+        controller = self.controller
+
+        self.window_open = True
+        self.wakes[self.wake_reason] += 1
+        controller.wifi_wake()
+
+        if self.DEBUG:
+            print('Ventana de subida por', WAKE_NAMES[self.wake_reason])
+
+        start = ticks_ms()
+
+        while not self.wifi_connected():
+            if ticks_diff(ticks_ms(), start) >= WINDOW_CONNECT_MS:
+                self.close_window()
+                return False
+
+            await asyncio.sleep_ms(WIFI_POLL_MS // 5)
+
+        return True
+
+    def close_window (self) -> None:
+        """
+        Cierra la ventana de subida y apaga la radio. Si quedan rayos sin
+        subir se mantiene el plazo del más antiguo.
+        """
+        self.window_open = False
+
+        if not (self.priority or self.has_pending()):
+            self.pending_since = None
+
+        self.controller.wifi_sleep()
+
+    def get_radio_stats (self) -> dict:
+        """
+        Devuelve el uso de la radio, la energía por rayo subido y las
+        aperturas de ventana por motivo.
+        """
+        stats = self.controller.get_radio_stats(self.priority_sent + self.bulk_sent)
+
+        for reason in range(len(WAKE_NAMES)):
+            stats['wake_' + WAKE_NAMES[reason]] = self.wakes[reason]
+
+        return stats
+
+    async def upload (self, lightnings):
+        """
+        Sube un lote por el hilo de subida o directamente con la API.
+
+        :return: Tupla (código HTTP, rayos confirmados, rayos incluidos en
+                 la petición).
+        """
+        if self.worker is not None:
+            return await self.upload_in_worker(lightnings)
+
+        self.api.save_lightnings(lightnings)
+
+        return self.api.last_status, self.api.last_sent, self.api.last_count
+
+    async def upload_priority (self):
+        """
+        Sube de inmediato los rayos de la vía prioritaria. Si la subida falla
+        pasan todos a la cola normal y siguen sus reintentos.
+        """
+        entries = self.priority
+        self.priority = []
+        self.priority_inflight = len(entries)
+
+        try:
+            status, uploaded, count = await self.upload([entry[0] for entry in entries])
+        except Exception as e:
+            self.handle_error(e)
+            status = uploaded = count = 0
+        finally:
+            self.priority_inflight = 0
+
+        result = self.scheduler.record(status)
+        now = ticks_us()
+
+        if result == RESULT_SUCCESS:
+            for lightning, irq_ticks in entries[:uploaded]:
+                latency = ticks_diff(now, irq_ticks) // 1000
+                self.priority_latency_ms = latency
+
+                if latency > self.priority_latency_max_ms:
+                    self.priority_latency_max_ms = latency
+
+            self.priority_sent += uploaded
+
+            # Los que no cupieron en la petición siguen siendo prioritarios
+            self.priority = entries[uploaded:] + self.priority
+            self.ack_priority(uploaded)
+        elif result == RESULT_REJECTED:
+            # La API no aceptará nunca los incluidos en la petición
+            self.priority = entries[count:] + self.priority
+            self.ack_priority(count)
+        else:
+            for lightning, irq_ticks in entries:
+                self.demote(lightning)
+
+            self.ack_priority(len(entries), demoted=True)
+
+        # Los llegados durante la subida pueden superar el máximo
+        self.trim_priority()
+
+        if self.DEBUG:
+            print('Subida prioritaria:', status, uploaded, 'rayos, latencia',
+                  self.priority_latency_ms, 'ms')
+
+    async def upload_bulk (self):
+        """
+        Sube el siguiente lote de la cola normal.
+        """
+        sensor = self.sensor
+        overflows = sensor.lightnings.overflows
+
+        # Lote a subir. Solo se eliminan los subidos, pueden llegar nuevos
+        # durante la subida
+        if self.journal is not None:
+            lightnings = self.journal.read(self.batch_size)
+        elif self.worker is not None:
+            lightnings = [sensor.lightnings.get(i) for i in
+                          range(min(len(sensor.lightnings), self.batch_size))]
+        else:
+            lightnings = sensor.lightnings
+
+        if self.DEBUG:
+            print('Se han detectado rayos, se guardan en la API')
+            print('Rayos descartados por falta de espacio:', overflows)
+
+        # La API envía los rayos en bloques acotados, solo se confirman los
+        # incluidos en la petición
+        status, uploaded, count = await self.upload(lightnings)
+        result = self.scheduler.record(status)
+
+        # Los rechazados por la API no se reintentan, se descartan todos los
+        # incluidos en la petición
+        if result == RESULT_REJECTED:
+            uploaded = count
+
+        if result == RESULT_SUCCESS and uploaded:
+            newest = lightnings[uploaded - 1] if isinstance(lightnings, list) \
+                else lightnings.get(min(uploaded, len(lightnings)) - 1)
+            latency = (utime.time() - newest[0]) * 1000
+            self.bulk_latency_ms = latency
+            self.bulk_sent += uploaded
+
+            if latency > self.bulk_latency_max_ms:
+                self.bulk_latency_max_ms = latency
+
+        if result != RESULT_RETRY:
+            if self.journal is not None:
+                self.journal.ack(uploaded)
+            else:
+                # Los descartados por desbordamiento durante la subida ya no
+                # están en el buffer
+                sensor.clear_datas(uploaded - (sensor.lightnings.overflows - overflows))
+
+    def pending_count (self) -> int:
+        """
+        Devuelve los rayos de la cola normal pendientes de subir: los de la
+        cola persistente si la hay o los del buffer en memoria.
+        """
+        if self.journal is not None:
+            return self.journal.pending()
+
+        return len(self.sensor.lightnings)
+
+    def has_pending (self) -> bool:
+        """
+        Indica si quedan rayos por subir.
+        """
+        return self.pending_count() > 0
+
+    async def journal_task (self):
+        """
+        Vuelca a la flash los rayos agrupados en memoria como mucho
+        'flush_seconds' después del primero, aunque no se llegue al tamaño
+        de grupo.
+        """
+        while True:
+            await self.journal_event.wait()
+            self.flush_at = ticks_add(ticks_ms(), self.flush_seconds * 1000)
+            await asyncio.sleep(self.flush_seconds)
+            self.journal_event.clear()
+            self.flush_at = None
+
+            try:
+                self.journal.flush()
+
+                if self.DEBUG:
+                    print('Cola persistente volcada en', self.journal.flush_us, 'µs')
+            except Exception as e:
+                self.handle_error(e)
+
+    def work_done (self) -> None:
+        """
+        Avisa a idle_task de que una tarea ha terminado y vuelve a esperar,
+        por si ya se puede dormir.
+        """
+        if self.power is not None:
+            self.idle_flag.set()
+
+    def idle_ms (self):
+        """
+        Calcula cuánto puede dormir la placa sin retrasar ninguna tarea.
+
+        :return: Milisegundos hasta la siguiente fecha límite conocida o None
+                 si hay trabajo pendiente o la radio está encendida.
+        """
+        # Sin pantalla nadie consume su evento, así que no cuenta
+        if self.sensor.pending or self.leds_active or self.window_open or \
+                (self.oled is not None and self.display_event.is_set()) or \
+                self.led_event.is_set() or self.upload_event.is_set():
+            return None
+
+        # Con la radio encendida no se duerme para no perder la conexión
+        if self.api is not None or self.worker is not None:
+            if not self.controller.wifi_is_off():
+                return None
+
+            if self.worker is not None and not self.worker.is_idle():
+                return None
+
+        wait = self.power.max_sleep_ms
+        now = ticks_ms()
+
+        if self.duty_cycle:
+            window = self.window_wait_ms()
+
+            if window is not None:
+                retry = ticks_diff(self.scheduler.next_attempt, now)
+                wait = min(wait, max(window, retry, 0))
+
+        if self.flush_at is not None:
+            wait = min(wait, max(0, ticks_diff(self.flush_at, now)))
+
+        if self.page_at is not None:
+            wait = min(wait, max(0, ticks_diff(self.page_at, now)))
+
+        if self.trend_at is not None:
+            wait = min(wait, max(0, ticks_diff(self.trend_at, now)))
+
+        if self.panel_at is not None:
+            wait = min(wait, max(0, ticks_diff(self.panel_at, now)))
+
+        return wait
+
+    async def idle_task (self):
+        """
+        Duerme la placa en lightsleep mientras no haya trabajo. Al despertar
+        cede el control para que las tareas atiendan la IRQ o su espera.
+
+        Con trabajo en curso no comprueba nada hasta que una tarea termina o
+        se apaga la radio. Si la siguiente fecha límite está demasiado cerca
+        para dormir, la espera sin dormir.
+        """
+        while True:
+            try:
+                wait = self.idle_ms()
+                slept = self.power.sleep(wait) if wait is not None else 0
+            except Exception as e:
+                self.handle_error(e)
+                wait = None
+
+            if wait is None:
+                await self.idle_flag.wait()
+            else:
+                await asyncio.sleep_ms(0 if slept else wait)
+
+    async def network_task (self):
+        """
+        Mantiene la conexión Wi-Fi y la sesión con el servidor cuando no hay
+        hilo de subida que lo haga, sin bloquear la captura de rayos.
+        """
+        while True:
+            try:
+                self.controller.wifi_poll()
+                self.api.poll()
+            except Exception as e:
+                self.handle_error(e)
+
+            await asyncio.sleep_ms(WIFI_POLL_MS)
+
+    async def upload_in_worker (self, lightnings):
+        """
+        Entrega al hilo de subida un lote de rayos y espera su confirmación
+        sin bloquear el núcleo 0.
+
+        :param lightnings: Lista de rayos que pasa a ser propiedad del hilo.
+        :return: Tupla (código HTTP, rayos confirmados, rayos incluidos en
+                 la petición). El código es 0 si no hubo respuesta o no
+                 llegó antes de ACK_TIMEOUT_MS, para que reintente el
+                 planificador.
+        """
+        worker = self.worker
+        batch_id = worker.submit(lightnings)
+
+        if batch_id is None:
+            return 0, 0, 0
+
+        start = ticks_ms()
+
+        while ticks_diff(ticks_ms(), start) < ACK_TIMEOUT_MS:
+            ack = worker.get_ack(batch_id)
+
+            if ack is not None:
+                return ack[2], ack[3], ack[4]
+
+            await asyncio.sleep_ms(ACK_POLL_MS)
+
+        worker.cancel(batch_id)
+
+        if self.DEBUG:
+            print('Sin confirmación del hilo de subida para el lote', batch_id)
+
+        return 0, 0, 0
+
+    def get_latency_stats (self) -> dict:
+        """
+        Devuelve la latencia hasta la confirmación de cada vía de subida.
+        """
+        return {
+            'priority_sent': self.priority_sent,
+            'priority_ms': self.priority_latency_ms,
+            'priority_max_ms': self.priority_latency_max_ms,
+            'bulk_sent': self.bulk_sent,
+            'bulk_ms': self.bulk_latency_ms,
+            'bulk_max_ms': self.bulk_latency_max_ms,
+        }
+
+    def handle_error (self, e):
+        """
+        Registra un error de una tarea y libera memoria.
+        """
+        self.errors += 1
+
+        if self.DEBUG:
+            print('Error: ', e)
+            print('Memoria antes de liberar: ', gc.mem_free())
+
+        gc.collect()
+
+        if self.DEBUG:
+            print("Memoria después de liberar:", gc.mem_free())
+
+    async def run (self):
+        """
+        Lanza todas las tareas y queda a la espera indefinidamente.
+        """
+        tasks = [
+            asyncio.create_task(self.sensor_task()),
+            asyncio.create_task(self.led_task()),
+            asyncio.create_task(self.upload_task()),
+        ]
+
+        if self.oled is not None:
+            tasks.append(asyncio.create_task(self.display_task()))
+
+            if self.page_seconds:
+                tasks.append(asyncio.create_task(self.page_task()))
+
+            if self.trend_page is not None:
+                tasks.append(asyncio.create_task(self.trend_task()))
+
+            if self.panel is not None:
+                tasks.append(asyncio.create_task(self.panel_task()))
+
+        if self.api is not None and self.worker is None:
+            tasks.append(asyncio.create_task(self.network_task()))
+
+        # Si la radio está siempre encendida la placa no puede dormir
+        if self.power is not None and (self.duty_cycle or (
+                self.api is None and self.worker is None)):
+            tasks.append(asyncio.create_task(self.idle_task()))
+
+            if self.duty_cycle:
+                self.controller.wifi_on_change(lambda state: self.idle_flag.set())
+
+        if self.journal is not None:
+            tasks.append(asyncio.create_task(self.journal_task()))
+
+            # Rayos sin confirmar de antes del reinicio
+            if self.journal.pending():
+                self.upload_event.set()
+
+        # Rayos prioritarios sin confirmar de antes del reinicio
+        if self.priority:
+            self.upload_event.set()
+
+        # Proceso un posible evento anterior al arranque de las tareas
+        if self.sensor.pending:
+            self.irq_flag.set()
+
+        # La radio queda apagada hasta la primera ventana de subida
+        if self.duty_cycle:
+            self.controller.wifi_sleep()
+
+        await asyncio.gather(*tasks)
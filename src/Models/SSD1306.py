@@ -22,6 +22,11 @@ SET_PRECHARGE       = const(0xd9)
 SET_VCOM_DESEL      = const(0xdb)
 SET_CHARGE_PUMP     = const(0x8d)
 
+# Coste fijo en bytes del bus de cada ventana de refresco parcial: una
+# transacción con los seis comandos de dirección (dirección I2C, control y
+# comandos) más la dirección y el byte de control de los datos
+WINDOW_OVERHEAD     = const(10)
+
 
 class SSD1306:
     def __init__(self, width, height, external_vcc):
@@ -29,6 +34,18 @@ class SSD1306:
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
+        # Columnas modificadas en cada página desde el último show(). Una
+        # página está limpia si su primera columna es mayor que la última
+        self.dirty_x0 = bytearray(b'\xff' * self.pages)
+        self.dirty_x1 = bytearray(self.pages)
+        # Comandos de dirección de cada ventana, se reutiliza en cada show()
+        self.window_cmds = bytearray(6)
+        # Estadísticas del bus: bytes enviados en total y en el último show()
+        # y transacciones
+        self.bus_bytes = 0
+        self.bus_transactions = 0
+        self.last_flush_bytes = 0
+        self.flushes = 0
         # Note the subclass must initialize self.framebuf to a framebuffer.
         # This is necessary because the underlying data buffer is different
         # between I2C and SPI implementations (I2C needs an extra byte).
@@ -36,7 +53,7 @@ class SSD1306:
         self.init_display()
 
     def init_display(self):
-        for cmd in (
+        self.write_cmds((
             SET_DISP | 0x00, # off
             # address setting
             SET_MEM_ADDR, 0x00, # horizontal
@@ -57,47 +74,138 @@ class SSD1306:
             SET_NORM_INV, # not inverted
             # charge pump
             SET_CHARGE_PUMP, 0x10 if self.external_vcc else 0x14,
-            SET_DISP | 0x01): # on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01)) # on
         self.fill(0)
         self.show()
 
     def poweroff(self):
         self.write_cmd(SET_DISP | 0x00)
 
+    def display_on(self):
+        # Vuelve a encender el panel tras poweroff() sin reiniciarlo, por lo
+        # que conserva la configuración y el contenido de su RAM
+        self.write_cmd(SET_DISP | 0x01)
+
     def contrast(self, contrast):
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmds((SET_CONTRAST, contrast))
 
     def invert(self, invert):
-        self.write_cmd(SET_NORM_INV | (invert & 1))
+        self.write_cmds((SET_NORM_INV | (invert & 1),))
+
+    def mark_dirty(self, x, y, w, h):
+        # Marca un rectángulo como modificado. Hay que llamarlo al dibujar
+        # directamente sobre self.framebuf
+        x0 = max(0, x)
+        x1 = min(self.width - 1, x + w - 1)
+        y0 = max(0, y)
+        y1 = min(self.height - 1, y + h - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if x0 < self.dirty_x0[page]:
+                self.dirty_x0[page] = x0
+            if x1 > self.dirty_x1[page]:
+                self.dirty_x1[page] = x1
 
     def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_framebuf()
+        for _ in self.flush():
+            pass
+
+    def flush(self, max_pages=0):
+        # Generador que envía las ventanas modificadas, una por iteración.
+        # Las páginas consecutivas se agrupan en una ventana si cuesta menos
+        # que enviarlas por separado, hasta 'max_pages' páginas por ventana
+        # (0 sin límite). Así quien lo recorre puede ceder el bus entre
+        # ventanas
+        x0 = self.dirty_x0
+        x1 = self.dirty_x1
+        start = self.bus_bytes
+        page = 0
+        while page < self.pages:
+            if x0[page] > x1[page]:
+                page += 1
+                continue
+            first = page
+            lo = x0[page]
+            hi = x1[page]
+            while page + 1 < self.pages and x0[page + 1] <= x1[page + 1] and \
+                    (not max_pages or page + 1 - first < max_pages):
+                new_lo = min(lo, x0[page + 1])
+                new_hi = max(hi, x1[page + 1])
+                merged = (page - first + 2) * (new_hi - new_lo + 1)
+                separate = ((page - first + 1) * (hi - lo + 1) + WINDOW_OVERHEAD +
+                            x1[page + 1] - x0[page + 1] + 1)
+                if merged > separate:
+                    break
+                lo = new_lo
+                hi = new_hi
+                page += 1
+            # Lo que se dibuje a partir de aquí queda para el siguiente volcado
+            for clean in range(first, page + 1):
+                x0[clean] = 0xff
+                x1[clean] = 0
+            self.write_window(first, page, lo, hi)
+            page += 1
+            yield
+        self.last_flush_bytes = self.bus_bytes - start
+        if self.last_flush_bytes:
+            self.flushes += 1
+
+    def write_cmds(self, cmds, count=None):
+        # Envía varios comandos seguidos. Las interfaces que lo permiten los
+        # agrupan en una sola transacción
+        for i in range(len(cmds) if count is None else count):
+            self.write_cmd(cmds[i])
+
+    def write_window(self, page0, page1, col0, col1):
+        offset = 32 if self.width == 64 else 0
+        cmds = self.window_cmds
+        cmds[0] = SET_COL_ADDR
+        cmds[1] = col0 + offset
+        cmds[2] = col1 + offset
+        cmds[3] = SET_PAGE_ADDR
+        cmds[4] = page0
+        cmds[5] = page1
+        self.write_cmds(cmds)
+        width = self.width
+        if col0 == 0 and col1 == width - 1:
+            # Páginas completas: son contiguas en el framebuffer
+            self.write_data((self.pixels[page0 * width:(page1 + 1) * width],))
+        else:
+            self.write_data([self.pixels[page * width + col0:page * width + col1 + 1]
+                             for page in range(page0, page1 + 1)])
 
     def fill(self, col):
         self.framebuf.fill(col)
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def fill_rect(self, x, y, w, h, col):
+        self.framebuf.fill_rect(x, y, w, h, col)
+        self.mark_dirty(x, y, w, h)
+
+    def rect(self, x, y, w, h, col):
+        self.framebuf.rect(x, y, w, h, col)
+        self.mark_dirty(x, y, w, h)
+
+    def hline(self, x, y, w, col):
+        self.framebuf.hline(x, y, w, col)
+        self.mark_dirty(x, y, w, 1)
+
+    def vline(self, x, y, h, col):
+        self.framebuf.vline(x, y, h, col)
+        self.mark_dirty(x, y, 1, h)
 
     def pixel(self, x, y, col):
         self.framebuf.pixel(x, y, col)
+        self.mark_dirty(x, y, 1, 1)
 
     def scroll(self, dx, dy):
         self.framebuf.scroll(dx, dy)
+        self.mark_dirty(0, 0, self.width, self.height)
 
     def text(self, string, x, y, col=1):
         self.framebuf.text(string, x, y, col)
+        self.mark_dirty(x, y, len(string) * 8, 8)
 
 
 class SSD1306_I2C(SSD1306):
@@ -105,6 +213,9 @@ class SSD1306_I2C(SSD1306):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
+        # Buffer reutilizable para agrupar comandos: byte de control Co=0,
+        # D/C#=0 seguido de los comandos
+        self.cmd_buffer = bytearray(32)
         # Add an extra byte to the data buffer to hold an I2C data/command byte
         # to use hardware-compatible I2C transactions.  A memoryview of the
         # buffer is used to mask this byte from the framebuffer operations
@@ -112,18 +223,47 @@ class SSD1306_I2C(SSD1306):
         # buffer).
         self.buffer = bytearray(((height // 8) * width) + 1)
         self.buffer[0] = 0x40  # Set first byte of data buffer to Co=0, D/C=1
-        self.framebuf = framebuf.FrameBuffer1(memoryview(self.buffer)[1:], width, height)
+        self.pixels = memoryview(self.buffer)[1:]
+        self.framebuf = framebuf.FrameBuffer1(self.pixels, width, height)
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80 # Co=1, D/C#=0
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
+        self.bus_bytes += 3
+        self.bus_transactions += 1
+
+    def write_cmds(self, cmds, count=None):
+        # Todos los comandos en una transacción por cada buffer lleno
+        if count is None:
+            count = len(cmds)
+        buffer = self.cmd_buffer
+        size = len(buffer) - 1
+        buffer[0] = 0x00
+        for start in range(0, count, size):
+            n = min(size, count - start)
+            for i in range(n):
+                buffer[i + 1] = cmds[start + i]
+            self.i2c.writeto(self.addr, memoryview(buffer)[:n + 1])
+            self.bus_bytes += n + 2
+            self.bus_transactions += 1
+
+    def write_data(self, chunks):
+        # Una sola transacción: byte de control de datos y los fragmentos
+        size = 2
+        for chunk in chunks:
+            size += len(chunk)
+        self.i2c.writevto(self.addr, (b'\x40',) + tuple(chunks))
+        self.bus_bytes += size
+        self.bus_transactions += 1
 
     def write_framebuf(self):
         # Blast out the frame buffer using a single I2C transaction to support
         # hardware I2C interfaces.
         self.i2c.writeto(self.addr, self.buffer)
+        self.bus_bytes += len(self.buffer) + 1
+        self.bus_transactions += 1
 
     def poweron(self):
         pass
@@ -136,10 +276,12 @@ class SSD1306_SPI(SSD1306):
         res.init(res.OUT, value=0)
         cs.init(cs.OUT, value=1)
         self.spi = spi
+        self.cmd_buffer = bytearray(32)
         self.dc = dc
         self.res = res
         self.cs = cs
         self.buffer = bytearray((height // 8) * width)
+        self.pixels = memoryview(self.buffer)
         self.framebuf = framebuf.FrameBuffer1(self.buffer, width, height)
         super().__init__(width, height, external_vcc)
 
@@ -150,6 +292,36 @@ class SSD1306_SPI(SSD1306):
         self.cs.low()
         self.spi.write(bytearray([cmd]))
         self.cs.high()
+        self.bus_bytes += 1
+        self.bus_transactions += 1
+
+    def write_cmds(self, cmds, count=None):
+        if count is None:
+            count = len(cmds)
+        buffer = self.cmd_buffer
+        for start in range(0, count, len(buffer)):
+            n = min(len(buffer), count - start)
+            for i in range(n):
+                buffer[i] = cmds[start + i]
+            self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+            self.cs.high()
+            self.dc.low()
+            self.cs.low()
+            self.spi.write(memoryview(buffer)[:n])
+            self.cs.high()
+            self.bus_bytes += n
+            self.bus_transactions += 1
+
+    def write_data(self, chunks):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs.high()
+        self.dc.high()
+        self.cs.low()
+        for chunk in chunks:
+            self.spi.write(chunk)
+            self.bus_bytes += len(chunk)
+        self.cs.high()
+        self.bus_transactions += 1
 
     def write_framebuf(self):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
@@ -0,0 +1,322 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Pantallas en modo retenido para la SSD1306. Una pantalla se declara una vez
+# con sus textos fijos y sus campos, y al actualizar solo se redibujan los
+# caracteres de los campos que han cambiado. Los valores se formatean en
+# buffers preasignados y cada carácter se copia desde una caché de glifos,
+# por lo que una actualización no reserva memoria. También puede contener
+# imágenes (otros FrameBuffer, como gráficas) que se copian solo cuando
+# cambian.
+#
+# Cada pantalla se dibuja en su propio FrameBuffer, que hace de caché de la
+# página: mostrarla es copiarlo sobre el de la SSD1306. Mientras está oculta
+# se puede seguir actualizando sin enviar nada a la pantalla.
+
+import gc
+import framebuf
+
+# Alineación de los campos
+ALIGN_LEFT = const(0)
+ALIGN_RIGHT = const(1)
+
+# Tamaño de un carácter de la fuente de framebuf
+CHAR_SIZE = const(8)
+
+# Espacio y guion en ASCII
+SPACE = const(0x20)
+DASH = const(0x2D)
+
+# Glifos ya renderizados por código ASCII, compartidos por todas las
+# pantallas
+glyphs = [None] * 128
+
+
+class Screen:
+    """
+    Pantalla con textos fijos y campos que se redibujan por separado.
+
+    :param oled: Pantalla SSD1306 en la que se muestra.
+    """
+
+    def __init__ (self, oled):
+        self.oled = oled
+        self.labels = []
+
+        # Caché de la página, del mismo tamaño que la pantalla
+        self.buffer = bytearray(oled.width * oled.height // 8)
+        self.framebuf = framebuf.FrameBuffer(self.buffer, oled.width,
+                                             oled.height, framebuf.MONO_VLSB)
+
+        # Si se está mostrando y si ha cambiado desde que se copió
+        self.visible = False
+        self.changed = False
+
+        # Por campo: posición, alineación, contenido mostrado y buffer donde
+        # se formatea el nuevo valor
+        self.fields = []
+
+        # Por imagen: FrameBuffer de origen, posición y tamaño
+        self.images = []
+
+        # Textos ya codificados a bytes para no codificarlos en cada
+        # actualización
+        self.encoded = {}
+
+        # Estadísticas de la última actualización
+        self.alloc_start = 0
+        self.last_alloc = 0
+        self.last_pixels = 0
+        self.updates = 0
+
+    def label (self, text, x, y) -> None:
+        """
+        Declara un texto fijo.
+        """
+        self.labels.append((text, x, y))
+
+    def field (self, x, y, width, align=ALIGN_RIGHT) -> int:
+        """
+        Declara un campo de 'width' caracteres.
+
+        :return: Índice del campo para set().
+        """
+        self.fields.append((x, y, align, bytearray(b' ' * width),
+                            bytearray(width)))
+
+        return len(self.fields) - 1
+
+    def image (self, source, x, y, width, height) -> int:
+        """
+        Declara una imagen copiada desde otro FrameBuffer.
+
+        :return: Índice de la imagen para update_image().
+        """
+        self.images.append((source, x, y, width, height))
+
+        return len(self.images) - 1
+
+    def update_image (self, index, changed_x=0) -> int:
+        """
+        Copia de nuevo una imagen que ha cambiado. Solo se marcan para
+        enviar a la pantalla las columnas desde 'changed_x', el resto debe
+        coincidir con lo que ya se mostró.
+
+        :param changed_x: Primera columna de la imagen que ha cambiado.
+        :return: Píxeles redibujados.
+        """
+        source, x, y, width, height = self.images[index]
+        self.framebuf.blit(source, x, y)
+        self.mark(x + changed_x, y, width - changed_x, height)
+        pixels = (width - changed_x) * height
+        self.last_pixels += pixels
+
+        return pixels
+
+    def redraw (self) -> None:
+        """
+        Borra la página y dibuja todos los textos, campos e imágenes.
+        """
+        self.framebuf.fill(0)
+        self.mark(0, 0, self.oled.width, self.oled.height)
+
+        for text, x, y in self.labels:
+            self.framebuf.text(text, x, y, 1)
+
+        for x, y, align, shown, scratch in self.fields:
+            for i in range(len(shown)):
+                self.draw_char(shown[i], x + i * CHAR_SIZE, y)
+
+        for index in range(len(self.images)):
+            self.update_image(index)
+
+    def glyph (self, code):
+        """
+        Devuelve el glifo de un carácter, renderizándolo la primera vez.
+        """
+        glyph = glyphs[code & 0x7F]
+
+        if glyph is None:
+            glyph = framebuf.FrameBuffer(bytearray(CHAR_SIZE), CHAR_SIZE,
+                                         CHAR_SIZE, framebuf.MONO_VLSB)
+            glyph.text(chr(code & 0x7F), 0, 0, 1)
+            glyphs[code & 0x7F] = glyph
+
+        return glyph
+
+    def draw_char (self, code, x, y) -> None:
+        """
+        Copia el glifo completo (fondo incluido) en la posición indicada.
+        """
+        self.framebuf.blit(self.glyph(code), x, y)
+        self.mark(x, y, CHAR_SIZE, CHAR_SIZE)
+
+    def mark (self, x, y, width, height) -> None:
+        """
+        Registra un cambio en la página. Si se está mostrando, el área se
+        marca para enviarla a la pantalla.
+        """
+        self.changed = True
+
+        if self.visible:
+            self.oled.mark_dirty(x, y, width, height)
+
+    def show (self) -> None:
+        """
+        Muestra la página copiando su caché sobre la pantalla.
+        """
+        self.oled.framebuf.blit(self.framebuf, 0, 0)
+        self.oled.mark_dirty(0, 0, self.oled.width, self.oled.height)
+        self.visible = True
+        self.changed = False
+
+    def hide (self) -> None:
+        """
+        Deja de mostrar la página, sus cambios solo van a la caché.
+        """
+        self.visible = False
+
+    def format (self, buffer, value, align) -> None:
+        """
+        Escribe el valor en el buffer del campo, relleno con espacios.
+
+        :param value: Entero, bytes, str (se codifica una sola vez), False
+                      para '--' o None para dejarlo vacío. Un entero que no
+                      cabe se muestra como el mayor que cabe (9999, -999).
+        """
+        width = len(buffer)
+
+        if value is None:
+            for i in range(width):
+                buffer[i] = SPACE
+            return
+
+        if value is False:
+            value = b'--'
+        elif isinstance(value, str):
+            text = self.encoded.get(value)
+
+            if text is None:
+                text = value.encode()
+                self.encoded[value] = text
+
+            value = text
+
+        if isinstance(value, int):
+            # Dígitos de derecha a izquierda sin crear cadenas
+            negative = value < 0
+            value = -value if negative else value
+            end = width
+
+            while end > 0:
+                end -= 1
+                buffer[end] = 0x30 + value % 10
+                value //= 10
+
+                if not value:
+                    break
+
+            # Sin sitio para todas las cifras o para el signo: se satura en
+            # lugar de quedarse con las últimas cifras
+            if value or (negative and end == 0):
+                for i in range(width):
+                    buffer[i] = 0x39
+                if negative:
+                    buffer[0] = DASH
+                return
+
+            if negative and end > 0:
+                end -= 1
+                buffer[end] = DASH
+
+            size = width - end
+
+            if align == ALIGN_LEFT:
+                for i in range(size):
+                    buffer[i] = buffer[end + i]
+                start = size
+            else:
+                start = 0
+
+            for i in range(start, start + width - size):
+                buffer[i] = SPACE
+            return
+
+        size = min(width, len(value))
+        pad = width - size if align == ALIGN_RIGHT else 0
+
+        for i in range(width):
+            buffer[i] = value[i - pad] if pad <= i < pad + size else SPACE
+
+    def set (self, index, value) -> int:
+        """
+        Cambia el valor de un campo y redibuja solo los caracteres que
+        cambian.
+
+        :return: Píxeles redibujados.
+        """
+        x, y, align, shown, scratch = self.fields[index]
+        self.format(scratch, value, align)
+        pixels = 0
+
+        for i in range(len(shown)):
+            if scratch[i] != shown[i]:
+                shown[i] = scratch[i]
+                self.draw_char(shown[i], x + i * CHAR_SIZE, y)
+                pixels += CHAR_SIZE * CHAR_SIZE
+
+        self.last_pixels += pixels
+
+        return pixels
+
+    def start_update (self) -> None:
+        """
+        Empieza a medir una actualización de varios campos.
+        """
+        self.last_pixels = 0
+        self.alloc_start = gc.mem_alloc()
+
+    def finish_update (self) -> None:
+        """
+        Termina la actualización copiando la página a la pantalla si se está
+        mostrando y ha cambiado, y guarda la memoria reservada (solo fiable
+        si no ha saltado el recolector) y los píxeles redibujados.
+        """
+        if self.visible and self.changed:
+            self.oled.framebuf.blit(self.framebuf, 0, 0)
+            self.changed = False
+
+        self.last_alloc = gc.mem_alloc() - self.alloc_start
+        self.updates += 1
@@ -1,5 +1,28 @@
 from time import sleep_ms
 
+# Bloque de registros que se mantiene en memoria (0x00 - 0x0F)
+REGISTERS_SIZE = const(16)
+
+# Registros de estado y resultado del último evento (0x03 - 0x07). Son los
+# únicos que cambian por sí solos en el sensor, el resto es configuración, por
+# lo que nunca se dan por válidos en memoria y se leen del bus en cada acceso.
+STATUS_START = const(0x03)
+STATUS_END = const(0x08)
+STATUS_MASK = const(0xF8)
+ALL_REGISTERS_MASK = const(0xFFFF)
+
+# Bloque leído de una vez para cada evento: desde el piso de ruido (0x01)
+# hasta la distancia (0x07).
+EVENT_START = const(0x01)
+EVENT_END = const(0x08)
+EVENT_MASK = const(0xFE)
+
+# Posiciones de cada dato en la lista que devuelve read_event()
+EVENT_SOURCE = const(0)
+EVENT_DISTANCE = const(1)
+EVENT_ENERGY = const(2)
+EVENT_NOISE_FLOOR = const(3)
+
 
 class SensorCJMCUAS3935:
     def __init__ (self, i2c, address=0x03, debug=False, indoor=True):
@@ -21,8 +44,20 @@ class SensorCJMCUAS3935:
         self.i2cbus = i2c
         self.address = address
 
-        # Inicializa la estructura de los registros
-        self.registers = None
+        # Copia en memoria (shadow) de los registros del sensor. Los bits de
+        # "dirty" marcan qué registros no se corresponden con el sensor y
+        # deben leerse del bus antes de usarlos.
+        self.registers = bytearray(REGISTERS_SIZE)
+        self.status = memoryview(self.registers)[STATUS_START:STATUS_END]
+        self.dirty = ALL_REGISTERS_MASK
+
+        # Buffer para leer un evento completo en una sola transacción y lista
+        # reutilizada con el resultado decodificado.
+        self.event_registers = memoryview(self.registers)[EVENT_START:EVENT_END]
+        self.event = [0, False, 0, 0]
+
+        # Contador de transacciones I2C realizadas sobre el sensor.
+        self.i2c_transactions = 0
 
         self.set_indoors(indoor)
         self.set_noise_floor(0)
@@ -56,6 +91,50 @@ class SensorCJMCUAS3935:
             return 1
         return 0
 
+    def read_event (self):
+        """
+        Lee en una única transacción I2C los registros del último evento
+        (0x01 a 0x07) y los decodifica desde esa misma lectura.
+
+        A diferencia de get_interrupt_src() no tiene efectos secundarios sobre
+        la configuración del sensor (no sube el piso de ruido ni enmascara
+        perturbadores), esa decisión queda en manos de quien lo llama.
+
+        No reserva memoria: devuelve siempre la misma lista, que se
+        sobrescribe en la siguiente llamada.
+
+        Retorna:
+        --------
+        Lista [origen, distancia, energía, piso de ruido]. El origen usa los
+        mismos valores que get_interrupt_src() y la distancia es False si
+        está fuera de rango.
+        """
+        self.i2cbus.readfrom_mem_into(self.address, EVENT_START,
+                                      self.event_registers)
+        self.i2c_transactions += 1
+        self.dirty &= ~(EVENT_MASK & ~STATUS_MASK)
+
+        registers = self.registers
+        event = self.event
+
+        reason = registers[0x03] & 0x0F
+        if reason == 0x08:
+            event[EVENT_SOURCE] = 1
+        elif reason == 0x04:
+            event[EVENT_SOURCE] = 2
+        elif reason == 0x01:
+            event[EVENT_SOURCE] = 3
+        else:
+            event[EVENT_SOURCE] = 0
+
+        distance = registers[0x07] & 0x3F
+        event[EVENT_DISTANCE] = False if distance == 0x3F else distance
+        event[EVENT_ENERGY] = ((registers[0x06] & 0x1F) << 16) | (
+                registers[0x05] << 8) | registers[0x04]
+        event[EVENT_NOISE_FLOOR] = (registers[0x01] & 0x70) >> 4
+
+        return event
+
     def calibrate (self, tun_cap=None):
         """
         Calibra el sensor de rayos. Este proceso puede durar hasta medio segundo
@@ -65,7 +144,7 @@ class SensorCJMCUAS3935:
         los condensadores de ajuste internos (de 0 a 120pF en pasos de 8pF).
         """
         sleep_ms(80)
-        self.read_data()
+        self.load_register(0x08)
         if tun_cap is not None:
             if 0 <= tun_cap < 0x10:
                 self.set_byte(0x08, (self.registers[0x08] & 0xF0) | tun_cap)
@@ -75,7 +154,7 @@ class SensorCJMCUAS3935:
         self.set_byte(0x3D, 0x96)
         sleep_ms(3)
 
-        self.read_data()
+        self.load_register(0x08)
         self.set_byte(0x08, self.registers[0x08] | 0x20)
         sleep_ms(3)
         self.set_byte(0x08, self.registers[0x08] & 0xDF)
@@ -86,6 +165,7 @@ class SensorCJMCUAS3935:
         Resetea todos los registros a sus valores predeterminados de encendido.
         """
         self.set_byte(0x3C, 0x96)
+        self.invalidate()
 
     def get_interrupt (self):
         """
@@ -97,7 +177,7 @@ class SensorCJMCUAS3935:
         0x04 - Perturbador
         0x08 - Rayo detectado
         """
-        self.read_data()
+        self.read_status()
         return self.registers[0x03] & 0x0F
 
     def get_distance (self):
@@ -109,7 +189,7 @@ class SensorCJMCUAS3935:
         False si no hay datos disponibles.
         Un valor numérico con la distancia estimada.
         """
-        self.read_data()
+        self.load_register(0x07)
         if self.registers[0x07] & 0x3F == 0x3F:
             return False
         else:
@@ -123,7 +203,7 @@ class SensorCJMCUAS3935:
         --------
         Un valor entero representando la energía.
         """
-        self.read_data()
+        self.load_register(0x04)
         return ((self.registers[0x06] & 0x1F) << 16) | (
                     self.registers[0x05] << 8) | self.registers[0x04]
 
@@ -135,7 +215,7 @@ class SensorCJMCUAS3935:
         --------
         Un valor entre 0 y 7 que representa el nivel de ruido.
         """
-        self.read_data()
+        self.load_register(0x01)
         return (self.registers[0x01] & 0x70) >> 4
 
     def set_noise_floor (self, noisefloor):
@@ -145,7 +225,7 @@ class SensorCJMCUAS3935:
         El valor de noisefloor debe estar entre 0 y 7, ya que este es el rango
         del registro en el sensor.
         """
-        self.read_data()
+        self.load_register(0x01)
         noisefloor = (noisefloor & 0x07) << 4
         write_data = (self.registers[0x01] & 0x8F) + noisefloor
         self.set_byte(0x01, write_data)
@@ -197,7 +277,7 @@ class SensorCJMCUAS3935:
         --------
         El número de rayos mínimos requeridos para generar una interrupción.
         """
-        self.read_data()
+        self.load_register(0x02)
         value = (self.registers[0x02] >> 4) & 0x03
         return { 0: 1, 1: 5, 2: 9, 3: 16 }.get(value, 1)
 
@@ -217,7 +297,7 @@ class SensorCJMCUAS3935:
         mapping = { 1: 0, 5: 1, 9: 2, 16: 3 }
         minstrikes = mapping[minstrikes] << 4
 
-        self.read_data()
+        self.load_register(0x02)
         write_data = (self.registers[0x02] & 0xCF) | minstrikes
         self.set_byte(0x02, write_data)
 
@@ -229,7 +309,7 @@ class SensorCJMCUAS3935:
         --------
         True si está configurado para interiores, False si no lo está.
         """
-        self.read_data()
+        self.load_register(0x00)
         return bool(self.registers[0x00] & 0x20)
 
     def set_indoors (self, indoors):
@@ -242,7 +322,7 @@ class SensorCJMCUAS3935:
             Si es True, configura el sensor para interiores, si es False,
             para exteriores.
         """
-        self.read_data()
+        self.load_register(0x00)
         write_value = (self.registers[0x00] & 0xC1) | (
             0x24 if indoors else 0x1C)
         self.set_byte(0x00, write_value)
@@ -257,7 +337,7 @@ class SensorCJMCUAS3935:
         mask_dist : bool
             Si es True, se enmascaran los perturbadores, si es False, no se enmascaran.
         """
-        self.read_data()
+        self.load_register(0x03)
         write_value = self.registers[0x03] | 0x20 if mask_dist else \
         self.registers[0x03] & 0xDF
         self.set_byte(0x03, write_value)
@@ -270,7 +350,7 @@ class SensorCJMCUAS3935:
         --------
         True si los perturbadores están enmascarados, False si no lo están.
         """
-        self.read_data()
+        self.load_register(0x03)
         return bool(self.registers[0x03] & 0x20)
 
     def set_disp_lco (self, display_lco):
@@ -283,7 +363,7 @@ class SensorCJMCUAS3935:
             Si es True, muestra la señal LC en el pin de interrupción. Si es False,
             la desactiva.
         """
-        self.read_data()
+        self.load_register(0x08)
         if display_lco:
             self.set_byte(0x08, self.registers[0x08] | 0x80)
         else:
@@ -298,7 +378,7 @@ class SensorCJMCUAS3935:
         --------
         True si la señal LC está en el pin de interrupción, False si no lo está.
         """
-        self.read_data()
+        self.load_register(0x08)
         return bool(self.registers[0x08] & 0x80)
 
     def set_byte (self, register, value):
@@ -306,8 +386,19 @@ class SensorCJMCUAS3935:
         Escribe un byte en una dirección específica del sensor.
 
         Este método debería usarse de manera interna, no directamente.
+
+        Si el registro pertenece al bloque en memoria se actualiza también la
+        copia local, los comandos directos (0x3C, 0x3D) invalidan todo el
+        bloque ya que el sensor modifica sus registros internamente.
         """
         self.i2cbus.writeto_mem(self.address, register, bytes([value]))
+        self.i2c_transactions += 1
+
+        if register < REGISTERS_SIZE:
+            self.registers[register] = value
+            self.dirty &= ~(1 << register) | STATUS_MASK
+        else:
+            self.invalidate()
 
     def read_data (self):
         """
@@ -316,5 +407,71 @@ class SensorCJMCUAS3935:
         Este método no lee registros exactos debido a las limitaciones de las
         bibliotecas de I2C en MicroPython.
         """
-        self.registers = self.i2cbus.readfrom_mem(self.address, 0x00,
-                                                  16)  # 16 bytes desde la dirección 0x00
+        # 16 bytes desde la dirección 0x00
+        self.i2cbus.readfrom_mem_into(self.address, 0x00, self.registers)
+        self.i2c_transactions += 1
+        self.dirty = STATUS_MASK
+
+    def read_status (self):
+        """
+        Lee del bus únicamente los registros de estado y resultado (0x03 a
+        0x07) y actualiza con ellos la copia en memoria.
+
+        Al leer el registro 0x03 el sensor limpia la interrupción pendiente,
+        por lo que los registros de resultado quedan asociados a ese evento.
+        Como pueden cambiar en cualquier momento siguen marcados como sucios.
+        """
+        self.i2cbus.readfrom_mem_into(self.address, STATUS_START, self.status)
+        self.i2c_transactions += 1
+
+    def load_register (self, register):
+        """
+        Asegura que el registro indicado está actualizado en memoria, leyendo
+        del bus solo si está marcado como sucio. Los registros de estado
+        (0x03 a 0x07) se leen siempre.
+
+        Parámetros:
+        -----------
+        register : int
+            Dirección del registro a comprobar.
+        """
+        if self.dirty & (1 << register):
+            if self.dirty & ~STATUS_MASK:
+                self.read_data()
+            else:
+                self.read_status()
+
+    def invalidate (self, register=None):
+        """
+        Marca registros como sucios para que se vuelvan a leer del sensor en
+        el siguiente acceso.
+
+        Parámetros:
+        -----------
+        register : int, opcional
+            Registro a invalidar. Si es None se invalidan todos.
+        """
+        if register is None:
+            self.dirty = ALL_REGISTERS_MASK
+        elif STATUS_START <= register < STATUS_END:
+            self.dirty |= STATUS_MASK
+        else:
+            self.dirty |= 1 << register
+
+    def get_i2c_transactions (self, reset=False):
+        """
+        Obtiene el número de transacciones I2C realizadas sobre el sensor.
+
+        Parámetros:
+        -----------
+        reset : bool, opcional
+            Si es True, reinicia el contador después de leerlo.
+
+        Retorna:
+        --------
+        El número de transacciones desde el inicio o el último reinicio.
+        """
+        count = self.i2c_transactions
+        if reset:
+            self.i2c_transactions = 0
+        return count
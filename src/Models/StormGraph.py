@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Histórico de la última hora de la tormenta en cubetas de un minuto: rayos
+# por minuto y distancia más cercana de cada minuto. Cada gráfica se dibuja
+# en su propio FrameBuffer con una columna por minuto. Un rayo solo
+# redibuja la columna del minuto actual y el paso de un minuto desplaza la
+# gráfica con scroll() y limpia la nueva columna, sin recorrer el histórico.
+
+import framebuf
+
+# Minutos guardados, uno por columna
+MINUTES = const(60)
+
+# Distancia de una cubeta sin rayos dentro de rango
+NO_DISTANCE = const(0xFF)
+
+
+class StormGraph:
+    """
+    Gráficas de frecuencia y distancia de los rayos de la última hora.
+
+    :param column_width: Ancho en píxeles de cada minuto.
+    :param rate_height: Alto de la gráfica de rayos por minuto.
+    :param distance_height: Alto de la gráfica de distancia.
+    :param rate_max: Rayos por minuto que llenan la gráfica. Por encima se
+                     dibuja la barra completa.
+    :param distance_max: Distancia en km del borde inferior de la gráfica
+                         de distancia (arriba los rayos más cercanos).
+    """
+
+    def __init__ (self, column_width=2, rate_height=24, distance_height=16,
+                  rate_max=24, distance_max=40):
+        self.column_width = column_width
+        self.width = MINUTES * column_width
+        self.rate_max = rate_max
+        self.distance_max = distance_max
+
+        # Cubetas circulares, 'index' es la del minuto actual
+        self.counts = bytearray(MINUTES)
+        self.distances = bytearray(b'\xff' * MINUTES)
+        self.index = 0
+        self.minute = None
+
+        # Rayos de los últimos 60 minutos, se mantiene al sumar y descartar
+        # cubetas
+        self.total = 0
+
+        self.rate_height = rate_height
+        self.rate = framebuf.FrameBuffer(
+            bytearray(self.width * ((rate_height + 7) // 8)), self.width,
+            rate_height, framebuf.MONO_VLSB)
+
+        self.distance_height = distance_height
+        self.distance = framebuf.FrameBuffer(
+            bytearray(self.width * ((distance_height + 7) // 8)), self.width,
+            distance_height, framebuf.MONO_VLSB)
+
+        # Primera columna que ha cambiado desde que se mostraron las gráficas
+        # o None si no han cambiado. Empieza en 0 para dibujarlas enteras la
+        # primera vez y advance() la vuelve a 0 porque desplaza todas
+        self.changed_x = 0
+
+    def get_rate (self) -> int:
+        """
+        Rayos del minuto actual.
+        """
+        return self.counts[self.index]
+
+    def get_nearest (self):
+        """
+        Distancia más cercana del minuto actual o False si no hay.
+        """
+        distance = self.distances[self.index]
+
+        return False if distance == NO_DISTANCE else distance
+
+    def advance (self, minute) -> None:
+        """
+        Avanza hasta el minuto indicado desplazando las gráficas una columna
+        por cada minuto transcurrido (como mucho una hora).
+
+        :param minute: Minuto actual (timestamp // 60).
+        """
+        if self.minute is None:
+            self.minute = minute
+            return
+
+        steps = minute - self.minute
+
+        # El reloj puede retroceder al sincronizarse, se sigue en la cubeta
+        # actual
+        if steps <= 0:
+            return
+
+        self.minute = minute
+        width = self.column_width
+
+        for _ in range(min(steps, MINUTES)):
+            self.index = (self.index + 1) % MINUTES
+            self.total -= self.counts[self.index]
+            self.counts[self.index] = 0
+            self.distances[self.index] = NO_DISTANCE
+
+            self.rate.scroll(-width, 0)
+            self.rate.fill_rect(self.width - width, 0, width,
+                                self.rate_height, 0)
+            self.distance.scroll(-width, 0)
+            self.distance.fill_rect(self.width - width, 0, width,
+                                    self.distance_height, 0)
+
+        self.changed_x = 0
+
+    def add (self, timestamp, distance) -> None:
+        """
+        Suma un rayo a la cubeta de su minuto y redibuja esa columna.
+
+        :param timestamp: Timestamp del rayo en segundos.
+        :param distance: Distancia en km o False si está fuera de rango.
+        """
+        self.advance(timestamp // 60)
+
+        index = self.index
+
+        if self.counts[index] < 0xFF:
+            self.counts[index] += 1
+            self.total += 1
+
+        if distance is not False and distance < self.distances[index]:
+            self.distances[index] = distance
+
+        self.draw_column()
+
+    def draw_column (self) -> None:
+        """
+        Dibuja la columna del minuto actual, en el borde derecho.
+        """
+        width = self.column_width
+        x = self.width - width
+        height = self.rate_height
+        count = self.counts[self.index]
+
+        bar = min(height, (count * height + self.rate_max - 1) // self.rate_max)
+        self.rate.fill_rect(x, 0, width, height, 0)
+        self.rate.fill_rect(x, height - bar, width, bar, 1)
+
+        height = self.distance_height
+        distance = self.distances[self.index]
+        self.distance.fill_rect(x, 0, width, height, 0)
+
+        if distance != NO_DISTANCE:
+            y = min(distance, self.distance_max) * (height - 1) // self.distance_max
+            self.distance.fill_rect(x, y, width, 1, 1)
+
+        if self.changed_x is None or x < self.changed_x:
+            self.changed_x = x
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Buffer circular de capacidad fija para las lecturas de rayos. Cada campo se
+# guarda en su propio array preasignado, por lo que la memoria ocupada es
+# constante y se conoce desde el arranque.
+
+from array import array
+
+# Valor del registro de distancia que indica fuera de rango.
+DISTANCE_OUT_OF_RANGE = const(0x3F)
+
+
+class StrikeBuffer:
+    """
+    Buffer circular con columnas array para timestamp, distancia, energía,
+    piso de ruido y tipo de cada rayo.
+
+    Cuando se llena descarta el rayo más antiguo y lo contabiliza en
+    'overflows'.
+
+    :param capacity: Número máximo de rayos que se pueden almacenar.
+    """
+
+    def __init__ (self, capacity=500):
+        if capacity < 1:
+            raise ValueError("La capacidad debe ser mayor que 0")
+
+        self.capacity = capacity
+
+        zeros = [0] * capacity
+
+        self.timestamps = array('L', zeros)
+        self.distances = array('B', zeros)
+        self.energies = array('L', zeros)
+        self.noise_floors = array('B', zeros)
+        self.types = array('B', zeros)
+
+        # Índice del rayo más antiguo y cantidad almacenada
+        self.head = 0
+        self.count = 0
+
+        # Rayos descartados por falta de espacio
+        self.overflows = 0
+
+    def __len__ (self):
+        return self.count
+
+    def __iter__ (self):
+        """
+        Recorre los rayos del más antiguo al más reciente sin copiar el
+        buffer. Solo se recorren los que había al empezar.
+        """
+        for i in range(self.count):
+            yield self.get(i)
+
+    def memory_size (self) -> int:
+        """
+        Devuelve los bytes reservados por las columnas del buffer (dos
+        columnas de 4 bytes y tres de 1 byte por rayo en la Rpi Pico).
+        :return:
+        """
+        return self.capacity * 11
+
+    def push (self, timestamp, distance, energy, noise_floor, type):
+        """
+        Añade un rayo al final del buffer. Si está lleno se descarta el más
+        antiguo.
+
+        :param timestamp: Momento de la lectura en segundos.
+        :param distance: Distancia en km o False si está fuera de rango.
+        :param energy: Energía calculada por el sensor.
+        :param noise_floor: Piso de ruido en el momento de la lectura.
+        :param type: Origen de la interrupción.
+        :return:
+        """
+        capacity = self.capacity
+
+        if self.count == capacity:
+            self.head = (self.head + 1) % capacity
+            self.overflows += 1
+        else:
+            self.count += 1
+
+        index = (self.head + self.count - 1) % capacity
+
+        self.timestamps[index] = timestamp
+        self.distances[index] = DISTANCE_OUT_OF_RANGE if distance is False else distance
+        self.energies[index] = energy
+        self.noise_floors[index] = noise_floor
+        self.types[index] = type
+
+    def get (self, position):
+        """
+        Devuelve el rayo en la posición indicada, siendo 0 el más antiguo.
+
+        :param position: Posición relativa al rayo más antiguo.
+        :return: Tupla (timestamp, distancia, energía, piso de ruido, tipo).
+        """
+        if not 0 <= position < self.count:
+            raise IndexError("Posición fuera de rango: " + str(position))
+
+        index = (self.head + position) % self.capacity
+        distance = self.distances[index]
+
+        return (self.timestamps[index],
+                False if distance == DISTANCE_OUT_OF_RANGE else distance,
+                self.energies[index],
+                self.noise_floors[index],
+                self.types[index])
+
+    def first (self):
+        """
+        Devuelve el rayo más antiguo o None si está vacío.
+        :return:
+        """
+        return self.get(0) if self.count else None
+
+    def last (self):
+        """
+        Devuelve el rayo más reciente o None si está vacío.
+        :return:
+        """
+        return self.get(self.count - 1) if self.count else None
+
+    def discard (self, count=None):
+        """
+        Elimina los rayos más antiguos, por ejemplo tras subirlos a la API.
+
+        :param count: Cantidad a eliminar, None para vaciar el buffer.
+        :return:
+        """
+        if count is None or count >= self.count:
+            self.head = 0
+            self.count = 0
+        elif count > 0:
+            self.head = (self.head + count) % self.capacity
+            self.count -= count
+
+    def pop (self):
+        """
+        Extrae el rayo más reciente, por ejemplo para enviarlo por la vía
+        prioritaria.
+
+        :return: Tupla del rayo o None si está vacío.
+        """
+        lightning = self.last()
+
+        if lightning is not None:
+            self.count -= 1
+
+        return lightning
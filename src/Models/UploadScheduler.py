@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Planificador de reintentos para las subidas a la API con espera exponencial,
+# jitter aleatorio para que las estaciones no reintenten a la vez, intervalo
+# máximo y circuit breaker cuando la API lleva muchos fallos seguidos.
+
+import random
+from time import ticks_ms, ticks_diff, ticks_add
+
+# Estados del circuit breaker
+STATE_CLOSED = const(0)
+STATE_OPEN = const(1)
+STATE_HALF_OPEN = const(2)
+
+STATE_NAMES = ('OK', 'OPEN', 'TEST')
+
+# Resultado de una subida según el código HTTP
+RESULT_SUCCESS = const(0)
+RESULT_RETRY = const(1)
+RESULT_REJECTED = const(2)
+
+
+class UploadScheduler:
+    """
+    Decide cuándo se puede intentar la siguiente subida.
+
+    :param base_ms: Espera tras el primer fallo.
+    :param max_ms: Espera máxima entre intentos.
+    :param failure_threshold: Fallos seguidos que abren el circuit breaker.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, base_ms=2000, max_ms=300000, failure_threshold=5,
+                  debug=False):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.failure_threshold = failure_threshold
+        self.DEBUG = debug
+
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.next_attempt = ticks_ms()
+
+        # Estadísticas
+        self.attempts = 0
+        self.successes = 0
+        self.rejected = 0
+        self.last_status = None
+        self.last_delay_ms = 0
+
+    @staticmethod
+    def classify (status) -> int:
+        """
+        Clasifica el código HTTP de una subida.
+
+        Los 2xx son éxito. Solo 400 y 422 indican que el contenido del lote
+        nunca se aceptará y debe descartarse. El resto (errores de red, 4xx
+        de configuración como 401, 403, 404 o 405, 413 con un lote demasiado
+        grande, 5xx o respuestas de un proxy) se reintenta con el mismo
+        lote, ya que descartarlo borraría la cola lote a lote.
+
+        :param status: Código HTTP o 0 si no hubo respuesta.
+        :return: RESULT_SUCCESS, RESULT_RETRY o RESULT_REJECTED.
+        """
+        if 200 <= status < 300:
+            return RESULT_SUCCESS
+
+        if status in (400, 422):
+            return RESULT_REJECTED
+
+        return RESULT_RETRY
+
+    def wait_ms (self) -> int:
+        """
+        Devuelve los milisegundos hasta que se permita el siguiente intento,
+        0 si ya se puede subir.
+        """
+        wait = ticks_diff(self.next_attempt, ticks_ms())
+
+        if wait > 0:
+            return wait
+
+        if self.state == STATE_OPEN:
+            self.state = STATE_HALF_OPEN
+
+        return 0
+
+    def record (self, status) -> int:
+        """
+        Registra el resultado de una subida y programa el siguiente intento.
+
+        :param status: Código HTTP o 0 si no hubo respuesta.
+        :return: Resultado según classify().
+        """
+        self.attempts += 1
+        self.last_status = status
+        result = self.classify(status)
+
+        if result == RESULT_RETRY:
+            self.failures += 1
+
+            # Los errores de configuración no se arreglan reintentando pronto
+            if status in (401, 403, 404, 405) or self.state == STATE_HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                self.state = STATE_OPEN
+                delay = self.max_ms
+            else:
+                delay = min(self.max_ms, self.base_ms << (self.failures - 1))
+
+            # Jitter: entre la mitad y el total de la espera
+            delay = delay // 2 + random.randint(0, delay // 2)
+        else:
+            if result == RESULT_SUCCESS:
+                self.successes += 1
+            else:
+                self.rejected += 1
+
+            self.state = STATE_CLOSED
+            self.failures = 0
+            delay = 0
+
+        self.last_delay_ms = delay
+        self.next_attempt = ticks_add(ticks_ms(), delay)
+
+        if self.DEBUG and delay:
+            print('Subida fallida (' + str(status) + '), reintento en',
+                  delay, 'ms. Estado:', self.get_state_name())
+
+        return result
+
+    def is_open (self) -> bool:
+        """
+        Indica si el circuit breaker está abierto y no se debe intentar
+        ninguna subida, ni siquiera prioritaria, hasta la siguiente prueba.
+        """
+        return self.state == STATE_OPEN and \
+            ticks_diff(self.next_attempt, ticks_ms()) > 0
+
+    def get_state_name (self) -> str:
+        """
+        Devuelve el nombre corto del estado para la pantalla.
+        """
+        return STATE_NAMES[self.state]
+
+    def get_stats (self) -> dict:
+        """
+        Devuelve el estado del planificador para la telemetría.
+        """
+        return {
+            'state': self.get_state_name(),
+            'failures': self.failures,
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'rejected': self.rejected,
+            'last_status': self.last_status,
+            'next_attempt_ms': max(0, ticks_diff(self.next_attempt, ticks_ms())),
+        }
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+# -*- encoding: utf-8 -*-
+
+# @author     Raúl Caro Pastorino
+# @email      public@raupulus.dev
+# @web        https://raupulus.dev
+# @gitlab     https://gitlab.com/raupulus
+# @github     https://github.com/raupulus
+# @twitter    https://twitter.com/raupulus
+# @telegram   https://t.me/raupulus_diffusion
+
+# Create Date: 2024
+# Dependencies:
+#
+# Revision 0.01 - File Created
+
+# @copyright  Copyright © 2024 Raúl Caro Pastorino
+# @license    https://wwww.gnu.org/licenses/gpl.txt
+
+# Copyright (C) 2024  Raúl Caro Pastorino
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+# # Descripción
+# Hilo de subida a la API que se ejecuta en el segundo núcleo de la
+# Raspberry Pi Pico. El núcleo 0 entrega lotes de rayos a través de una cola
+# protegida por un lock y recoge las confirmaciones, sin esperar nunca a la
+# red. El hilo también publica el estado del wi-fi para que el núcleo 0 lo
+# muestre sin tocar la radio.
+
+import _thread
+from time import sleep_ms, ticks_ms, ticks_diff
+
+
+class UploadWorker:
+    """
+    Hilo que posee la instancia de Api y la conexión Wi-Fi.
+
+    :param api: Instancia de Api usada solo desde este hilo.
+    :param max_batches: Número máximo de lotes pendientes en la cola.
+    :param idle_ms: Espera entre comprobaciones de la cola cuando está vacía.
+    :param info_ms: Cada cuánto se renuevan los datos publicados del wi-fi
+                    si no cambia la conexión.
+    :param debug: Optional boolean flag for debugging mode.
+    """
+
+    def __init__ (self, api, max_batches=2, idle_ms=50, info_ms=5000,
+                  debug=False):
+        self.api = api
+        self.max_batches = max_batches
+        self.idle_ms = idle_ms
+        self.info_ms = info_ms
+        self.DEBUG = debug
+
+        self.lock = _thread.allocate_lock()
+
+        # Lotes pendientes de subir: (id, rayos) y confirmaciones:
+        # (id, ok, código HTTP, rayos confirmados, rayos incluidos)
+        self.batches = []
+        self.acks = []
+
+        # Lote en curso y lotes cuya confirmación ya no se espera
+        self.current = None
+        self.cancelled = []
+
+        self.next_id = 1
+        self.running = False
+        self.busy = False
+
+        # Estado del wi-fi publicado (ver get_wifi()), cuándo se tomó y la
+        # conexión y el estado con los que se tomó
+        self.wifi = None
+        self.wifi_ticks = 0
+        self.wifi_key = None
+
+    def start (self) -> None:
+        """
+        Lanza el hilo en el segundo núcleo.
+        :return:
+        """
+        self.running = True
+        _thread.start_new_thread(self.run, ())
+
+    def stop (self) -> None:
+        """
+        Pide al hilo que termine tras el lote en curso.
+        :return:
+        """
+        self.running = False
+
+    def submit (self, lightnings):
+        """
+        Entrega un lote de rayos para subirlo. Se llama desde el núcleo 0.
+
+        :param lightnings: Lista de rayos (tuplas de StrikeBuffer) que pasa
+                           a ser propiedad del hilo.
+        :return: Identificador del lote o None si la cola está llena.
+        """
+        with self.lock:
+            if len(self.batches) >= self.max_batches:
+                return None
+
+            batch_id = self.next_id
+            self.next_id += 1
+            self.batches.append((batch_id, lightnings))
+
+        return batch_id
+
+    def get_ack (self, batch_id=None):
+        """
+        Devuelve una confirmación pendiente de recoger. Las de otros lotes
+        se quedan en la cola para quien las espera.
+
+        :param batch_id: Lote cuya confirmación se busca, None para la más
+                         antigua.
+        :return: Tupla (id, ok, código HTTP, rayos confirmados, rayos
+                 incluidos en la petición) o None si no hay ninguna.
+        """
+        with self.lock:
+            for position in range(len(self.acks)):
+                if batch_id is None or self.acks[position][0] == batch_id:
+                    return self.acks.pop(position)
+
+        return None
+
+    def cancel (self, batch_id) -> None:
+        """
+        Deja de esperar un lote. Si aún no ha empezado se quita de la cola y
+        si está en curso su confirmación se descarta al terminar.
+
+        :param batch_id: Identificador devuelto por submit().
+        :return:
+        """
+        with self.lock:
+            for queue in (self.batches, self.acks):
+                for position in range(len(queue)):
+                    if queue[position][0] == batch_id:
+                        queue.pop(position)
+                        return
+
+            if batch_id == self.current:
+                self.cancelled.append(batch_id)
+
+    def get_wifi (self):
+        """
+        Devuelve el último estado del wi-fi publicado por el hilo. Se llama
+        desde el núcleo 0, que no debe consultar la radio.
+
+        :return: Diccionario de get_wifi_snapshot() o None si el hilo aún no
+                 lo ha publicado.
+        """
+        with self.lock:
+            return self.wifi
+
+    def publish_wifi (self, controller) -> None:
+        """
+        Publica el estado del wi-fi. Se toma de nuevo al cambiar la conexión
+        o el estado del gestor y, si no, cada info_ms.
+
+        :param controller: Instancia de RpiPico que gestiona la red.
+        :return:
+        """
+        key = (controller.wifi_is_connected(), controller.wifi_state)
+        now = ticks_ms()
+
+        if key == self.wifi_key and \
+                ticks_diff(now, self.wifi_ticks) < self.info_ms:
+            return
+
+        snapshot = controller.get_wifi_snapshot()
+
+        with self.lock:
+            self.wifi = snapshot
+
+        self.wifi_key = key
+        self.wifi_ticks = now
+
+    def is_idle (self) -> bool:
+        """
+        Indica si no hay lotes en cola ni en curso.
+        :return:
+        """
+        with self.lock:
+            return not self.batches and not self.busy
+
+    def run (self) -> None:
+        """
+        Bucle del hilo: toma lotes de la cola, los sube y publica la
+        confirmación.
+        :return:
+        """
+        controller = self.api.CONTROLLER
+
+        while self.running:
+            # Avanza la conexión y las reconexiones sin bloquear, publica su
+            # estado y mantiene viva la sesión con el servidor. Un error aquí
+            # no puede terminar el hilo o no se volvería a subir nada
+            try:
+                controller.wifi_poll()
+                self.publish_wifi(controller)
+                self.api.poll()
+            except Exception as e:
+                if self.DEBUG:
+                    print('Error en el wi-fi del hilo de subida:', e)
+
+            with self.lock:
+                batch = self.batches.pop(0) if self.batches else None
+                self.busy = batch is not None
+                self.current = batch[0] if batch is not None else None
+
+            if batch is None:
+                sleep_ms(self.idle_ms)
+                continue
+
+            batch_id, lightnings = batch
+
+            try:
+                # Sin red se confirma como fallo y reintenta el planificador
+                if not controller.wifi_is_connected():
+                    raise OSError('Wi-fi sin conexión')
+
+                ok = self.api.save_lightnings(lightnings)
+                status = self.api.last_status
+                sent = self.api.last_sent
+                count = self.api.last_count
+            except Exception as e:
+                if self.DEBUG:
+                    print('Error en el hilo de subida:', e)
+
+                ok = False
+                status = 0
+                sent = 0
+                count = 0
+
+            with self.lock:
+                if batch_id in self.cancelled:
+                    self.cancelled.remove(batch_id)
+                else:
+                    self.acks.append((batch_id, ok, status, sent, count))
+
+                self.current = None
+                self.busy = False
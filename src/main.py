@@ -1,31 +1,78 @@
 import gc
-import random
+import micropython
+import uasyncio as asyncio
 from time import sleep_ms
 from Models.Api import Api
-from Models.RpiPico import RpiPico
+from Models.I2CBus import I2CBus
+from Models.RpiPico import RpiPico, WIFI_STATE_OFF
 from Models.Lightning import Lightning
+from Models.MqttSink import MqttSink
+from Models.PowerManager import PowerManager
+from Models.DisplayPower import DisplayPower
+from Models.Journal import Journal
+from Models.Runtime import Runtime
+from Models.UploadWorker import UploadWorker
 from Models.SSD1306 import SSD1306_I2C as SSD1306
 
 
 # Importo variables de entorno
 import env
-from machine import I2C, Pin
+from machine import Pin
+
+# Opciones añadidas después de la primera versión de env.py. Si no están
+# definidas se usan los valores de .env.example.py
+WIFI_POWER_SAVE = getattr(env, 'WIFI_POWER_SAVE', False)
+I2C_FREQ = getattr(env, 'I2C_FREQ', 400000)
+LIGHTNINGS_CAPACITY = getattr(env, 'LIGHTNINGS_CAPACITY', 500)
+UPLOAD_TRANSPORT = getattr(env, 'UPLOAD_TRANSPORT', 'http')
+API_FORMAT = getattr(env, 'API_FORMAT', 'json')
+API_COMPRESSION = getattr(env, 'API_COMPRESSION', None)
+MQTT_HOST = getattr(env, 'MQTT_HOST', 'localhost')
+MQTT_PORT = getattr(env, 'MQTT_PORT', 1883)
+MQTT_USER = getattr(env, 'MQTT_USER', None)
+MQTT_PASSWORD = getattr(env, 'MQTT_PASSWORD', None)
+MQTT_PREFIX = getattr(env, 'MQTT_PREFIX', 'lightning')
+MQTT_BATCH = getattr(env, 'MQTT_BATCH', 10)
+MQTT_KEEPALIVE = getattr(env, 'MQTT_KEEPALIVE', 60)
+JOURNAL_ENABLED = getattr(env, 'JOURNAL_ENABLED', True)
+JOURNAL_PATH = getattr(env, 'JOURNAL_PATH', '/lightnings.dat')
+PRIORITY_JOURNAL_PATH = getattr(env, 'PRIORITY_JOURNAL_PATH', '/priority.dat')
+PRIORITY_DISTANCE = getattr(env, 'PRIORITY_DISTANCE', 5)
+PRIORITY_RATE = getattr(env, 'PRIORITY_RATE', 10)
+DUTY_CYCLE = getattr(env, 'DUTY_CYCLE', False)
+UPLOAD_WINDOW_SECONDS = getattr(env, 'UPLOAD_WINDOW_SECONDS', 300)
+UPLOAD_WINDOW_THRESHOLD = getattr(env, 'UPLOAD_WINDOW_THRESHOLD', 50)
+LOW_POWER = getattr(env, 'LOW_POWER', False)
+SLEEP_MAX_MS = getattr(env, 'SLEEP_MAX_MS', 10000)
+DISPLAY_PAGE_SECONDS = getattr(env, 'DISPLAY_PAGE_SECONDS', 10)
+DISPLAY_DIM_SECONDS = getattr(env, 'DISPLAY_DIM_SECONDS', 120)
+DISPLAY_OFF_SECONDS = getattr(env, 'DISPLAY_OFF_SECONDS', 600)
+DISPLAY_DIM_CONTRAST = getattr(env, 'DISPLAY_DIM_CONTRAST', 8)
 
 # Habilito recolector de basura
 gc.enable()
 
+# Buffer para poder informar de excepciones dentro de interrupciones
+micropython.alloc_emergency_exception_buf(100)
+
 sleep_ms(1000)
 
 # Rpi Pico Model
 controller = RpiPico(ssid=env.AP_NAME, password=env.AP_PASS, debug=env.DEBUG,
                      alternatives_ap=env.ALTERNATIVES_AP,
+                     power_save=WIFI_POWER_SAVE,
                      hostname="Lightning")
 
 sleep_ms(20)
 controller.led_on()
 sleep_ms(20)
 
-i2c = I2C(0, scl=Pin(9), sda=Pin(8), freq=400000)
+# Bus I2C compartido: el sensor tiene prioridad sobre la pantalla. El AS3935
+# admite hasta 400 kHz, por lo que el bus solo sube a 1 MHz si se configura
+# así y todos los dispositivos lo permiten
+bus = I2CBus(0, scl=Pin(9), sda=Pin(8), freq=I2C_FREQ, debug=env.DEBUG)
+sensor_i2c = bus.client('sensor', max_freq=400000, priority=1)
+display_i2c = bus.client('display', max_freq=1000000)
 address = 0x03 # Dirección del dispositivo i2c para AS3935
 
 # Configuro los GPIO para los tres LEDs que simulan flashes
@@ -45,7 +92,7 @@ if DISPLAY_ENABLED:
     oled_width = 128
     oled_height = 64
     oled_address = 0x3c
-    oled = SSD1306(oled_width, oled_height, i2c, addr=oled_address)
+    oled = SSD1306(oled_width, oled_height, display_i2c, addr=oled_address)
 
     oled.text('Esperando Eventos', 0, 0)
 
@@ -54,15 +101,48 @@ if DISPLAY_ENABLED:
 
 
 sleep_ms(500)
-sensor = Lightning(i2c=i2c, address=address, pin_irq=22, debug=env.DEBUG,
-                   indoor=env.INDOOR)
+sensor = Lightning(i2c=sensor_i2c, address=address, pin_irq=22, debug=env.DEBUG,
+                   indoor=env.INDOOR, capacity=LIGHTNINGS_CAPACITY)
+
+bus.negotiate()
+
+if env.DEBUG:
+    print('Memoria reservada para rayos:', sensor.lightnings.memory_size(), 'bytes')
 
 sleep_ms(200)
 
 # Api
 if env.API_UPLOAD:
-    api = Api(controller=controller, url=env.API_URL, path=env.API_PATH,
-              token=env.API_TOKEN, device_id=env.DEVICE_ID, debug=env.DEBUG)
+    if UPLOAD_TRANSPORT == 'mqtt':
+        api = MqttSink(controller=controller, host=MQTT_HOST,
+                       port=MQTT_PORT, device_id=env.DEVICE_ID,
+                       user=MQTT_USER, password=MQTT_PASSWORD,
+                       prefix=MQTT_PREFIX, batch_size=MQTT_BATCH,
+                       keepalive=MQTT_KEEPALIVE,
+                       payload_format=API_FORMAT, debug=env.DEBUG)
+    else:
+        api = Api(controller=controller, url=env.API_URL, path=env.API_PATH,
+                  token=env.API_TOKEN, device_id=env.DEVICE_ID,
+                  payload_format=API_FORMAT,
+                  compression=API_COMPRESSION, debug=env.DEBUG)
+
+    # Al apagar la radio se cierra la conexión abierta con el servidor
+    controller.wifi_on_change(lambda state: api.close() if state == WIFI_STATE_OFF else None)
+
+    # La red se gestiona desde el segundo núcleo
+    worker = UploadWorker(api, debug=env.DEBUG)
+    worker.start()
+
+# Cola persistente en la flash para no perder rayos sin subir
+journal = None
+priority_journal = None
+
+if env.API_UPLOAD and JOURNAL_ENABLED:
+    journal = Journal(path=JOURNAL_PATH, debug=env.DEBUG)
+
+    # Los rayos prioritarios se escriben al momento, uno a uno
+    priority_journal = Journal(path=PRIORITY_JOURNAL_PATH, flush_records=1,
+                               debug=env.DEBUG)
 
 sleep_ms(3000)
 
@@ -70,83 +150,34 @@ led1.low()
 led2.low()
 led3.low()
 
-def simulate_random_lightning ():
-    """Función para simular flashes de relámpagos de forma aleatoria con 3 LEDs"""
-    # Generar un número aleatorio de flashes entre 10 y 25
-    total_flashes = random.randint(10, 25)
-
-    for _ in range(total_flashes):
-        # Elegir un LED aleatorio
-        led = random.choice(leds)
-
-        # Duración del flash (entre 150 y 350 ms)
-        delay = int(
-            random.uniform(0.15, 0.35) * 1000)  # Convertir a milisegundos
-
-        # Encender y apagar el LED
-        led.on()
-        sleep_ms(delay)
-        led.off()
-
-        # Pausa antes del siguiente flash (entre 50 y 100 ms)
-        pause = int(
-            random.uniform(0.05, 0.1) * 1000)  # Convertir a milisegundos
-        sleep_ms(pause)
-
-
-simulate_random_lightning()
-
-def thread0 ():
-    """
-    Primer hilo, flujo principal de la aplicación.
-    """
-
-    controller.led_on()
-
-    if sensor.check_exist_strike():
+# Bajo consumo: lightsleep entre interrupciones
+power = None
 
-        simulate_random_lightning()
+if LOW_POWER:
+    power = PowerManager(sensor, max_sleep_ms=SLEEP_MAX_MS, debug=env.DEBUG)
 
-        if DISPLAY_ENABLED:
-            last_strike = sensor.lightnings[0]
+# Atenuado y apagado de la pantalla sin actividad
+panel = None
 
-            print(last_strike)
-
-            oled.fill(0)
-            oled.text('Hay ' + str(len(sensor.lightnings)) + ' rayos', 0, 0)
-            oled.text('Distance: ' + str(last_strike.get('distance')) + 'km', 0, 10)
-            oled.text('Energy: ' + str(last_strike.get('energy')) + 'J', 0, 20)
-            oled.text('Noise: ' + str(last_strike.get('noise_floor')), 0, 30)
-            oled.text('Type: ' + str(last_strike.get('type')), 0, 40)
-
-            oled.show()
-
-        if env.DEBUG:
-            print('Se han detectado rayos, se guardan en la API')
-            print(sensor.lightnings)
-
-        if env.API_UPLOAD:
-            # Subir datos a la api
-            if api.save_lightnings(sensor.lightnings):
-                sensor.clear_datas()
-
-        else:
-            sensor.clear_datas()
-
-    controller.led_off()
-
-
-while True:
-    try:
-        thread0()
-    except Exception as e:
-        if env.DEBUG:
-            print('Error: ', e)
-            print('Memoria antes de liberar: ', gc.mem_free())
-
-        gc.collect()
-
-        if env.DEBUG:
-            print("Memoria después de liberar:", gc.mem_free())
-    finally:
-        sleep_ms(10000)
+if DISPLAY_ENABLED:
+    panel = DisplayPower(oled, dim_seconds=DISPLAY_DIM_SECONDS,
+                         off_seconds=DISPLAY_OFF_SECONDS,
+                         dim_contrast=DISPLAY_DIM_CONTRAST, debug=env.DEBUG)
+
+runtime = Runtime(sensor=sensor, controller=controller,
+                  oled=oled if DISPLAY_ENABLED else None, leds=leds,
+                  worker=worker if env.API_UPLOAD else None, journal=journal,
+                  priority_journal=priority_journal,
+                  priority_distance=PRIORITY_DISTANCE,
+                  priority_rate=PRIORITY_RATE,
+                  duty_cycle=DUTY_CYCLE,
+                  window_seconds=UPLOAD_WINDOW_SECONDS,
+                  window_threshold=UPLOAD_WINDOW_THRESHOLD,
+                  power=power, bus=bus,
+                  page_seconds=DISPLAY_PAGE_SECONDS, panel=panel,
+                  debug=env.DEBUG)
+
+# Flashes de bienvenida al arrancar
+runtime.led_event.set()
+
+asyncio.run(runtime.run())
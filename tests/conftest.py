@@ -0,0 +1,18 @@
+import os
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS), 'src'))
+sys.path.insert(0, TESTS)
+
+import fakes
+
+fakes.install()
+
+import pytest
+
+
+@pytest.fixture
+def clock ():
+    fakes.clock.reset()
+    return fakes.clock
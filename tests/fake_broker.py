@@ -0,0 +1,166 @@
+"""
+Broker MQTT 3.1.1 en memoria para probar MqttSink sin red.
+
+Implementa lo que usa MqttSink: CONNECT/CONNACK, PUBLISH QoS 1/PUBACK y
+PINGREQ/PINGRESP.
+Las confirmaciones se entregan cuando el cliente las lee, por lo que la
+ventana de mensajes en vuelo se ejercita igual que con un broker real.
+"""
+
+import socket
+import sys
+import types
+
+
+class BrokerSocket:
+    """
+    Conexión de un cliente con el broker.
+    """
+
+    def __init__ (self, broker):
+        self.broker = broker
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.closed = False
+        self.dropped = False
+
+    def settimeout (self, timeout):
+        pass
+
+    def setsockopt (self, *args):
+        pass
+
+    def connect (self, address):
+        if self.broker.refuse:
+            raise OSError(111)
+
+        self.broker.connections += 1
+
+    def write (self, data):
+        if self.closed:
+            raise OSError(9)
+
+        if self.dropped:
+            # Lo escrito queda en el buffer de TCP y se pierde
+            return len(data)
+
+        self.incoming += data
+        self.broker.parse(self)
+        return len(data)
+
+    def read (self, size=-1):
+        if self.closed:
+            raise OSError(9)
+
+        if not self.outgoing:
+            # Sin respuestas pendientes equivale a un corte de conexión
+            return b''
+
+        if size < 0:
+            size = len(self.outgoing)
+
+        data = bytes(self.outgoing[:size])
+        del self.outgoing[:size]
+        return data
+
+    def close (self):
+        self.closed = True
+
+
+class FakeBroker:
+    """
+    :param ack_limit: Número de mensajes de rayos a confirmar antes de
+                      cortar la conexión, None para no cortarla nunca.
+    """
+
+    def __init__ (self, ack_limit=None):
+        self.ack_limit = ack_limit
+        self.refuse = False
+        self.pong = True
+        self.pings = 0
+        self.keepalive = None
+        self.connections = 0
+        self.clients = []
+        self.retained = {}
+        self.messages = []
+        self.acked = 0
+
+    def socket (self, *args):
+        client = BrokerSocket(self)
+        self.clients.append(client)
+        return client
+
+    def install (self):
+        module = types.ModuleType('usocket')
+        module.socket = self.socket
+        module.getaddrinfo = lambda host, port, *args: [
+            (socket.AF_INET, socket.SOCK_STREAM, 0, '', (host, port))]
+        module.SOCK_STREAM = socket.SOCK_STREAM
+        sys.modules['usocket'] = module
+
+        if 'Models.MqttSink' in sys.modules:
+            sys.modules['Models.MqttSink'].usocket = module
+
+    def strikes (self, topic_suffix=b'/strikes'):
+        return [data for topic, data in self.messages
+                if topic.endswith(topic_suffix)]
+
+    def parse (self, client):
+        buffer = client.incoming
+
+        while len(buffer) >= 2:
+            length = 0
+            shift = 0
+            position = 1
+
+            while True:
+                if position >= len(buffer):
+                    return
+
+                byte = buffer[position]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                position += 1
+
+                if not byte & 0x80:
+                    break
+
+            if len(buffer) < position + length:
+                return
+
+            header = buffer[0]
+            body = bytes(buffer[position:position + length])
+            del buffer[:position + length]
+            self.handle(client, header, body)
+
+    def handle (self, client, header, body):
+        kind = header & 0xF0
+
+        if kind == 0x10:
+            self.keepalive = (body[8] << 8) | body[9]
+            client.outgoing += b'\x20\x02\x00\x00'
+        elif kind == 0xC0:
+            self.pings += 1
+
+            if self.pong:
+                client.outgoing += b'\xd0\x00'
+        elif kind == 0x30:
+            size = (body[0] << 8) | body[1]
+            topic = body[2:2 + size]
+            qos = (header >> 1) & 0x03
+            offset = 2 + size + (2 if qos else 0)
+            data = body[offset:]
+
+            if header & 0x01:
+                self.retained[topic] = data
+            else:
+                if self.ack_limit is not None and self.acked >= self.ack_limit:
+                    # El mensaje se pierde con la conexión
+                    client.dropped = True
+                    return
+
+                self.messages.append((topic, data))
+                self.acked += 1
+
+            if qos:
+                client.outgoing += b'\x40\x02' + body[2 + size:4 + size]
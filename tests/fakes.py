@@ -0,0 +1,589 @@
+"""
+Dobles de los módulos de MicroPython para ejecutar los modelos en el host.
+
+Se instalan en sys.modules antes de importar nada de 'src/Models' para que
+los modelos se carguen sin cambios. El reloj es simulado: solo avanza con
+'clock.advance()', durmiendo o esperando dentro de fakes.run(), de forma que
+las pruebas son deterministas.
+"""
+
+import asyncio
+import builtins
+import gc
+import io
+import json
+import math
+import selectors
+import sys
+import time
+import types
+
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+class Clock:
+    """
+    Reloj simulado compartido por time/utime/machine. Con 'real' activado
+    sigue al reloj del ordenador, para las medidas de los benchmarks.
+    """
+
+    def __init__ (self, real=False):
+        self.us = 0
+        self.epoch = 700000000
+        self.slept_ms = 0
+        self.real = real
+
+    def reset (self):
+        self.__init__()
+
+    def now_us (self):
+        if self.real:
+            return int(time.perf_counter() * 1000000)
+
+        return self.us
+
+    def advance (self, ms):
+        if self.real:
+            time.sleep(ms / 1000)
+        else:
+            self.us += int(ms * 1000)
+
+    def ticks_ms (self):
+        return (self.now_us() // 1000) & TICKS_MAX
+
+    def ticks_us (self):
+        return self.now_us() & TICKS_MAX
+
+    def time (self):
+        return self.epoch + self.now_us() // 1000000
+
+    def sleep_ms (self, ms):
+        self.slept_ms += ms
+        self.advance(ms)
+
+
+clock = Clock()
+
+
+def ticks_diff (a, b):
+    return ((a - b + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def ticks_add (a, b):
+    return (a + b) & TICKS_MAX
+
+
+def _time_module (name):
+    module = types.ModuleType(name)
+    module.ticks_ms = lambda: clock.ticks_ms()
+    module.ticks_us = lambda: clock.ticks_us()
+    module.ticks_diff = ticks_diff
+    module.ticks_add = ticks_add
+    module.sleep_ms = lambda ms: clock.sleep_ms(ms)
+    module.sleep_us = lambda us: clock.advance(us / 1000)
+    module.sleep = lambda s: clock.sleep_ms(s * 1000)
+    module.time = lambda: clock.time()
+    module.localtime = time.gmtime
+    module.mktime = lambda t: int(time.mktime(tuple(t)[:9]))
+    return module
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+    PULL_DOWN = 3
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__ (self, *args, **kwargs):
+        self.handler = None
+        self.level = 0
+
+    def irq (self, trigger=None, handler=None, hard=False):
+        self.handler = handler
+
+    def value (self, *args):
+        if args:
+            self.level = args[0]
+
+        return self.level
+
+    def on (self):
+        self.level = 1
+
+    def off (self):
+        self.level = 0
+
+
+class ADC:
+    def __init__ (self, *args):
+        self.raw = 14000
+
+    def read_u16 (self):
+        return self.raw
+
+
+class I2C:
+    """
+    Bus I2C con un mapa de registros por dirección.
+    """
+
+    def __init__ (self, *args, **kwargs):
+        self.memory = {}
+        self.reads = 0
+        self.writes = 0
+        self.written = []
+
+    def registers (self, address):
+        return self.memory.setdefault(address, bytearray(256))
+
+    def writeto_mem (self, address, register, data):
+        self.writes += 1
+        self.registers(address)[register:register + len(data)] = data
+
+    def readfrom_mem (self, address, register, size):
+        self.reads += 1
+        return bytes(self.registers(address)[register:register + size])
+
+    def readfrom_mem_into (self, address, register, buffer):
+        self.reads += 1
+        buffer[:] = self.registers(address)[register:register + len(buffer)]
+
+    def writeto (self, address, data):
+        self.writes += 1
+        self.written.append(bytes(data))
+
+    def writevto (self, address, vector):
+        self.writeto(address, b''.join(bytes(part) for part in vector))
+
+    def scan (self):
+        return list(self.memory)
+
+
+class As3935(I2C):
+    """
+    Bus con un AS3935 en la dirección 0x03. Como el sensor real, leer el
+    registro 0x03 borra el origen de la interrupción.
+    """
+
+    ADDRESS = 0x03
+
+    def __init__ (self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.registers(self.ADDRESS)[0x07] = 0x3F
+
+    def strike (self, distance=5, energy=12345, source=0x08):
+        """
+        Prepara los registros de un evento. La IRQ se simula llamando al
+        manejador del pin.
+        """
+        registers = self.registers(self.ADDRESS)
+        registers[0x03] = (registers[0x03] & 0xF0) | source
+        registers[0x04] = energy & 0xFF
+        registers[0x05] = (energy >> 8) & 0xFF
+        registers[0x06] = (energy >> 16) & 0x1F
+        registers[0x07] = distance
+
+    def readfrom_mem_into (self, address, register, buffer):
+        super().readfrom_mem_into(address, register, buffer)
+
+        if address == self.ADDRESS and register <= 0x03 < register + len(buffer):
+            self.registers(address)[0x03] &= 0xF0
+
+
+class Ssd1306Bus(I2C):
+    """
+    Bus con un SSD1306 que interpreta los comandos de direccionamiento y
+    guarda los datos en una copia de la RAM del controlador, para comprobar
+    que coincide con el framebuffer tras cada volcado. Cuenta los bytes en
+    el bus incluida la dirección.
+    """
+
+    def __init__ (self, width=128, height=64):
+        super().__init__()
+        self.width = width
+        self.ram = bytearray(width * height // 8)
+        self.columns = (0, width - 1)
+        self.page_range = (0, height // 8 - 1)
+        self.commands = []
+        self.bus_bytes = 0
+
+    def writeto (self, address, data):
+        data = bytes(data)
+        self.writes += 1
+        self.bus_bytes += len(data) + 1
+
+        if data[0] == 0x40:
+            self.store(data[1:])
+        elif data[0] == 0x80:
+            self.command(data[1:2])
+        else:
+            self.command(data[1:])
+
+    def writevto (self, address, vector):
+        self.writeto(address, b''.join(bytes(part) for part in vector))
+
+    def command (self, data):
+        commands = self.commands
+        commands.extend(data)
+
+        while commands:
+            if commands[0] in (0x21, 0x22):
+                if len(commands) < 3:
+                    return
+
+                if commands[0] == 0x21:
+                    self.columns = (commands[1], commands[2])
+                else:
+                    self.page_range = (commands[1], commands[2])
+
+                del commands[:3]
+            else:
+                del commands[0]
+
+    def store (self, data):
+        index = 0
+
+        for page in range(self.page_range[0], self.page_range[1] + 1):
+            for column in range(self.columns[0], self.columns[1] + 1):
+                if index < len(data):
+                    self.ram[page * self.width + column] = data[index]
+                    index += 1
+
+
+def _lightsleep (ms=0):
+    clock.sleep_ms(ms)
+
+
+def _machine_module ():
+    module = types.ModuleType('machine')
+    module.Pin = Pin
+    module.ADC = ADC
+    module.I2C = I2C
+    module.SPI = object
+    module.lightsleep = _lightsleep
+    module.idle = lambda: None
+    module.freq = lambda *args: 125000000
+    module.reset = lambda: None
+    module.disable_irq = lambda: 0
+    module.enable_irq = lambda state: None
+    return module
+
+
+def _micropython_module ():
+    module = types.ModuleType('micropython')
+    module.queue = []
+    module.const = lambda value: value
+    module.schedule = lambda function, arg: module.queue.append((function, arg))
+    module.alloc_emergency_exception_buf = lambda size: None
+    module.mem_info = lambda *args: None
+    return module
+
+
+class ThreadSafeFlag(asyncio.Event):
+    async def wait (self):
+        await super().wait()
+        self.clear()
+
+
+async def _sleep_ms (ms):
+    await asyncio.sleep(ms / 1000)
+
+
+async def _wait_for_ms (awaitable, ms):
+    return await asyncio.wait_for(awaitable, ms / 1000)
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    """
+    Selector que en lugar de bloquear hasta el siguiente temporizador
+    adelanta el reloj simulado hasta él.
+    """
+
+    def select (self, timeout=None):
+        events = super().select(0)
+
+        if not events and timeout:
+            clock.us += math.ceil(timeout * 1000000)
+
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    Bucle de eventos sobre el reloj simulado: las esperas no consumen
+    tiempo real y ticks_ms()/utime.time() avanzan con ellas.
+    """
+
+    def __init__ (self):
+        super().__init__(VirtualSelector())
+
+    def time (self):
+        return clock.us / 1000000
+
+
+def run (coroutine):
+    """
+    Ejecuta una corrutina en tiempo simulado.
+    """
+    loop = VirtualTimeLoop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        # Cancela las tareas que sigan vivas, como las del Runtime
+        tasks = asyncio.all_tasks(loop)
+
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            loop.run_until_complete(asyncio.gather(*tasks,
+                                                   return_exceptions=True))
+
+        loop.close()
+
+
+def _uasyncio_module ():
+    module = types.ModuleType('uasyncio')
+
+    for name in ('Event', 'Lock', 'create_task', 'gather', 'run', 'sleep',
+                 'wait_for', 'TimeoutError', 'CancelledError'):
+        setattr(module, name, getattr(asyncio, name))
+
+    module.sleep_ms = _sleep_ms
+    module.wait_for_ms = _wait_for_ms
+    module.ThreadSafeFlag = ThreadSafeFlag
+    module.run = run
+    return module
+
+
+class FrameBuffer:
+    """
+    FrameBuffer MONO_VLSB mínimo: píxeles, rectángulos, texto en cajas de
+    8x8, blit y scroll.
+    """
+
+    def __init__ (self, buffer, width, height, mode=0):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+
+    def pixel (self, x, y, color=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+
+        index = (y >> 3) * self.width + x
+        bit = 1 << (y & 7)
+
+        if color is None:
+            return 1 if self.buffer[index] & bit else 0
+
+        if color:
+            self.buffer[index] |= bit
+        else:
+            self.buffer[index] &= ~bit & 0xFF
+
+    def fill_rect (self, x, y, width, height, color):
+        for j in range(max(0, y), min(self.height, y + height)):
+            for i in range(max(0, x), min(self.width, x + width)):
+                self.pixel(i, j, color)
+
+    def fill (self, color):
+        value = 0xFF if color else 0
+
+        for i in range(len(self.buffer)):
+            self.buffer[i] = value
+
+    def rect (self, x, y, width, height, color, fill=False):
+        if fill:
+            self.fill_rect(x, y, width, height, color)
+            return
+
+        self.hline(x, y, width, color)
+        self.hline(x, y + height - 1, width, color)
+        self.vline(x, y, height, color)
+        self.vline(x + width - 1, y, height, color)
+
+    def hline (self, x, y, width, color):
+        self.fill_rect(x, y, width, 1, color)
+
+    def vline (self, x, y, height, color):
+        self.fill_rect(x, y, 1, height, color)
+
+    def line (self, x1, y1, x2, y2, color):
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+
+        for step in range(steps + 1):
+            self.pixel(x1 + (x2 - x1) * step // steps,
+                       y1 + (y2 - y1) * step // steps, color)
+
+    def text (self, string, x, y, color=1):
+        # Cada carácter visible se dibuja como una caja hueca de 8x8
+        for position, char in enumerate(string):
+            if char != ' ':
+                self.rect(x + position * 8, y, 7, 7, color)
+
+    def blit (self, source, x, y, key=-1, palette=None):
+        for j in range(source.height):
+            for i in range(source.width):
+                value = source.pixel(i, j)
+
+                if value != key:
+                    self.pixel(x + i, y + j, value)
+
+    def scroll (self, dx, dy):
+        copy = FrameBuffer(bytearray(self.buffer), self.width, self.height)
+
+        for j in range(self.height):
+            for i in range(self.width):
+                if 0 <= i - dx < self.width and 0 <= j - dy < self.height:
+                    self.pixel(i, j, copy.pixel(i - dx, j - dy))
+
+
+class WLAN:
+    """
+    Interfaz wi-fi con puntos de acceso simulados. Cada conexión tarda
+    'join_ms' (más 'scan_join_ms' si no se indica el BSSID) en el reloj
+    simulado.
+
+    aps: ssid → dict(password, bssid, channel, rssi)
+    """
+
+    aps = {}
+    scan_error = False
+    join_ms = 500
+    scan_join_ms = 1500
+
+    def __init__ (self, *args):
+        self.ssid = None
+        self.bssid = None
+        self.started = 0
+        self.state = 0
+        self.connects = []
+        self.scans = 0
+        self.settings = {}
+        self.enabled = False
+
+    def active (self, value=None):
+        if value is not None:
+            self.enabled = value
+
+        return self.enabled
+
+    def config (self, *args, **kwargs):
+        if args:
+            ap = WLAN.aps.get(self.ssid, {})
+            return {'essid': self.ssid, 'channel': ap.get('channel', 0),
+                    'mac': bytes(6), 'hostname': 'pico',
+                    'txpower': 31}.get(args[0])
+
+        self.settings.update(kwargs)
+
+    def connect (self, ssid, password, bssid=None):
+        self.ssid = ssid
+        self.password = password
+        self.bssid = bssid
+        self.started = clock.ticks_ms()
+        self.state = 1
+        self.connects.append((ssid, bssid))
+
+    def disconnect (self):
+        self.state = 0
+
+    def scan (self):
+        self.scans += 1
+        clock.advance(2000)
+
+        if WLAN.scan_error:
+            raise OSError(-1)
+
+        return [(ssid.encode(), ap['bssid'], ap['channel'], ap['rssi'], 3, 0)
+                for ssid, ap in WLAN.aps.items()]
+
+    def status (self, *args):
+        ap = WLAN.aps.get(self.ssid)
+
+        if args:
+            return ap['rssi'] if ap else -100
+
+        if self.state == 1:
+            elapsed = ticks_diff(clock.ticks_ms(), self.started)
+
+            if ap is None:
+                return -2 if elapsed >= 200 else 1
+
+            if ap['password'] != self.password:
+                return -3
+
+            if self.bssid is not None and self.bssid != ap['bssid']:
+                return -2 if elapsed >= 200 else 1
+
+            join = self.join_ms + (0 if self.bssid else self.scan_join_ms)
+
+            if elapsed >= join:
+                self.state = 3
+
+        return self.state
+
+    def isconnected (self):
+        return self.status() == 3
+
+    def ifconfig (self):
+        return ('10.0.0.2', '255.255.255.0', '10.0.0.1', '10.0.0.1')
+
+
+def _network_module ():
+    module = types.ModuleType('network')
+    module.STA_IF = 0
+    module.WLAN = WLAN
+    module.hostname = lambda name=None: None
+    return module
+
+
+def _framebuf_module ():
+    module = types.ModuleType('framebuf')
+    module.FrameBuffer = FrameBuffer
+    module.FrameBuffer1 = FrameBuffer
+    module.MONO_VLSB = 0
+    module.MONO_HLSB = 3
+    return module
+
+
+def install ():
+    """
+    Registra los módulos simulados. Es idempotente.
+    """
+    if getattr(sys.modules.get('machine'), '__fake__', False):
+        return
+
+    builtins.const = lambda value: value
+
+    for name in ('ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add',
+                 'sleep_ms', 'sleep_us'):
+        setattr(time, name, getattr(_time_module('time'), name))
+
+    if not hasattr(gc, 'mem_free'):
+        gc.mem_free = lambda: 100000
+        gc.mem_alloc = lambda: 0
+
+    machine = _machine_module()
+    machine.__fake__ = True
+
+    sys.modules['machine'] = machine
+    sys.modules['micropython'] = _micropython_module()
+    sys.modules['utime'] = _time_module('utime')
+    sys.modules['uasyncio'] = _uasyncio_module()
+    sys.modules['framebuf'] = _framebuf_module()
+    sys.modules['network'] = _network_module()
+    sys.modules['ujson'] = json
+    sys.modules['uio'] = io
+
+    import binascii
+    import errno
+    sys.modules['ubinascii'] = binascii
+    sys.modules['uerrno'] = errno
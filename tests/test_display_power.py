@@ -0,0 +1,70 @@
+class FakeOled:
+    def __init__ (self):
+        self.on = True
+        self.level = 0xFF
+
+    def display_on (self):
+        self.on = True
+
+    def poweroff (self):
+        self.on = False
+
+    def contrast (self, level):
+        self.level = level
+
+
+def follow (panel, clock, ms):
+    """
+    Avanza el reloj llamando a poll() cuando lo pide, como panel_task.
+    """
+    while ms > 0:
+        wait = min(panel.poll(), ms)
+        clock.advance(wait)
+        ms -= wait
+
+
+def test_dim_and_off (clock):
+    from Models.DisplayPower import DisplayPower, PANEL_DIM, PANEL_OFF
+
+    oled = FakeOled()
+    panel = DisplayPower(oled, dim_seconds=10, off_seconds=20)
+
+    follow(panel, clock, 10000)
+    assert panel.poll() is not None
+    assert panel.state == PANEL_DIM
+    assert oled.level == panel.dim_contrast
+
+    follow(panel, clock, 10000)
+    panel.poll()
+    assert panel.state == PANEL_OFF
+    assert not oled.on
+    assert not panel.should_flush()
+
+    panel.wake()
+    assert oled.on and panel.wakes == 1
+
+
+def test_stats_over_ticks_wrap (clock):
+    from Models.DisplayPower import DisplayPower
+
+    panel = DisplayPower(FakeOled(), dim_seconds=60, off_seconds=600)
+    day = 86400000
+
+    # Diez días (más que el periodo de ticks_ms) con un rayo al día
+    for _ in range(10):
+        panel.wake()
+        follow(panel, clock, day)
+
+    stats = panel.get_stats()
+
+    assert panel.uptime_ms == 10 * day
+    assert stats['on_ms'] == 10 * 600000
+    assert stats['on_ms_per_day'] == 600000
+
+
+def test_poll_never_sleeps_past_tally (clock):
+    from Models.DisplayPower import DisplayPower, TALLY_MS
+
+    panel = DisplayPower(FakeOled(), dim_seconds=None, off_seconds=None)
+
+    assert panel.poll() == TALLY_MS
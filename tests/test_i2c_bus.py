@@ -0,0 +1,103 @@
+import asyncio
+
+import fakes
+
+
+def make_bus ():
+    from Models.I2CBus import I2CBus
+
+    bus = I2CBus(0, scl=1, sda=0)
+    sensor = bus.client('sensor', priority=1)
+    display = bus.client('display')
+
+    return bus, sensor, display
+
+
+def test_pending_sensor_preempts_display_flush (clock):
+    bus, sensor, display = make_bus()
+    irq = asyncio.Event()
+    order = []
+    state = {'pending': False}
+    sensor.pending = lambda: state['pending']
+
+    def flush ():
+        for step in range(10):
+            clock.us += 1000
+            order.append(step)
+
+            if step == 4:
+                state['pending'] = True
+                irq.set()
+
+            yield
+
+    async def read_sensor ():
+        await irq.wait()
+        await asyncio.sleep(0.002)
+        await bus.acquire(sensor)
+        order.append('sensor')
+        state['pending'] = False
+        bus.release(sensor)
+
+    async def main ():
+        reader = asyncio.create_task(read_sensor())
+        await bus.run(display, flush())
+        await reader
+
+    fakes.run(main())
+
+    assert order == [0, 1, 2, 3, 4, 'sensor', 5, 6, 7, 8, 9]
+    assert bus.owner is None and not bus.waiters
+
+    # La pantalla esperó una vez, unos 2 ms, el sensor nunca
+    stats = bus.get_stats()
+    assert stats['display']['acquired'] == 2
+    assert sum(stats['display']['waits']) == 1
+    assert stats['display']['waits'][4] == 1
+    assert 2000 <= stats['display']['wait_max_us'] < 5000
+    assert stats['sensor']['acquired'] == 1
+    assert sum(stats['sensor']['waits']) == 0
+
+
+def test_uncontended_flush_records_no_waits (clock):
+    bus, sensor, display = make_bus()
+
+    fakes.run(bus.run(display, iter(range(20))))
+
+    stats = bus.get_stats()
+    assert stats['display']['acquired'] == 1
+    assert sum(stats['display']['waits']) == 0
+    assert stats['display']['wait_max_us'] == 0
+
+
+def test_waiters_are_served_by_priority_then_arrival (clock):
+    from Models.I2CBus import I2CBus
+
+    bus = I2CBus(0, scl=1, sda=0)
+    holder = bus.client('holder')
+    high = bus.client('high', priority=1)
+    first = bus.client('first')
+    second = bus.client('second')
+    order = []
+
+    async def use (client):
+        await bus.acquire(client)
+        order.append(client.name)
+        await asyncio.sleep(0.001)
+        bus.release(client)
+
+    async def main ():
+        await bus.acquire(holder)
+        tasks = [asyncio.create_task(use(first))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(use(second)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(use(high)))
+        await asyncio.sleep(0.001)
+        bus.release(holder)
+        await asyncio.gather(*tasks)
+
+    fakes.run(main())
+
+    assert order == ['high', 'first', 'second']
+    assert sum(bus.get_stats()['first']['waits']) == 1
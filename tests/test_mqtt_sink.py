@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from fake_broker import FakeBroker
+
+
+def strikes (count):
+    return [(700000000 + i * 7, (i % 40) + 1, (i * 9973) % 2000000, i % 8, 1)
+            for i in range(count)]
+
+
+@pytest.fixture
+def broker ():
+    broker = FakeBroker()
+    broker.install()
+    return broker
+
+
+def make_sink (**kwargs):
+    from Models.MqttSink import MqttSink
+    return MqttSink(None, '127.0.0.1', 7, **kwargs)
+
+
+def test_publish_all_in_batches (broker):
+    sink = make_sink(batch_size=10, window=4)
+    lightnings = strikes(95)
+
+    assert sink.save_lightnings(lightnings)
+    assert sink.last_status == 201
+    assert sink.last_sent == 95
+    assert sink.last_count == 95
+
+    received = [json.loads(data)['lightnings'] for data in broker.strikes()]
+    assert [len(message) for message in received] == [10] * 9 + [5]
+    assert broker.retained[b'lightning/7/status'] == b'online'
+
+
+def test_messages_bounded_by_max_bytes (broker):
+    sink = make_sink(batch_size=200, max_bytes=512)
+
+    assert sink.save_lightnings(strikes(60))
+    assert sink.last_sent == 60
+
+    total = 0
+
+    for data in broker.strikes():
+        assert len(data) <= 512
+        total += len(json.loads(data)['lightnings'])
+
+    assert total == 60
+    assert len(broker.strikes()) > 1
+
+
+def test_binary_header_counts_split_messages (broker):
+    from Models.Payload import BINARY_HEADER_FORMAT
+    import struct
+
+    sink = make_sink(batch_size=100, max_bytes=128, payload_format='binary')
+
+    assert sink.save_lightnings(strikes(40))
+
+    size = struct.calcsize(BINARY_HEADER_FORMAT)
+    counts = [struct.unpack(BINARY_HEADER_FORMAT, data[:size])[-1]
+              for data in broker.strikes()]
+
+    assert sum(counts) == 40
+    assert all(len(data) <= 128 for data in broker.strikes())
+
+
+def test_partial_window_reports_acked (broker):
+    broker.ack_limit = 3
+    sink = make_sink(batch_size=5, window=4)
+    lightnings = strikes(40)
+
+    assert sink.save_lightnings(lightnings)
+    assert sink.last_status == 201
+    assert sink.last_sent == 15
+    assert sink.sock is None
+
+    # El siguiente intento empieza donde se quedó sin repetir confirmados
+    broker.ack_limit = None
+    assert sink.save_lightnings(lightnings[sink.last_sent:])
+    assert sink.last_sent == 25
+
+    received = [strike for data in broker.strikes()
+                for strike in json.loads(data)['lightnings']]
+    assert len(received) == 40
+
+
+def test_nothing_acked_is_a_failure (broker):
+    broker.refuse = True
+    sink = make_sink()
+
+    assert not sink.save_lightnings(strikes(5))
+    assert sink.last_status == 0
+    assert sink.last_sent == 0
+
+
+def test_keepalive_and_ping (broker, clock):
+    sink = make_sink(keepalive=30)
+
+    assert sink.save_lightnings(strikes(3))
+    assert broker.keepalive == 30
+
+    # Antes de la mitad del keep-alive no hace falta el ping
+    clock.advance(10000)
+    sink.poll()
+    assert broker.pings == 0
+
+    clock.advance(6000)
+    sink.poll()
+    assert broker.pings == 1
+    assert broker.connections == 1
+
+    # Cada paquete enviado reinicia la cuenta
+    clock.advance(10000)
+    sink.poll()
+    assert broker.pings == 1
+
+
+def test_reconnect_without_pingresp (broker, clock):
+    sink = make_sink(keepalive=30)
+    assert sink.save_lightnings(strikes(3))
+
+    broker.pong = False
+    clock.advance(15000)
+    sink.poll()
+
+    assert broker.pings == 1
+    assert broker.connections == 2
+    assert sink.sock is not None
+    assert broker.retained[b'lightning/7/status'] == b'online'
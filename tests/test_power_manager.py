@@ -0,0 +1,218 @@
+import asyncio
+
+import fakes
+
+
+class SleepClock:
+    """
+    lightsleep simulado: adelanta el reloj hasta la fecha límite o hasta el
+    siguiente flanco de la IRQ, que ejecuta el manejador del pin al
+    despertar como en la placa.
+    """
+
+    WAKE_US = 300
+
+    def __init__ (self, sensor, bus):
+        self.sensor = sensor
+        self.bus = bus
+        self.edges = []
+
+    def __call__ (self, ms):
+        clock = fakes.clock
+        end = clock.us + ms * 1000
+
+        if self.edges and self.edges[0] < end:
+            clock.us = self.edges.pop(0)
+            self.bus.strike(distance=9)
+            self.sensor.pin.handler(self.sensor.pin)
+            clock.us += self.WAKE_US
+        else:
+            clock.us = end
+
+
+def make_sensor ():
+    from Models.Lightning import Lightning
+
+    bus = fakes.As3935()
+    return Lightning(i2c=bus, address=fakes.As3935.ADDRESS, pin_irq=22), bus
+
+
+def test_sleep_until_deadline (clock):
+    from Models.PowerManager import PowerManager
+
+    sensor, bus = make_sensor()
+    power = PowerManager(sensor, max_sleep_ms=5000, sleep=SleepClock(sensor, bus))
+
+    assert power.sleep(10) == 0
+    assert power.sleep(20000) == 5000
+
+    stats = power.get_stats()
+    assert stats['wakes_deadline'] == 1
+    assert stats['wakes_irq'] == 0
+    assert stats['asleep_ms'] == 5000
+
+
+def test_irq_wakes_with_edge_timestamp (clock):
+    from Models.PowerManager import PowerManager
+
+    sensor, bus = make_sensor()
+    sleeper = SleepClock(sensor, bus)
+    power = PowerManager(sensor, max_sleep_ms=10000, sleep=sleeper)
+    sleeper.edges.append(clock.us + 3000000)
+
+    assert power.sleep(10000) == 3000
+    assert sensor.pending
+    assert power.wakes_irq == 1
+    assert power.wake_latency_us == SleepClock.WAKE_US
+
+    # Sin dormir más, el rayo se registra con el instante del flanco
+    edge_time = clock.time()
+    sensor.process_interrupt()
+    assert sensor.lightnings.last()[0] == edge_time
+
+
+def test_runtime_sleeps_between_strikes (clock):
+    from Models.PowerManager import PowerManager
+    from Models.Runtime import Runtime
+
+    class FakeController:
+        def led_on (self):
+            pass
+
+        def led_off (self):
+            pass
+
+    sensor, bus = make_sensor()
+    sleeper = SleepClock(sensor, bus)
+    power = PowerManager(sensor, max_sleep_ms=10000, sleep=sleeper)
+    runtime = Runtime(sensor, FakeController(), power=power)
+
+    start = clock.us
+    sleeper.edges = [start + 25000000, start + 47500000]
+    strikes = []
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        seen = None
+
+        while clock.us - start < 60000000:
+            await asyncio.sleep(0.01)
+
+            if runtime.last_strike is not seen:
+                seen = runtime.last_strike
+                strikes.append(seen[0])
+
+        task.cancel()
+
+    fakes.run(main())
+
+    epoch = fakes.Clock().epoch
+    assert strikes == [epoch + 25, epoch + 47]
+
+    stats = power.get_stats()
+    assert stats['wakes_irq'] == 2
+    assert stats['asleep_percent'] >= 90
+
+
+class RadioController:
+    """
+    Controlador con la radio gestionada desde fuera: 'off' indica si está
+    apagada y los cambios se avisan a los callbacks registrados.
+    """
+
+    def __init__ (self):
+        self.off = False
+        self.callbacks = []
+
+    def led_on (self):
+        pass
+
+    def led_off (self):
+        pass
+
+    def wifi_sleep (self):
+        pass
+
+    def wifi_is_off (self):
+        return self.off
+
+    def wifi_on_change (self, callback):
+        self.callbacks.append(callback)
+
+    def set_off (self, off):
+        self.off = off
+
+        for callback in self.callbacks:
+            callback(0)
+
+
+class IdleWorker:
+    def is_idle (self):
+        return True
+
+
+def count_checks (runtime):
+    checks = []
+    idle_ms = runtime.idle_ms
+
+    def counted ():
+        wait = idle_ms()
+        checks.append(wait)
+        return wait
+
+    runtime.idle_ms = counted
+    return checks
+
+
+def test_idle_task_waits_while_radio_is_on (clock):
+    from Models.PowerManager import PowerManager
+    from Models.Runtime import Runtime
+
+    sensor, bus = make_sensor()
+    power = PowerManager(sensor, max_sleep_ms=10000,
+                         sleep=SleepClock(sensor, bus))
+    controller = RadioController()
+    runtime = Runtime(sensor, controller, worker=IdleWorker(), power=power,
+                      duty_cycle=True)
+    checks = count_checks(runtime)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+
+        # Con la radio encendida solo se comprueba al arrancar las tareas,
+        # no periódicamente
+        await asyncio.sleep(30)
+        assert checks and len(checks) <= 2
+        assert set(checks) == {None}
+        assert power.sleeps == 0
+
+        controller.set_off(True)
+        await asyncio.sleep(60)
+        task.cancel()
+
+    fakes.run(main())
+
+    # Solo se comprueba al despertar de cada periodo dormido
+    assert power.sleeps >= 5
+    assert len(checks) <= power.sleeps + 3
+
+
+def test_idle_task_not_started_with_radio_always_on (clock):
+    from Models.PowerManager import PowerManager
+    from Models.Runtime import Runtime
+
+    sensor, bus = make_sensor()
+    power = PowerManager(sensor, sleep=SleepClock(sensor, bus))
+    controller = RadioController()
+    runtime = Runtime(sensor, controller, worker=IdleWorker(), power=power)
+    checks = count_checks(runtime)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(10)
+        task.cancel()
+
+    fakes.run(main())
+
+    assert checks == []
+    assert controller.callbacks == []
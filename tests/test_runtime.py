@@ -0,0 +1,449 @@
+import asyncio
+
+import fakes
+
+
+class FakeController:
+    def led_on (self):
+        pass
+
+    def led_off (self):
+        pass
+
+    def wifi_is_off (self):
+        return True
+
+    def get_radio_stats (self, strikes=0):
+        return {'on_ms': 0, 'wakes': 0, 'strikes': strikes}
+
+
+def make_runtime (**kwargs):
+    from Models.Lightning import Lightning
+    from Models.Runtime import Runtime
+    from Models.SSD1306 import SSD1306_I2C
+
+    bus = fakes.As3935()
+    sensor = Lightning(i2c=bus, address=fakes.As3935.ADDRESS, pin_irq=22)
+    oled = SSD1306_I2C(128, 64, fakes.I2C())
+    runtime = Runtime(sensor, FakeController(), oled=oled, **kwargs)
+
+    return runtime, sensor, bus, oled
+
+
+def strike (sensor, bus, distance=5):
+    bus.strike(distance=distance)
+    sensor.pin.handler(sensor.pin)
+
+
+def test_strike_reaches_display_without_polling (clock):
+    runtime, sensor, bus, oled = make_runtime()
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+
+        # Sin rayos no se vuelve a enviar nada a la pantalla
+        writes = oled.i2c.writes
+        wakeups = runtime.wakeups
+        await asyncio.sleep(600)
+        assert oled.i2c.writes == writes
+        assert runtime.wakeups == wakeups
+
+        strike(sensor, bus, distance=12)
+        start = clock.us
+
+        while runtime.last_strike is None or not runtime.strike_shown:
+            await asyncio.sleep(0.001)
+
+        task.cancel()
+        return clock.us - start
+
+    latency_us = fakes.run(main())
+
+    # Solo se espera lo que necesita el sensor para tener el dato listo
+    from Models.Runtime import IRQ_READ_DELAY_MS
+
+    assert latency_us <= (IRQ_READ_DELAY_MS + 1) * 1000
+    assert runtime.last_strike[1] == 12
+    assert 0 < runtime.display_latency_us <= latency_us
+
+
+def test_burst_of_strikes_is_recorded (clock):
+    runtime, sensor, bus, oled = make_runtime()
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+
+        for distance in (40, 20, 8):
+            strike(sensor, bus, distance)
+            await asyncio.sleep(0.05)
+
+        task.cancel()
+
+    fakes.run(main())
+
+    # Sin subida configurada los rayos no se acumulan en el buffer
+    assert len(sensor.lightnings) == 0
+    assert runtime.graph.total == 3
+    assert runtime.graph.get_nearest() == 8
+    assert sensor.irq_merged == 0
+
+
+class WindowController(FakeController):
+    def __init__ (self):
+        self.sleeps = 0
+
+    def wifi_sleep (self):
+        self.sleeps += 1
+
+
+def test_failed_window_keeps_oldest_deadline (clock):
+    from Models.Lightning import Lightning
+    from Models.Runtime import Runtime
+
+    sensor = Lightning(i2c=fakes.As3935(), address=fakes.As3935.ADDRESS,
+                       pin_irq=22)
+    runtime = Runtime(sensor, WindowController(), duty_cycle=True,
+                      window_seconds=300)
+
+    sensor.lightnings.push(0, 5, 1000, 0, 1)
+    assert runtime.window_wait_ms() == 300000
+
+    # La subida falla y el rayo sigue en cola: el plazo no vuelve a empezar
+    clock.advance(200000)
+    runtime.window_open = True
+    runtime.close_window()
+    assert runtime.window_wait_ms() == 100000
+
+    # Con la cola vacía el siguiente rayo abre un plazo nuevo
+    sensor.lightnings.discard()
+    runtime.close_window()
+    sensor.lightnings.push(0, 5, 1000, 0, 1)
+    assert runtime.window_wait_ms() == 300000
+
+
+class SilentWorker:
+    """
+    Hilo de subida que acepta lotes y nunca los confirma.
+    """
+
+    def __init__ (self):
+        self.cancelled = []
+
+    def submit (self, lightnings):
+        return 7
+
+    def get_ack (self, batch_id=None):
+        return None
+
+    def cancel (self, batch_id):
+        self.cancelled.append(batch_id)
+
+    def is_idle (self):
+        return False
+
+
+def test_worker_without_ack_times_out (clock):
+    from Models.Lightning import Lightning
+    from Models.Runtime import Runtime, ACK_TIMEOUT_MS
+
+    sensor = Lightning(i2c=fakes.As3935(), address=fakes.As3935.ADDRESS,
+                       pin_irq=22)
+    worker = SilentWorker()
+    runtime = Runtime(sensor, FakeController(), worker=worker)
+
+    start = clock.us
+    result = fakes.run(runtime.upload_in_worker([(1, 5, 100, 2, 1)]))
+
+    assert result == (0, 0, 0)
+    assert worker.cancelled == [7]
+    assert clock.us - start >= ACK_TIMEOUT_MS * 1000
+
+
+class RecordingBus:
+    """
+    Bus compartido que solo anota si alguien lo tiene tomado.
+    """
+
+    def __init__ (self):
+        self.held = False
+        self.clients = {}
+
+    def get (self, name):
+        return self.clients.setdefault(name, type(name, (), {})())
+
+    async def acquire (self, client, since=None):
+        self.held = True
+
+    def release (self, client):
+        self.held = False
+
+
+def test_journal_holds_the_bulk_queue (clock, tmp_path):
+    from Models.Journal import Journal
+
+    journal = Journal(path=str(tmp_path / 'lightnings.dat'), flush_records=1)
+    runtime, sensor, bus, oled = make_runtime(journal=journal,
+                                              bus=RecordingBus())
+
+    # Cada escritura en la flash comprueba que el bus ya está libre
+    writes = []
+    append = journal.append
+
+    def checked_append (*lightning):
+        writes.append(runtime.bus.held)
+        append(*lightning)
+
+    journal.append = checked_append
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+
+        for distance in (40, 30):
+            strike(sensor, bus, distance)
+            await asyncio.sleep(0.05)
+
+        task.cancel()
+
+    fakes.run(main())
+
+    assert writes == [False, False]
+    assert journal.pending() == 2
+    assert len(sensor.lightnings) == 0
+    assert runtime.pending_count() == 2
+    assert runtime.strikes_pending == 2
+
+
+class InstantWorker:
+    """
+    Hilo de subida que confirma cada lote al momento con 'status'.
+    """
+
+    def __init__ (self, status=201):
+        self.status = status
+        self.batches = {}
+        self.next_id = 1
+
+    def submit (self, lightnings):
+        batch_id = self.next_id
+        self.next_id += 1
+        self.batches[batch_id] = len(lightnings)
+        return batch_id
+
+    def get_ack (self, batch_id=None):
+        count = self.batches.pop(batch_id)
+        sent = count if self.status == 201 else 0
+        return batch_id, self.status == 201, self.status, sent, count
+
+    def cancel (self, batch_id):
+        pass
+
+    def is_idle (self):
+        return True
+
+
+def test_upload_stats_are_reported (clock, capsys):
+    runtime, sensor, bus, oled = make_runtime(worker=InstantWorker(503),
+                                              debug=True)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+        strike(sensor, bus, distance=30)
+        await asyncio.sleep(0.5)
+        task.cancel()
+
+    fakes.run(main())
+
+    report = [line for line in capsys.readouterr().out.splitlines()
+              if line.startswith('Planificador de subidas:')]
+
+    assert report
+    assert "'failures': 1" in report[0]
+    assert "'last_status': 503" in report[0]
+
+
+class GateWorker(InstantWorker):
+    """
+    Hilo de subida que no confirma hasta que se fija 'ack'.
+    """
+
+    def __init__ (self):
+        super().__init__()
+        self.ack = None
+
+    def get_ack (self, batch_id=None):
+        if self.ack is None:
+            return None
+
+        ack, self.ack = self.ack, None
+        return (batch_id,) + ack
+
+
+def test_priority_overflow_waits_for_upload_in_flight (clock, tmp_path,
+                                                       monkeypatch):
+    import Models.Runtime as module
+    from Models.Journal import Journal
+
+    monkeypatch.setattr(module, 'PRIORITY_MAX', 2)
+
+    journal = Journal(path=str(tmp_path / 'bulk.dat'), flush_records=1)
+    priority_journal = Journal(path=str(tmp_path / 'priority.dat'),
+                               flush_records=1)
+    worker = GateWorker()
+    runtime, sensor, bus, oled = make_runtime(
+        worker=worker, journal=journal, priority_journal=priority_journal,
+        priority_distance=100)
+
+    def add (timestamp):
+        sensor.lightnings.push(timestamp, 5, 1000, 0, 1)
+        runtime.store_strike(sensor.lightnings.last())
+
+    def timestamps (queue):
+        return [lightning[0] for lightning in queue.read(queue.pending())]
+
+    async def main ():
+        add(1)
+        add(2)
+        task = asyncio.create_task(runtime.upload_priority())
+        await asyncio.sleep(0.1)
+
+        # Llegan más rayos de los que admite la vía con la subida en curso
+        for timestamp in (3, 4, 5):
+            add(timestamp)
+
+        assert timestamps(priority_journal) == [1, 2, 3, 4, 5]
+
+        # Solo se confirma el primero de la petición
+        worker.ack = (True, 201, 1, 2)
+        await task
+
+    fakes.run(main())
+
+    assert [entry[0][0] for entry in runtime.priority] == [4, 5]
+    assert timestamps(priority_journal) == [4, 5]
+    assert timestamps(journal) == [2, 3]
+    assert runtime.priority_sent == 1
+
+
+def test_latency_stats_are_reported (clock, capsys):
+    runtime, sensor, bus, oled = make_runtime(worker=InstantWorker(),
+                                              priority_distance=10, debug=True)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+        strike(sensor, bus, distance=5)
+        await asyncio.sleep(0.5)
+        task.cancel()
+
+    fakes.run(main())
+
+    stats = runtime.get_latency_stats()
+    assert stats['priority_sent'] == 1
+    assert 0 <= stats['priority_ms'] < 500
+
+    output = capsys.readouterr().out
+    assert "Latencia de subida: {'priority_sent': 1" in output
+
+
+def test_radio_stats_are_reported (clock, capsys):
+    runtime, sensor, bus, oled = make_runtime(worker=InstantWorker(),
+                                              debug=True)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+        strike(sensor, bus, distance=30)
+        await asyncio.sleep(0.5)
+        task.cancel()
+
+    fakes.run(main())
+
+    stats = runtime.get_radio_stats()
+    assert stats['strikes'] == 1
+    assert stats['wake_deadline'] == 0
+
+    output = capsys.readouterr().out
+    assert "Radio: {'on_ms': 0, 'wakes': 0, 'strikes': 1" in output
+
+
+def test_display_stats_are_reported (clock, capsys):
+    from Models.DisplayPower import DisplayPower
+
+    runtime, sensor, bus, oled = make_runtime(debug=True)
+    runtime.panel = DisplayPower(oled, dim_seconds=10, off_seconds=20)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(30)
+        strike(sensor, bus, distance=30)
+        await asyncio.sleep(120)
+        task.cancel()
+
+    fakes.run(main())
+
+    stats = runtime.get_display_stats()
+    assert stats['state'] == 'OFF'
+    assert 40000 <= stats['on_ms'] <= 41000
+    assert stats['wakes'] == 1
+    assert stats['flushes'] >= 1
+
+    # Se informa cada vez que se apaga
+    report = [line for line in capsys.readouterr().out.splitlines()
+              if line.startswith('Pantalla:')]
+    assert len(report) == 2
+    assert "'state': 'OFF'" in report[1]
+    assert "'wakes': 1" in report[1]
+
+
+def test_bus_stats_are_reported (clock, capsys):
+    from Models.I2CBus import I2CBus
+
+    i2c = I2CBus(0, scl=1, sda=0)
+    i2c.client('sensor', priority=1)
+    i2c.client('display')
+    runtime, sensor, bus, oled = make_runtime(worker=InstantWorker(),
+                                              bus=i2c, debug=True)
+
+    async def main ():
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(1)
+        strike(sensor, bus, distance=30)
+        await asyncio.sleep(0.5)
+        task.cancel()
+
+    fakes.run(main())
+
+    stats = i2c.get_stats()
+    assert stats['sensor']['acquired'] == 1
+    assert stats['display']['acquired'] >= 1
+
+    output = capsys.readouterr().out
+    assert "Bus I2C: {'freq': 400000, 'sensor': {'acquired': 1" in output
+
+
+class WifiWorker(InstantWorker):
+    """
+    Hilo de subida que publica un estado del wi-fi fijo.
+    """
+
+    def get_wifi (self):
+        return {'connected': True, 'state': 'CONN', 'drops': 3,
+                'ssid': 'main', 'ip': '10.0.0.2', 'rssi': -60, 'channel': 6}
+
+
+def test_wifi_page_reads_worker_snapshot (clock):
+    # FakeController no tiene wifi_is_connected() ni wireless_info(): la
+    # radio es del segundo núcleo
+    runtime, sensor, bus, oled = make_runtime(worker=WifiWorker())
+
+    screen = runtime.pages[2][0]
+    runtime.update_wifi_screen(screen)
+
+    assert bytes(screen.fields[runtime.field_wifi_ssid][3]).rstrip() == b'main'
+    assert bytes(screen.fields[runtime.field_wifi_rssi][3]) == b' -60'
+    assert bytes(screen.fields[runtime.field_wifi_drops][3]) == b'    3'
+    assert runtime.wifi_connected()
@@ -0,0 +1,45 @@
+import fakes
+
+
+def make_screen ():
+    from Models.Screen import Screen
+    from Models.SSD1306 import SSD1306_I2C
+
+    return Screen(SSD1306_I2C(128, 64, fakes.I2C()))
+
+
+def text (screen, field):
+    return bytes(screen.fields[field][3])
+
+
+def test_integers_that_fit_are_padded ():
+    from Models.Screen import ALIGN_LEFT
+
+    screen = make_screen()
+    right = screen.field(0, 0, 4)
+    left = screen.field(0, 10, 4, ALIGN_LEFT)
+
+    screen.set(right, 42)
+    screen.set(left, -42)
+    assert text(screen, right) == b'  42'
+    assert text(screen, left) == b'-42 '
+
+    screen.set(right, 9999)
+    screen.set(left, -999)
+    assert text(screen, right) == b'9999'
+    assert text(screen, left) == b'-999'
+
+
+def test_integers_that_do_not_fit_saturate ():
+    screen = make_screen()
+    field = screen.field(0, 0, 4)
+
+    # 12345 no se muestra como 2345
+    screen.set(field, 12345)
+    assert text(screen, field) == b'9999'
+
+    screen.set(field, -1234)
+    assert text(screen, field) == b'-999'
+
+    screen.set(field, 7)
+    assert text(screen, field) == b'   7'
@@ -0,0 +1,47 @@
+import fakes
+
+
+def make_sensor ():
+    from Models.SensorCJMCUAS3935_4 import SensorCJMCUAS3935
+
+    bus = fakes.As3935()
+    sensor = SensorCJMCUAS3935(bus, address=fakes.As3935.ADDRESS)
+
+    return sensor, bus
+
+
+def test_status_registers_are_read_on_every_access (clock):
+    sensor, bus = make_sensor()
+
+    bus.strike(distance=5, energy=1000)
+    assert sensor.get_interrupt() == 0x08
+    assert sensor.get_distance() == 5
+    assert sensor.get_energy() == 1000
+
+    bus.strike(distance=12, energy=2000)
+    assert sensor.get_distance() == 12
+    assert sensor.get_energy() == 2000
+    assert sensor.get_interrupt() == 0
+
+
+def test_read_event_does_not_leave_stale_status (clock):
+    sensor, bus = make_sensor()
+
+    bus.strike(distance=7, energy=300)
+    assert sensor.read_event()[1] == 7
+
+    bus.strike(distance=20, energy=400, source=0x04)
+    assert sensor.get_distance() == 20
+    assert sensor.get_interrupt() == 0
+
+
+def test_configuration_registers_stay_cached (clock):
+    sensor, bus = make_sensor()
+
+    sensor.get_noise_floor()
+    reads = bus.reads
+    sensor.get_noise_floor()
+    sensor.get_indoors()
+    sensor.get_min_strikes()
+
+    assert bus.reads == reads
@@ -0,0 +1,64 @@
+import asyncio
+
+import fakes
+
+
+class FakeSensor:
+    pending = False
+    strike_ticks = 0
+    lightnings = []
+
+    def set_event_flag (self, flag):
+        self.flag = flag
+
+
+def make_runtime ():
+    from Models.Runtime import Runtime
+    from Models.SSD1306 import SSD1306_I2C
+
+    oled = SSD1306_I2C(128, 64, fakes.I2C())
+    return Runtime(FakeSensor(), object(), oled=oled, page_seconds=10)
+
+
+async def run_for (task, ms):
+    runner = asyncio.create_task(task)
+    await asyncio.sleep(ms / 1000)
+    runner.cancel()
+
+
+def test_visible_trend_page_ticks_every_minute (clock):
+    runtime = make_runtime()
+    runtime.page_shown = runtime.trend_page
+    ticks = []
+    runtime.display_event.set = lambda: ticks.append(fakes.clock.time())
+
+    fakes.run(run_for(runtime.trend_task(), 180000))
+
+    assert len(ticks) >= 3
+    assert all(tick % 60 == 0 for tick in ticks)
+
+
+def test_hidden_trend_page_does_not_tick (clock):
+    runtime = make_runtime()
+    runtime.page_shown = 0
+
+    async def main ():
+        task = asyncio.create_task(runtime.trend_task())
+
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        assert runtime.trend_at is None
+        assert not runtime.display_event.is_set()
+
+        # Al mostrarse la página empieza a contar el siguiente minuto
+        runtime.page_shown = runtime.trend_page
+        runtime.trend_event.set()
+
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        assert runtime.trend_at is not None
+        task.cancel()
+
+    fakes.run(main())
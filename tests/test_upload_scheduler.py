@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from Models.UploadScheduler import UploadScheduler, RESULT_SUCCESS, \
+    RESULT_RETRY, RESULT_REJECTED, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+
+@pytest.fixture
+def scheduler (clock):
+    random.seed(1)
+    return UploadScheduler(base_ms=1000, max_ms=60000, failure_threshold=4)
+
+
+@pytest.mark.parametrize('status, result', [
+    (200, RESULT_SUCCESS), (201, RESULT_SUCCESS), (204, RESULT_SUCCESS),
+    (400, RESULT_REJECTED), (422, RESULT_REJECTED),
+    (0, RESULT_RETRY), (401, RESULT_RETRY), (404, RESULT_RETRY),
+    (405, RESULT_RETRY), (413, RESULT_RETRY), (429, RESULT_RETRY),
+    (500, RESULT_RETRY), (503, RESULT_RETRY),
+])
+def test_classify (status, result):
+    assert UploadScheduler.classify(status) == result
+
+
+def test_backoff_grows_with_jitter (scheduler):
+    delays = []
+
+    for _ in range(3):
+        scheduler.record(503)
+        delays.append(scheduler.last_delay_ms)
+
+    for failures, delay in enumerate(delays):
+        full = 1000 << failures
+        assert full // 2 <= delay <= full
+
+    assert scheduler.state == STATE_CLOSED
+    assert scheduler.wait_ms() > 0
+
+
+def test_breaker_opens_and_half_opens (scheduler, clock):
+    for _ in range(4):
+        scheduler.record(0)
+
+    assert scheduler.state == STATE_OPEN
+    assert scheduler.is_open()
+
+    clock.advance(scheduler.wait_ms())
+    assert scheduler.wait_ms() == 0
+    assert scheduler.state == STATE_HALF_OPEN
+
+    # La prueba falla y vuelve a abrirse con la espera máxima
+    scheduler.record(503)
+    assert scheduler.state == STATE_OPEN
+    assert scheduler.last_delay_ms >= 30000
+
+    clock.advance(scheduler.wait_ms())
+    scheduler.wait_ms()
+    assert scheduler.record(201) == RESULT_SUCCESS
+    assert scheduler.state == STATE_CLOSED
+    assert scheduler.wait_ms() == 0
+
+
+def test_configuration_errors_open_at_once (scheduler):
+    scheduler.record(404)
+
+    assert scheduler.state == STATE_OPEN
+    assert scheduler.failures == 1
+
+
+def test_rejected_does_not_back_off (scheduler):
+    scheduler.record(503)
+    assert scheduler.record(422) == RESULT_REJECTED
+    assert scheduler.failures == 0
+    assert scheduler.wait_ms() == 0
+    assert scheduler.get_stats()['rejected'] == 1
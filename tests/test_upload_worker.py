@@ -0,0 +1,209 @@
+import threading
+import time
+
+import pytest
+
+
+class FakeController:
+    def __init__ (self):
+        self.connected = True
+        self.polls = 0
+        self.fail = False
+        self.wifi_state = 2
+        self.snapshots = 0
+        self.core = None
+
+    def wifi_poll (self):
+        self.polls += 1
+
+        if self.fail:
+            raise OSError('wi-fi')
+
+        return 2
+
+    def wifi_is_connected (self):
+        return self.connected
+
+    def get_wifi_snapshot (self):
+        self.snapshots += 1
+        self.core = threading.get_ident()
+        return {'connected': self.connected, 'state': 'CONN', 'drops': 0,
+                'ssid': 'main' if self.connected else None, 'ip': None,
+                'rssi': None, 'channel': None}
+
+
+class SlowApi:
+    """
+    Endpoint lento: cada subida tarda 'delay' segundos reales.
+    """
+
+    def __init__ (self, delay=0.2, status=201):
+        self.CONTROLLER = FakeController()
+        self.delay = delay
+        self.status = status
+        self.uploads = []
+        self.started = threading.Event()
+        self.last_status = 0
+        self.last_sent = 0
+        self.last_count = 0
+
+    def poll (self):
+        pass
+
+    def save_lightnings (self, lightnings):
+        self.started.set()
+        time.sleep(self.delay)
+        self.uploads.append(list(lightnings))
+        self.last_status = self.status
+        self.last_count = len(lightnings)
+        self.last_sent = self.last_count if self.status == 201 else 0
+        return self.status == 201
+
+
+@pytest.fixture
+def worker (monkeypatch):
+    import Models.UploadWorker as module
+
+    # El hilo duerme en tiempo real, no en el reloj simulado
+    monkeypatch.setattr(module, 'sleep_ms', lambda ms: time.sleep(ms / 1000))
+
+    created = []
+
+    def make (api, **kwargs):
+        worker = module.UploadWorker(api, idle_ms=5, **kwargs)
+        worker.start()
+        created.append(worker)
+        return worker
+
+    yield make
+
+    for worker in created:
+        worker.stop()
+
+
+def wait_ack (worker, timeout=2):
+    limit = time.monotonic() + timeout
+
+    while time.monotonic() < limit:
+        ack = worker.get_ack()
+
+        if ack is not None:
+            return ack
+
+        time.sleep(0.005)
+
+    raise AssertionError('Sin confirmación del hilo de subida')
+
+
+def test_core0_never_waits_on_upload (worker):
+    api = SlowApi(delay=0.3)
+    upload = worker(api)
+
+    batch = upload.submit([(1, 5, 100, 2, 1), (2, 6, 200, 2, 1)])
+    assert api.started.wait(1)
+
+    # Con la subida en curso el núcleo 0 entrega y consulta sin bloquearse
+    start = time.monotonic()
+    second = upload.submit([(3, 7, 300, 2, 1)])
+    assert upload.get_ack() is None
+    assert not upload.is_idle()
+    assert time.monotonic() - start < 0.05
+
+    assert wait_ack(upload) == (batch, True, 201, 2, 2)
+    assert wait_ack(upload) == (second, True, 201, 1, 1)
+    assert upload.is_idle()
+
+
+def test_queue_is_bounded (worker):
+    api = SlowApi(delay=0.3)
+    upload = worker(api, max_batches=1)
+
+    assert upload.submit([(1, 5, 100, 2, 1)]) is not None
+    assert api.started.wait(1)
+    assert upload.submit([(2, 5, 100, 2, 1)]) is not None
+    assert upload.submit([(3, 5, 100, 2, 1)]) is None
+
+
+def test_failures_are_acknowledged (worker):
+    api = SlowApi(delay=0, status=503)
+    upload = worker(api)
+
+    batch = upload.submit([(1, 5, 100, 2, 1)])
+    assert wait_ack(upload) == (batch, False, 503, 0, 1)
+
+    api.CONTROLLER.connected = False
+    batch = upload.submit([(2, 5, 100, 2, 1)])
+    assert wait_ack(upload) == (batch, False, 0, 0, 0)
+    assert len(api.uploads) == 1
+
+
+def test_wifi_errors_do_not_stop_the_thread (worker):
+    api = SlowApi(delay=0)
+    api.CONTROLLER.fail = True
+    upload = worker(api)
+
+    time.sleep(0.05)
+    assert api.CONTROLLER.polls > 1
+
+    batch = upload.submit([(1, 5, 100, 2, 1)])
+    assert wait_ack(upload) == (batch, True, 201, 1, 1)
+
+
+def test_acks_are_kept_for_their_batch (worker):
+    api = SlowApi(delay=0)
+    upload = worker(api)
+
+    first = upload.submit([(1, 5, 100, 2, 1)])
+    second = upload.submit([(2, 5, 100, 2, 1), (3, 5, 100, 2, 1)])
+
+    limit = time.monotonic() + 2
+
+    while not upload.is_idle() and time.monotonic() < limit:
+        time.sleep(0.005)
+
+    assert upload.get_ack(second) == (second, True, 201, 2, 2)
+    assert upload.get_ack(second) is None
+    assert upload.get_ack(first) == (first, True, 201, 1, 1)
+
+
+def test_cancelled_batch_is_not_acknowledged (worker):
+    api = SlowApi(delay=0.2)
+    upload = worker(api)
+
+    batch = upload.submit([(1, 5, 100, 2, 1)])
+    assert api.started.wait(1)
+    upload.cancel(batch)
+
+    time.sleep(0.3)
+    assert upload.is_idle()
+    assert upload.get_ack() is None
+
+
+def test_wifi_state_is_published_by_the_thread (worker):
+    api = SlowApi(delay=0)
+    upload = worker(api)
+
+    limit = time.monotonic() + 2
+
+    while upload.get_wifi() is None and time.monotonic() < limit:
+        time.sleep(0.005)
+
+    assert upload.get_wifi()['ssid'] == 'main'
+    assert api.CONTROLLER.core != threading.get_ident()
+
+    # Sin cambios en la conexión no se vuelve a consultar la radio
+    polls = api.CONTROLLER.polls
+    time.sleep(0.05)
+    assert api.CONTROLLER.polls > polls
+    assert api.CONTROLLER.snapshots == 1
+
+    api.CONTROLLER.connected = False
+    limit = time.monotonic() + 2
+
+    while upload.get_wifi()['connected'] and time.monotonic() < limit:
+        time.sleep(0.005)
+
+    assert upload.get_wifi() == {'connected': False, 'state': 'CONN',
+                                 'drops': 0, 'ssid': None, 'ip': None,
+                                 'rssi': None, 'channel': None}
+    assert api.CONTROLLER.snapshots == 2
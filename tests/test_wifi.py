@@ -0,0 +1,213 @@
+import json
+
+import pytest
+
+import fakes
+
+
+MAIN = {'password': 'main-pass', 'bssid': b'\x01' * 6, 'channel': 6,
+        'rssi': -80}
+ALTERNATIVE = {'password': 'alt-pass', 'bssid': b'\x02' * 6, 'channel': 11,
+               'rssi': -50}
+
+
+@pytest.fixture
+def aps (clock):
+    fakes.WLAN.aps = {'main': dict(MAIN), 'alternative': dict(ALTERNATIVE)}
+    fakes.WLAN.scan_error = False
+    return fakes.WLAN.aps
+
+
+def make_pico (path, **kwargs):
+    from Models.RpiPico import RpiPico
+
+    return RpiPico(ssid='main', password='main-pass',
+                   alternatives_ap=[{'ssid': 'alternative',
+                                     'password': 'alt-pass'}],
+                   cache_path=str(path), **kwargs)
+
+
+def run (pico, clock, ms, step=100):
+    for _ in range(ms // step):
+        pico.wifi_poll()
+        clock.advance(step)
+
+    return pico.wifi_poll()
+
+
+def test_scan_keeps_main_first_and_saves_ranking (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED
+
+    path = tmp_path / 'wifi.json'
+    pico = make_pico(path)
+
+    assert run(pico, clock, 5000) == WIFI_STATE_CONNECTED
+    assert pico.wifi.scans == 1
+    assert pico.wifi.connects[0] == ('main', MAIN['bssid'])
+
+    cache = json.loads(path.read_text())
+    assert cache['ssid'] == 'main'
+    assert cache['ranking'] == [['main', -80], ['alternative', -50]]
+
+
+def test_ranking_is_rewritten_after_rescan (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED
+
+    path = tmp_path / 'wifi.json'
+    pico = make_pico(path)
+    run(pico, clock, 5000)
+
+    # La red principal desaparece y se conecta a la alternativa escaneando
+    del aps['main']
+    pico.wifi.disconnect()
+
+    assert run(pico, clock, 40000) == WIFI_STATE_CONNECTED
+    cache = json.loads(path.read_text())
+    assert cache['ssid'] == 'alternative'
+    assert cache['ranking'] == [['alternative', -50]]
+
+
+def test_direct_join_uses_cached_bssid (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED
+
+    path = tmp_path / 'wifi.json'
+    run(make_pico(path), clock, 5000)
+
+    pico = make_pico(path)
+
+    assert run(pico, clock, 1000) == WIFI_STATE_CONNECTED
+    assert pico.wifi.scans == 0
+    assert pico.wifi_directed == 1
+
+
+def test_backoff_grows_when_nothing_visible (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_BACKOFF
+
+    aps.clear()
+    pico = make_pico(tmp_path / 'wifi.json', backoff_base=2, backoff_max=8)
+
+    delays = []
+
+    for _ in range(4):
+        run(pico, clock, 0)
+        state = run(pico, clock, 1000)
+        assert state == WIFI_STATE_BACKOFF
+        delays.append(fakes.ticks_diff(pico.wifi_next_attempt,
+                                       clock.ticks_ms()))
+        clock.advance(delays[-1])
+
+    assert delays[0] < delays[1] < delays[2]
+    assert delays[3] <= 8000
+
+
+def test_scan_error_falls_back_to_stored_ranking (aps, clock, tmp_path):
+    path = tmp_path / 'wifi.json'
+    path.write_text(json.dumps({'ssid': 'gone', 'bssid': None, 'channel': 1,
+                                'ranking': [['alternative', -50],
+                                            ['main', -80]]}))
+    fakes.WLAN.scan_error = True
+
+    pico = make_pico(path)
+    run(pico, clock, 0)
+
+    assert [entry[0] for entry in pico.wifi_queue] == ['alternative', 'main']
+
+
+def test_constructor_does_not_block_without_ap (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_BACKOFF
+
+    aps.clear()
+    start = clock.us
+    pico = make_pico(tmp_path / 'wifi.json')
+
+    # Solo la pausa de 100 ms del constructor, sin intentos de conexión
+    assert clock.us - start <= 100000
+    assert pico.wifi_state == WIFI_STATE_BACKOFF
+    assert pico.wifi.connects == []
+
+
+def test_reconnects_after_drop_and_notifies (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED, WIFI_STATE_CONNECTING
+
+    pico = make_pico(tmp_path / 'wifi.json')
+    states = []
+    pico.wifi_on_change(states.append)
+
+    run(pico, clock, 5000)
+    assert states[-1] == WIFI_STATE_CONNECTED
+
+    # Se cae el enlace: reconexión directa al punto de acceso conocido
+    states.clear()
+    pico.wifi.disconnect()
+    scans = pico.wifi.scans
+
+    assert run(pico, clock, 2000) == WIFI_STATE_CONNECTED
+    assert states == [WIFI_STATE_CONNECTING, WIFI_STATE_CONNECTED]
+    assert pico.wifi_drops == 1
+    assert pico.wifi.scans == scans
+    assert pico.wifi_reconnect_ms <= fakes.WLAN.join_ms + 100
+
+
+def test_wrong_password_moves_to_next_network (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED
+
+    aps['main']['password'] = 'changed'
+    pico = make_pico(tmp_path / 'wifi.json')
+
+    assert run(pico, clock, 10000) == WIFI_STATE_CONNECTED
+    assert pico.wifi.ssid == 'alternative'
+
+
+def test_sleep_and_wake_radio (aps, clock, tmp_path):
+    from Models.RpiPico import WIFI_STATE_CONNECTED, WIFI_STATE_OFF
+
+    pico = make_pico(tmp_path / 'wifi.json')
+    run(pico, clock, 5000)
+
+    pico.wifi_sleep()
+    assert pico.wifi_poll() == WIFI_STATE_OFF
+    assert pico.wifi_is_off()
+    assert not pico.wifi.active()
+
+    pico.wifi_wake()
+    assert run(pico, clock, 2000) == WIFI_STATE_CONNECTED
+    assert pico.get_radio_stats()['wakes'] == 2
+
+
+def test_radio_on_time_and_energy (aps, clock, tmp_path):
+    pico = make_pico(tmp_path / 'wifi.json')
+    run(pico, clock, 5000)
+
+    pico.wifi_sleep()
+    pico.wifi_poll()
+    on_ms = pico.get_radio_stats()['on_ms']
+    assert on_ms >= 5000
+
+    # Apagada no acumula tiempo
+    clock.advance(60000)
+    assert pico.get_radio_stats()['on_ms'] == on_ms
+
+    pico.wifi_wake()
+    run(pico, clock, 3000)
+
+    stats = pico.get_radio_stats(strikes=10)
+    assert 3000 <= stats['on_ms'] - on_ms <= 3200
+    assert stats['wakes'] == 2
+    assert stats['on_ms_per_hour'] < 3600000 // 2
+    assert stats['energy_mj'] == round(stats['on_ms'] * 45 * 3.3 / 1000, 1)
+    assert stats['energy_mj_per_strike'] == round(stats['energy_mj'] / 10, 2)
+
+
+def test_wifi_snapshot (aps, clock, tmp_path):
+    pico = make_pico(tmp_path / 'wifi.json')
+
+    assert pico.get_wifi_snapshot()['connected'] is False
+    assert pico.get_wifi_snapshot()['ssid'] is None
+
+    run(pico, clock, 5000)
+    snapshot = pico.get_wifi_snapshot()
+    assert snapshot['connected'] is True
+    assert snapshot['ssid'] == 'main'
+    assert snapshot['rssi'] == MAIN['rssi']
+    assert snapshot['channel'] == MAIN['channel']
+    assert snapshot['drops'] == 0